@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""Raspberry Pi OTP Dump Archives
+
+ Copyright 2019-2022 Jasmine Iwanek & Dylan Morrison
+
+ Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ software and associated documentation files (the "Software"), to deal in the Software
+ without restriction, including without limitation the rights to use, copy, modify, merge,
+ publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+ to whom the Software is furnished to do so, subject to the following conditions:
+
+ The above copyright notice and this permission notice shall be included in all copies or
+ substantial portions of the Software.
+
+ THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+ FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+ DEALINGS IN THE SOFTWARE.
+
+ Reads dump files straight out of tar (plain, gzip, bzip2 or xz compressed) and zip archives,
+ without extracting them. Tar archives are read as a stream, one member after another, so
+ nothing but the member being read is held in memory.
+
+ archive_members() runs the reading and decompression in a producer thread feeding a bounded
+ queue. zlib, bz2 and lzma release the GIL while they work, so decompression overlaps with
+ whatever consumes the members, see OTPFleet.decode_archives().
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import fnmatch
+import posixpath
+import tarfile
+import threading
+import zipfile
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+# Members read ahead of the consumer.
+DEFAULT_QUEUE_SIZE = 256
+
+# Seconds a producer waits for room in a full queue before checking whether to stop.
+PUT_TIMEOUT = 0.1
+
+# Separates an archive's path from a member's name in a record's 'file'.
+MEMBER_SEPARATOR = '!'
+
+ARCHIVE_ERRORS = (IOError, OSError, EOFError, tarfile.TarError, zipfile.BadZipfile)
+
+
+def iter_archive(file_name, pattern='*'):
+    """Yield (member name, bytes) for each regular file in a tar or zip archive, in archive order.
+    Only members whose base name matches pattern are read.
+    """
+    if zipfile.is_zipfile(file_name):
+        with zipfile.ZipFile(file_name) as archive:
+            for info in archive.infolist():
+                if not info.filename.endswith('/') and fnmatch.fnmatch(posixpath.basename(info.filename), pattern):
+                    yield info.filename, archive.read(info)
+        return
+    archive = tarfile.open(file_name, 'r|*')
+    try:
+        for member in archive:
+            if member.isfile() and fnmatch.fnmatch(posixpath.basename(member.name), pattern):
+                yield member.name, archive.extractfile(member).read()
+    finally:
+        archive.close()
+
+
+def put(members, item, stop):
+    """Put item on the members queue, waiting for room until stop is set. Returns False if it was."""
+    while not stop.is_set():
+        try:
+            members.put(item, timeout=PUT_TIMEOUT)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def produce(paths, pattern, members, stop):
+    """Put (location, bytes, None) for every member of every archive on the members queue,
+    or (archive, None, message) for an archive that can not be read, then None to finish.
+    Stops early, closing the archive being read, once the stop event is set.
+    """
+    try:
+        for file_name in paths:
+            archive = iter_archive(file_name, pattern)
+            try:
+                for name, raw in archive:
+                    if not put(members, (file_name + MEMBER_SEPARATOR + name, raw, None), stop):
+                        return
+            except ARCHIVE_ERRORS as exception:
+                if not put(members, (file_name, None, str(exception) or type(exception).__name__), stop):
+                    return
+            finally:
+                archive.close()
+    finally:
+        put(members, None, stop)
+
+
+def archive_members(paths, pattern='*', queue_size=DEFAULT_QUEUE_SIZE):
+    """Yield (location, bytes, error) for every member of each archive in turn, in archive
+    order, read by a producer thread at most queue_size members ahead. See produce().
+    """
+    members = queue.Queue(queue_size)
+    stop = threading.Event()
+    producer = threading.Thread(target=produce, args=(paths, pattern, members, stop), name='OTPArchive producer')
+    producer.daemon = True  # Do not hold the process open if the consumer hangs.
+    producer.start()
+    try:
+        while True:
+            member = members.get()
+            if member is None:
+                break
+            yield member
+    finally:  # Also when the consumer stops early, so the producer does not wait on a full queue.
+        stop.set()
+        producer.join()
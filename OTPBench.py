@@ -0,0 +1,242 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Raspberry Pi OTP Parser Benchmarks
+
+ Copyright 2019-2022 Jasmine Iwanek & Dylan Morrison
+
+ Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ software and associated documentation files (the "Software"), to deal in the Software
+ without restriction, including without limitation the rights to use, copy, modify, merge,
+ publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+ to whom the Software is furnished to do so, subject to the following conditions:
+
+ The above copyright notice and this permission notice shall be included in all copies or
+ substantial portions of the Software.
+
+ THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+ FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+ DEALINGS IN THE SOFTWARE.
+
+ Usage
+ ./OTPBench.py [--max N] [--stages a,b] [--memory] [--output results.json] [--compare old.json]
+ Runs each stage over 1, 10, 100, ... up to N synthetic dumps (from OTPSynth.py) and reports
+ seconds, dumps/sec and MB/sec, and lines/sec for the text parsers. --memory also records the
+ peak traced allocation of each run.
+ --output saves the results as JSON, and --compare prints the speed-up against a saved run.
+
+ Stages
+ parse_text    - OTPDump.from_bytes() on 'vcgencmd otp_dump' text, with the bytes tokenizer
+ parse_lines   - OTPDump.from_lines() on the same text decoded and split, a line at a time
+ parse_image   - OTPDump.from_image() on packed binary images
+ decode        - OTPDump.decode() of every field
+ render_text   - render_text(), the CLI's output
+ render_ndjson - OTPOutput.NDJSONWriter, output discarded
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+
+import OTPOutput
+import OTPParser
+import OTPSynth
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+CLOCK = getattr(time, 'perf_counter', time.time)
+
+# Distinct synthetic dumps to cycle through, so large runs do not need large inputs.
+POOL_SIZE = 4096
+
+
+def make_pool(seed=0):
+    """Build the text, image and parsed forms of POOL_SIZE valid synthetic dumps."""
+    texts = []
+    images = []
+    for _, regions, text in OTPSynth.generate(POOL_SIZE, seed):
+        texts.append(text.encode('ascii'))
+        images.append(OTPSynth.dump_image(regions))
+    return {'texts': texts, 'images': b''.join(images),
+            'dumps': [OTPParser.OTPDump.from_bytes(text) for text in texts],
+            'lines_per_dump': sum(text.count(b'\n') for text in texts) / len(texts)}
+
+
+def stage_parse_text(pool, count):
+    """Parse count text dumps, returning the bytes consumed."""
+    texts = pool['texts']
+    size = 0
+    for text in itertools.islice(itertools.cycle(texts), count):
+        OTPParser.OTPDump.from_bytes(text)
+        size += len(text)
+    return size
+
+
+def stage_parse_lines(pool, count):
+    """Parse count text dumps with the line reader, returning the bytes consumed."""
+    texts = pool['texts']
+    size = 0
+    for text in itertools.islice(itertools.cycle(texts), count):
+        OTPParser.OTPDump.from_lines(text.decode('ascii').splitlines())
+        size += len(text)
+    return size
+
+
+def stage_parse_image(pool, count):
+    """Parse count binary images, returning the bytes consumed."""
+    images = pool['images']
+    image_size = OTPParser.OTP_IMAGE.size
+    for index in range(count):
+        OTPParser.OTPDump.from_image(images, (index % POOL_SIZE) * image_size)
+    return count * image_size
+
+
+def stage_decode(pool, count):
+    """Decode every field of count dumps, returning the characters produced."""
+    size = 0
+    for dump in itertools.islice(itertools.cycle(pool['dumps']), count):
+        size += sum(len(value) for value in dump.decode().values())
+    return size
+
+
+def stage_render_text(pool, count):
+    """Render count dumps as the CLI does, returning the characters produced."""
+    size = 0
+    for dump in itertools.islice(itertools.cycle(pool['dumps']), count):
+        size += sum(len(line) + 1 for line in OTPParser.render_text(dump))
+    return size
+
+
+class CountingSink(object):
+    """A binary stream that throws data away, only counting it."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+    def flush(self):
+        pass
+
+
+def stage_render_ndjson(pool, count):
+    """Write count records as NDJSON, returning the bytes produced."""
+    sink = CountingSink()
+    with OTPOutput.NDJSONWriter(sink) as writer:
+        for dump in itertools.islice(itertools.cycle(pool['dumps']), count):
+            writer.write({'board': dump.decode(), 'warnings': dump.warnings})
+    return sink.size
+
+
+STAGES = (
+    ('parse_text', stage_parse_text),
+    ('parse_lines', stage_parse_lines),
+    ('parse_image', stage_parse_image),
+    ('decode', stage_decode),
+    ('render_text', stage_render_text),
+    ('render_ndjson', stage_render_ndjson),
+)
+
+# Stages that read text, for which lines/sec is reported.
+TEXT_STAGES = ('parse_text', 'parse_lines')
+
+
+def sizes(maximum):
+    """1, 10, 100, ... up to and including maximum."""
+    size = 1
+    while size < maximum:
+        yield size
+        size *= 10
+    yield maximum
+
+
+def run_stage(name, function, pool, count, memory=False):
+    """Time one stage over count dumps, returning a result dict."""
+    start = CLOCK()
+    size = function(pool, count)
+    elapsed = CLOCK() - start
+    result = {
+        'stage': name,
+        'count': count,
+        'seconds': elapsed,
+        'dumps_per_sec': count / elapsed if elapsed else None,
+        'mb_per_sec': size / elapsed / 1e6 if elapsed else None,
+    }
+    if name in TEXT_STAGES and elapsed:
+        result['lines_per_sec'] = count * pool['lines_per_dump'] / elapsed
+    if memory and tracemalloc is not None:
+        tracemalloc.start()
+        function(pool, count)
+        result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def compare(results, baseline):
+    """Yield (stage, count, speed-up) against a baseline run's results."""
+    previous = dict(((result['stage'], result['count']), result) for result in baseline['results'])
+    for result in results:
+        old = previous.get((result['stage'], result['count']))
+        if old and old['dumps_per_sec'] and result['dumps_per_sec']:
+            yield result['stage'], result['count'], result['dumps_per_sec'] / old['dumps_per_sec']
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description='Benchmark OTP dump parsing, decoding and rendering.')
+    parser.add_argument('--max', type=int, default=100000, help='largest number of dumps per stage')
+    parser.add_argument('--stages', help='comma separated stages to run (default: all)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the synthetic dumps')
+    parser.add_argument('--memory', action='store_true', help='record peak memory (runs each stage twice)')
+    parser.add_argument('--output', help='save results to this JSON file')
+    parser.add_argument('--compare', help='JSON file from an earlier --output to compare against')
+    args = parser.parse_args(argv)
+
+    stages = STAGES
+    if args.stages:
+        wanted = args.stages.split(',')
+        stages = [(name, function) for name, function in STAGES if name in wanted]
+        if len(stages) != len(wanted):
+            parser.error('unknown stage in ' + args.stages)
+
+    pool = make_pool(args.seed)
+    results = []
+    print('%-14s %9s %10s %14s %10s %14s %12s' % ('stage', 'dumps', 'seconds', 'dumps/sec', 'MB/sec', 'lines/sec',
+                                                  'peak bytes'))
+    for name, function in stages:
+        for count in sizes(args.max):
+            result = run_stage(name, function, pool, count, args.memory)
+            results.append(result)
+            lines = result.get('lines_per_sec')
+            print('%-14s %9d %10.4f %14.1f %10.2f %14s %12s' % (
+                name, count, result['seconds'], result['dumps_per_sec'] or 0, result['mb_per_sec'] or 0,
+                '%.0f' % lines if lines else '-', result.get('peak_bytes', '-')))
+            sys.stdout.flush()
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'python': platform.python_version(), 'platform': platform.platform(),
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'max': args.max, 'seed': args.seed,
+                       'results': results}, output_file, indent=1, sort_keys=True)
+    if args.compare:
+        with open(args.compare, 'r') as baseline_file:
+            baseline = json.load(baseline_file)
+        print()
+        print('Speed-up against', args.compare)
+        for name, count, ratio in compare(results, baseline):
+            print('%-14s %9d %8.2fx' % (name, count, ratio))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Raspberry Pi Compact Board Records
+
+ Copyright 2019-2022 Jasmine Iwanek & Dylan Morrison
+
+ Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ software and associated documentation files (the "Software"), to deal in the Software
+ without restriction, including without limitation the rights to use, copy, modify, merge,
+ publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+ to whom the Software is furnished to do so, subject to the following conditions:
+
+ The above copyright notice and this permission notice shall be included in all copies or
+ substantial portions of the Software.
+
+ THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+ FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+ DEALINGS IN THE SOFTWARE.
+
+ Usage
+ ./OTPBoards.py [--pattern GLOB] [--by board_type] <index.db, file, directory or glob> ...
+ Loads every board into a BoardStore, then prints how many boards there are of each value of
+ --by (memory_size, manufacturer, processor, board_type or board_revision) and the bytes the
+ store used per board.
+
+ Library use
+ A BoardStore keeps boards in two flat array('I') buffers: the raw words of regions 0 to 66
+ (REGION_COUNT words a board, missing regions as zero) and one word of packed codes for the
+ board information. Nothing else is kept per board, about 272 bytes in all. Indexing or
+ iterating a store makes BoardRecord views on demand, which read straight from the arrays;
+ call dump() on one for the full OTPParser decode.
+
+ The board information fields are codes, indexes into the *_LABELS tuples, e.g.
+ BOARD_TYPE_LABELS[record.code('board_type')] == record.board_type.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import array
+import sys
+
+import OTPParser
+
+# Boards are stored as regions 0 to 66, so a region's word is at the same offset in every board.
+REGION_COUNT = max(OTPParser.REGIONS.values()) + 1
+
+WORD_TYPE = OTPParser.word_type()
+
+REVISION_REGION = OTPParser.REGIONS['revision_number']
+
+
+def label_codes(names, name):
+    """Build a tuple of labels indexed by code from the labels OTPParser.board_info() takes for
+    one BoardInfo field: the *_NAMES tuple new style boards are decoded with, then the labels
+    only legacy boards can have (e.g. 'Qisda'). Codes below 2**width are the field's own value.
+    """
+    labels = list(names)
+    for label in sorted(set(getattr(board, name) for board in OTPParser.LEGACY_BOARDS)):
+        if label not in labels:
+            labels.append(label)
+    return tuple(labels)
+
+
+# Every label board_info() can give has a code, since these are built from the same tables.
+MEMORY_SIZE_LABELS = label_codes(OTPParser.MEMORY_SIZE_NAMES, 'memory_size')
+MANUFACTURER_LABELS = label_codes(OTPParser.MANUFACTURER_NAMES, 'manufacturer')
+PROCESSOR_LABELS = label_codes(OTPParser.PROCESSOR_NAMES, 'processor')
+BOARD_TYPE_LABELS = label_codes(OTPParser.BOARD_TYPE_NAMES, 'board_type')
+BOARD_REVISION_LABELS = label_codes(OTPParser.BOARD_REVISION_NAMES, 'board_revision')
+
+# (BoardInfo field, labels, shift, width) of each code packed into a board's code word.
+CODE_FIELDS = (
+    ('memory_size',    MEMORY_SIZE_LABELS,     0, 4),
+    ('manufacturer',   MANUFACTURER_LABELS,    4, 5),
+    ('processor',      PROCESSOR_LABELS,       9, 5),
+    ('board_type',     BOARD_TYPE_LABELS,     14, 9),
+    ('board_revision', BOARD_REVISION_LABELS, 23, 5),
+)
+CODE_LAYOUT = dict((name, (labels, shift, (1 << width) - 1)) for name, labels, shift, width in CODE_FIELDS)
+
+assert all(len(labels) <= 1 << width for _, labels, _, width in CODE_FIELDS), 'codes do not fit their widths'
+
+# Packed codes by revision word, a fleet only has a few dozen distinct ones.
+CODES_CACHE_SIZE = 4096
+CODES_CACHE = {}
+
+
+def board_codes(revision_word):
+    """Pack the board information of a revision number register into one code word."""
+    try:
+        return CODES_CACHE[revision_word]
+    except KeyError:
+        pass
+    info = OTPParser.board_info(revision_word)
+    codes = 0
+    for name, labels, shift, _ in CODE_FIELDS:
+        codes |= labels.index(getattr(info, name)) << shift
+    if len(CODES_CACHE) >= CODES_CACHE_SIZE:
+        CODES_CACHE.clear()
+    CODES_CACHE[revision_word] = codes
+    return codes
+
+
+class BoardRecord(object):
+    """A view of one board in a BoardStore. Reads go straight to the store's arrays."""
+
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    def word(self, region):
+        """Return the 32-bit word stored in the numbered region, zero if the dump lacked it."""
+        if not 0 <= region < REGION_COUNT:
+            raise OTPParser.InvalidOTPDump('Invalid OTP Dump (region ' + str(region) + ' missing)')
+        return self.store.words[self.index * REGION_COUNT + region]
+
+    def words(self):
+        """The board's REGION_COUNT words, as an array."""
+        start = self.index * REGION_COUNT
+        return self.store.words[start:start + REGION_COUNT]
+
+    def code(self, name):
+        """The code of a board information field, an index into its *_LABELS tuple."""
+        _, shift, mask = CODE_LAYOUT[name]
+        return (self.store.codes[self.index] >> shift) & mask
+
+    def label(self, name):
+        """The board information field as BoardInfo has it, e.g. label('board_type') == '4B'."""
+        labels, shift, mask = CODE_LAYOUT[name]
+        return labels[(self.store.codes[self.index] >> shift) & mask]
+
+    @property
+    def serial_number(self):
+        return self.store.words[self.index * REGION_COUNT + OTPParser.REGIONS['serial_number']]
+
+    @property
+    def revision_number(self):
+        return self.store.words[self.index * REGION_COUNT + REVISION_REGION]
+
+    @property
+    def mac_address(self):
+        """The MAC address as one 48-bit int, as OTPDump.format_mac() prints it, or None."""
+        start = self.index * REGION_COUNT
+        mac_one = self.store.words[start + OTPParser.REGIONS['mac_address_one']]
+        if not mac_one:
+            return None
+        return mac_one << 16 | self.store.words[start + OTPParser.REGIONS['mac_address_two']] >> 16
+
+    memory_size = property(lambda self: self.label('memory_size'))
+    manufacturer = property(lambda self: self.label('manufacturer'))
+    processor = property(lambda self: self.label('processor'))
+    board_type = property(lambda self: self.label('board_type'))
+    board_revision = property(lambda self: self.label('board_revision'))
+
+    def info(self):
+        """The board information as an OTPParser.BoardInfo."""
+        return OTPParser.BoardInfo(*[self.label(name) for name, _, _, _ in CODE_FIELDS])
+
+    def dump(self):
+        """Rebuild an OTPParser.OTPDump, for decoding every field."""
+        return OTPParser.OTPDump(dict(enumerate(self.words())))
+
+    def __eq__(self, other):
+        return isinstance(other, BoardRecord) and self.words() == other.words()
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<BoardRecord %d: %08x %s>' % (self.index, self.serial_number, self.board_type)
+
+
+class BoardStore(object):
+    """Many boards in contiguous storage: REGION_COUNT words and one code word each."""
+
+    def __init__(self):
+        self.words = array.array(WORD_TYPE)
+        self.codes = array.array(WORD_TYPE)
+
+    def append_words(self, words):
+        """Add a board from a sequence of REGION_COUNT words, regions 0 to 66."""
+        if len(words) != REGION_COUNT:
+            raise ValueError('A board is ' + str(REGION_COUNT) + ' words, not ' + str(len(words)))
+        codes = board_codes(words[REVISION_REGION])
+        self.words.extend(words)
+        self.codes.append(codes)
+
+    def append(self, dump):
+        """Add a board from an OTPParser.OTPDump, or a dict of region number to word."""
+        data = getattr(dump, 'data', dump)
+        self.append_words([data.get(region, 0) for region in range(REGION_COUNT)])
+
+    def append_image(self, image, offset=0):
+        """Add a board from a binary OTP image of little-endian words, see OTPParser.iter_images()."""
+        if len(image) - offset < OTPParser.OTP_IMAGE.size:
+            raise OTPParser.InvalidOTPDump('Invalid OTP Image (shorter than ' + str(OTPParser.OTP_IMAGE.size) +
+                                           ' bytes)')
+        words = array.array(WORD_TYPE, bytes(image[offset:offset + 4 * REGION_COUNT]))
+        if sys.byteorder == 'big':
+            words.byteswap()
+        self.append_words(words)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.codes)
+        if not 0 <= index < len(self.codes):
+            raise IndexError('board index out of range')
+        return BoardRecord(self, index)
+
+    def __iter__(self):
+        for index in range(len(self.codes)):
+            yield BoardRecord(self, index)
+
+    def column(self, region):
+        """Every board's word of one region, as an array."""
+        return self.words[region::REGION_COUNT]
+
+    def codes_of(self, name):
+        """Every board's code of one board information field, as a list."""
+        _, shift, mask = CODE_LAYOUT[name]
+        return [(codes >> shift) & mask for codes in self.codes]
+
+    def count_by(self, name):
+        """Count the boards with each label of a board information field, as {label: count}."""
+        labels = CODE_LAYOUT[name][0]
+        counts = {}
+        for code in self.codes_of(name):
+            counts[code] = counts.get(code, 0) + 1
+        return dict((labels[code], count) for code, count in counts.items())
+
+    def nbytes(self):
+        """Bytes used by the board data."""
+        return (len(self.words) + len(self.codes)) * self.words.itemsize
+
+
+def main(argv=None):
+    """Command line entry point."""
+    import OTPDiff  # Reads boards from indexes and dump files alike.
+
+    parser = argparse.ArgumentParser(description='Load boards into compact storage and count them.')
+    parser.add_argument('inputs', nargs='+', help='OTPIndex.py databases, dump files, directories or globs')
+    parser.add_argument('--pattern', default='*', help='file name pattern used inside directories')
+    parser.add_argument('--by', choices=[name for name, _, _, _ in CODE_FIELDS], default='board_type',
+                        help='board information field to count by (default: board_type)')
+    args = parser.parse_args(argv)
+
+    store = BoardStore()
+    errors = 0
+    for source in args.inputs:
+        for serial_number, location, image in OTPDiff.scan_images(source, args.pattern):
+            if serial_number is None:
+                errors += 1
+                print(location + ': ' + str(image), file=sys.stderr)
+                continue
+            try:
+                store.append_image(image)
+            except OTPParser.InvalidOTPDump as exception:
+                errors += 1
+                print(location + ': ' + str(exception), file=sys.stderr)
+    for label, count in sorted(store.count_by(args.by).items(), key=lambda item: (-item[1], item[0])):
+        print('%-16s %d' % (label, count))
+    print('Boards:', len(store), 'Bytes per board:', store.nbytes() // len(store) if len(store) else 0,
+          'Failed:', errors, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Raspberry Pi Bootrom Reconstruction
+
+ Copyright 2019-2022 Jasmine Iwanek & Dylan Morrison
+
+ Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ software and associated documentation files (the "Software"), to deal in the Software
+ without restriction, including without limitation the rights to use, copy, modify, merge,
+ publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+ to whom the Software is furnished to do so, subject to the following conditions:
+
+ The above copyright notice and this permission notice shall be included in all copies or
+ substantial portions of the Software.
+
+ THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+ FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+ DEALINGS IN THE SOFTWARE.
+
+ Usage
+ ./OTPBootrom.py [--output bootrom.bin] [--base ADDRESS] [--size BYTES] <capture.log> ...
+ Turns the 'BOOTROM DUMP:' sections of test-harness UART captures (see OTPCapture.py) back
+ into a binary image of little-endian words, as the VideoCore sees it. Writes one JSON record
+ per section, with its SHA-256, missing address ranges and any problems, then one for the
+ merged image of every section. Sections may be partial: the merge fills in each row from
+ whichever capture has it, and reports words two captures disagree on.
+ --output writes the merged image, with missing rows left as zero bytes.
+ Exits with an error if any words conflict.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import array
+import binascii
+import hashlib
+import json
+import sys
+
+import OTPCapture
+import OTPParser
+
+# dump_bootrom() prints the 64 KiB from here.
+BOOTROM_BASE = 0x60000000
+BOOTROM_SIZE = 0x10000
+
+# Bytes printed per row.
+ROW_SIZE = 16
+
+# A four byte array type, to turn big-endian hex into little-endian words.
+WORD_TYPE = OTPParser.word_type()
+
+
+def words_to_bytes(text):
+    """Turn space separated 8 digit hex words into their little-endian bytes, all at once."""
+    words = array.array(WORD_TYPE, binascii.unhexlify(text.replace(' ', '')))
+    words.byteswap()  # unhexlify gives each word most significant byte first.
+    return words.tobytes() if hasattr(words, 'tobytes') else words.tostring()
+
+
+def runs(flags, value):
+    """Yield (first, end) index ranges of consecutive items of flags equal to value."""
+    other = bytearray([not value])
+    value = bytearray([value])
+    first = flags.find(value)
+    while first != -1:
+        end = flags.find(other, first)
+        if end == -1:
+            end = len(flags)
+        yield first, end
+        first = flags.find(value, end)
+
+
+class BootromImage(object):
+    """A bootrom image filled in from captured rows.
+
+    The image is allocated up front; covered holds one flag per row, so rows seen more than
+    once can be checked against each other. Words that differ from those already in the
+    image are kept as first seen and recorded in conflicts.
+    """
+
+    def __init__(self, base=BOOTROM_BASE, size=BOOTROM_SIZE):
+        if size <= 0 or size % ROW_SIZE:
+            raise ValueError('Bootrom size must be a positive multiple of ' + str(ROW_SIZE))
+        self.base = base
+        self.size = size
+        self.image = bytearray(size)
+        self.covered = bytearray(size // ROW_SIZE)
+        self.conflicts = []  # {'address', 'kept', 'kept_from', 'other', 'other_from'}
+        self.sources = {}    # row -> location of the capture that filled it
+
+    def add(self, address, data, location):
+        """Copy data, a whole number of rows read from address, into the image."""
+        offset = address - self.base
+        if offset < 0 or offset + len(data) > self.size:
+            raise ValueError('Rows from ' + format(address, '#010x') + ' are outside the image')
+        first = offset // ROW_SIZE
+        end = first + len(data) // ROW_SIZE
+        if not any(self.covered[first:end]):
+            self.image[offset:offset + len(data)] = data
+            self.covered[first:end] = b'\x01' * (end - first)
+            self.sources[first] = location
+            return
+        if self.image[offset:offset + len(data)] == data and all(self.covered[first:end]):
+            return
+        for row in range(first, end):
+            start = row * ROW_SIZE
+            new = data[start - offset:start - offset + ROW_SIZE]
+            if not self.covered[row]:
+                self.image[start:start + ROW_SIZE] = new
+                self.covered[row] = 1
+                self.sources[row] = location
+                continue
+            for word in range(0, ROW_SIZE, 4):
+                kept = self.image[start + word:start + word + 4]
+                other = new[word:word + 4]
+                if kept != other:
+                    self.conflicts.append({
+                        'address': format(self.base + start + word, '#010x'),
+                        'kept': format(array.array(WORD_TYPE, bytes(kept))[0], '08X'),
+                        'kept_from': self.source(row),
+                        'other': format(array.array(WORD_TYPE, bytes(other))[0], '08X'),
+                        'other_from': location,
+                    })
+
+    def source(self, row):
+        """The location that first filled a row."""
+        while row not in self.sources:
+            row -= 1  # Only the first row of each bulk copy is recorded.
+        return self.sources[row]
+
+    def add_image(self, other, location):
+        """Merge in every row another image has, see add()."""
+        for first, end in runs(other.covered, 1):
+            self.add(other.base + first * ROW_SIZE, bytes(other.image[first * ROW_SIZE:end * ROW_SIZE]), location)
+
+    def gaps(self):
+        """Return [(first, end)] address ranges of rows not yet seen."""
+        return [(self.base + first * ROW_SIZE, self.base + end * ROW_SIZE) for first, end in runs(self.covered, 0)]
+
+    def complete(self):
+        """True once every row has been seen."""
+        return all(self.covered)
+
+    def sha256(self):
+        """Hex SHA-256 of the image, missing rows as zero bytes."""
+        return hashlib.sha256(self.image).hexdigest()
+
+
+def section_image(section, location, base=None, size=None):
+    """Build a BootromImage from an OTPCapture bootrom section.
+    Returns the image and a list of problems with the capture's rows: addresses out of order,
+    outside the image or not on a row boundary. base and size default to the header's range.
+    """
+    start, end = section.span
+    if base is None:
+        base = start
+    if size is None:
+        size = end - start
+    image = BootromImage(base, size)
+    problems = []
+    run_address = expected = None
+    texts = []
+    for address, text in section.values:
+        outside = address % ROW_SIZE or not base <= address < base + size
+        if address != expected or outside:
+            if texts:
+                image.add(run_address, words_to_bytes(' '.join(texts)), location)
+                texts = []
+            if outside:
+                problems.append({'address': format(address, '#010x'),
+                                 'problem': 'outside the image' if address % ROW_SIZE == 0 else 'not row aligned'})
+                expected = None
+                continue
+            if expected is not None:
+                problems.append({'address': format(address, '#010x'),
+                                 'problem': 'expected ' + format(expected, '#010x')})
+            run_address = address
+        texts.append(text)
+        expected = address + ROW_SIZE
+    if texts:
+        image.add(run_address, words_to_bytes(' '.join(texts)), location)
+    return image, problems
+
+
+def format_range(first_end):
+    """Format an address range for output."""
+    return [format(first_end[0], '#010x'), format(first_end[1], '#010x')]
+
+
+def image_record(image, location, rows=None, problems=()):
+    """Build the output record for an image."""
+    record = {'location': location, 'sha256': image.sha256(), 'complete': image.complete(),
+              'gaps': [format_range(gap) for gap in image.gaps()], 'conflicts': image.conflicts}
+    if rows is not None:
+        record['rows'] = rows
+    if problems:
+        record['problems'] = list(problems)
+    return record
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description='Rebuild the bootrom from test-harness UART captures.')
+    parser.add_argument('captures', nargs='+', help='capture logs, - for stdin')
+    parser.add_argument('--output', '-o', help='write the merged image to this file')
+    parser.add_argument('--base', type=lambda value: int(value, 0), default=BOOTROM_BASE,
+                        help='address of the first byte of the image (default: %(default)#x)')
+    parser.add_argument('--size', type=lambda value: int(value, 0), default=BOOTROM_SIZE,
+                        help='bytes in the image (default: %(default)#x)')
+    args = parser.parse_args(argv)
+    try:
+        merged = BootromImage(args.base, args.size)
+    except ValueError as exception:
+        parser.error(str(exception))
+
+    sections = errors = 0
+    for file_name in args.captures:
+        try:
+            capture = open(file_name, 'rb') if file_name != '-' else getattr(sys.stdin, 'buffer', sys.stdin)
+        except (IOError, OSError) as exception:
+            errors += 1
+            print(file_name + ': Unable to open file (' + str(exception) + ')', file=sys.stderr)
+            continue
+        try:
+            for section in OTPCapture.iter_sections(capture):
+                if section.kind != 'bootrom':
+                    continue
+                sections += 1
+                location = file_name + ':' + str(section.line)
+                image, problems = section_image(section, location, args.base, args.size)
+                merged.add_image(image, location)
+                print(json.dumps(image_record(image, location, len(section.values), problems), sort_keys=True))
+        finally:
+            if file_name != '-':
+                capture.close()
+    if not sections:
+        sys.exit('No bootrom dumps found.')
+
+    print(json.dumps(image_record(merged, 'merged'), sort_keys=True))
+    if args.output:
+        with open(args.output, 'wb') as output_file:
+            output_file.write(merged.image)
+    print('Sections:', sections, 'Missing rows:', merged.covered.count(0), 'Conflicts:', len(merged.conflicts),
+          'SHA-256:', merged.sha256(), file=sys.stderr)
+    if merged.conflicts or errors:
+        sys.exit(str(len(merged.conflicts)) + ' conflicting words, ' + str(errors) + ' errors.')
+
+
+if __name__ == '__main__':
+    main()
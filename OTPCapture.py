@@ -0,0 +1,210 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Raspberry Pi Test-Harness Capture Reader
+
+ Copyright 2019-2022 Jasmine Iwanek & Dylan Morrison
+
+ Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ software and associated documentation files (the "Software"), to deal in the Software
+ without restriction, including without limitation the rights to use, copy, modify, merge,
+ publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+ to whom the Software is furnished to do so, subject to the following conditions:
+
+ The above copyright notice and this permission notice shall be included in all copies or
+ substantial portions of the Software.
+
+ THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+ FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+ DEALINGS IN THE SOFTWARE.
+
+ Usage
+ ./OTPCapture.py [--fields a,b] <capture.log> ...
+ Reads mini-UART captures of the test-harness (see test-harness/vc4-runner.c) and writes one
+ JSON record per dump section found, in capture order:
+ otp_data      - 'OTP DATA DUMP:', every OTP row as '%3u: 0x%08x', decoded like any other dump.
+                 Unlike 'vcgencmd otp_dump', this includes the boot signing key rows.
+ otp_registers - 'OTP REGISTER DUMP:', the OTP controller registers as name -> value
+ pll_registers - 'A2W PLL DEFAULT REGISTER VALUES DUMP:', the PLL registers as name -> value
+ bootrom       - 'BOOTROM DUMP:', the address range and row count only, see OTPBootrom.py
+ Captures may hold any number of runs. Banners, test output and CRLF line endings are fine.
+ Use - to read a capture from stdin.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import json
+import re
+import sys
+
+import OTPParser
+
+try:
+    from collections import OrderedDict as OrderedValues
+except ImportError:  # Python 2.6
+    OrderedValues = dict
+
+# Section header, as printed by the harness, to the kind of section it starts.
+SECTION_HEADERS = {
+    'OTP DATA DUMP:':                        'otp_data',
+    'OTP REGISTER DUMP:':                    'otp_registers',
+    'A2W PLL DEFAULT REGISTER VALUES DUMP:': 'pll_registers',
+}
+
+HEADER_LINE = re.compile(r'\s*(' + '|'.join(re.escape(header) for header in SECTION_HEADERS) + r')\s*$')
+
+# dump_bootrom(): 'BOOTROM DUMP: (%08x to %08x)', first and one past the last address.
+BOOTROM_HEADER = re.compile(r'\s*BOOTROM DUMP: \(([0-9a-fA-F]{8}) to ([0-9a-fA-F]{8})\)\s*$')
+
+# dump_otp_data(): '%3u: 0x%08x'
+OTP_ROW = re.compile(r'\s*(\d+): 0x([0-9a-fA-F]{8})\s*$')
+
+# dump_otp_regs(): '\t%023s:\t0x%08x' and dump_pll_regs(): '\t%016s: 0x%08x'. A 0 flag on %s
+# is undefined in C, so the names may be padded with spaces or zeros.
+REGISTER_ROW = re.compile(r'\t[ 0]*([A-Za-z_]\w*):\s*0x([0-9a-fA-F]{8})\s*$')
+
+# dump_bootrom(): '0x%08x: %08X %08X %08X %08X', an address and the four words from it.
+BOOTROM_ROW = re.compile(r'\s*0x([0-9a-fA-F]{8}): ((?:[0-9a-fA-F]{8} ){3}[0-9a-fA-F]{8})\s*$')
+
+ROWS = {
+    'otp_data':      OTP_ROW,
+    'otp_registers': REGISTER_ROW,
+    'pll_registers': REGISTER_ROW,
+    'bootrom':       BOOTROM_ROW,
+}
+
+
+class CaptureSection(object):
+    """One dump section of a capture: its kind, 1-based line number of its header and values.
+    values maps OTP row number to word for otp_data sections, and register name to value for
+    register sections, in the order they were printed. For bootrom sections, values is a list
+    of (address, the row's four words as printed) in printed order, and span is the
+    (first, end) address range from the header.
+    """
+
+    def __init__(self, kind, line, values, span=None):
+        self.kind = kind
+        self.line = line
+        self.values = values
+        self.span = span
+
+    def dump(self):
+        """Decode an otp_data section into an OTPParser.OTPDump."""
+        if self.kind != 'otp_data':
+            raise ValueError('A ' + self.kind + ' section is not an OTP dump')
+        if not self.values:
+            raise OTPParser.InvalidOTPDump('Invalid OTP Dump (no OTP rows after line ' + str(self.line) + ')')
+        return OTPParser.OTPDump(dict(self.values))
+
+    def registers(self):
+        """The register values of an otp_registers or pll_registers section, as a list of
+        (name, value) pairs in printed order."""
+        return list(self.values.items())
+
+
+def iter_sections(lines):
+    """Yield a CaptureSection for each dump section in an iterable of capture lines, as it ends.
+    Lines may be str or bytes. A section ends at the first line that is not one of its rows.
+    """
+    kind = None
+    values = span = None
+    start = 0
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('ascii', 'replace')
+        line = line.rstrip('\r\n')
+        if kind is not None:
+            match = ROWS[kind].match(line)
+            if match:
+                if kind == 'bootrom':
+                    values.append((int(match.group(1), 16), match.group(2)))
+                elif kind == 'otp_data':
+                    values[int(match.group(1))] = int(match.group(2), 16)
+                else:
+                    values[match.group(1)] = int(match.group(2), 16)
+                continue
+            yield CaptureSection(kind, start, values, span)
+            kind = None
+        header = HEADER_LINE.match(line)
+        if header:
+            kind = SECTION_HEADERS[header.group(1)]
+            values = OrderedValues()
+            span = None
+            start = number
+            continue
+        header = BOOTROM_HEADER.match(line)
+        if header:
+            kind = 'bootrom'
+            values = []
+            span = (int(header.group(1), 16), int(header.group(2), 16))
+            start = number
+    if kind is not None:
+        yield CaptureSection(kind, start, values, span)
+
+
+def section_record(section, fields=None):
+    """Build the output record for a section. Never raises for a bad dump."""
+    record = {'section': section.kind, 'line': section.line}
+    if section.kind == 'bootrom':
+        record['start'] = format(section.span[0], '#010x')
+        record['end'] = format(section.span[1], '#010x')
+        record['rows'] = len(section.values)
+        return record
+    if section.kind != 'otp_data':
+        record['registers'] = dict((name, format(value, '#010x')) for name, value in section.registers())
+        return record
+    record['rows'] = len(section.values)
+    try:
+        dump = section.dump()
+        record['board'] = dump.decode(fields)
+    except OTPParser.InvalidOTPDump as exception:
+        record['error'] = str(exception)
+        return record
+    record['warnings'] = dump.warnings
+    return record
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description='Read OTP and register dumps from test-harness UART captures.')
+    parser.add_argument('captures', nargs='+', help='capture logs, - for stdin')
+    parser.add_argument('--fields', help='comma separated fields to decode from OTP data (default: all)')
+    args = parser.parse_args(argv)
+    fields = None
+    if args.fields:
+        try:
+            fields = OTPParser.resolve_fields(args.fields)
+        except ValueError as exception:
+            parser.error(str(exception))
+
+    errors = sections = 0
+    for file_name in args.captures:
+        try:
+            capture = open(file_name, 'rb') if file_name != '-' else getattr(sys.stdin, 'buffer', sys.stdin)
+        except (IOError, OSError) as exception:
+            errors += 1
+            print(file_name + ': Unable to open file (' + str(exception) + ')', file=sys.stderr)
+            continue
+        try:
+            for section in iter_sections(capture):
+                record = section_record(section, fields)
+                record['file'] = file_name
+                sections += 1
+                if 'error' in record:
+                    errors += 1
+                    print(file_name + ':' + str(section.line) + ': ' + record['error'], file=sys.stderr)
+                print(json.dumps(record, sort_keys=True))
+        finally:
+            if file_name != '-':
+                capture.close()
+    if not sections:
+        sys.exit('No dump sections found.')
+    if errors:
+        sys.exit(str(errors) + ' errors.')
+
+
+if __name__ == '__main__':
+    main()
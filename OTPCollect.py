@@ -0,0 +1,179 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""Raspberry Pi OTP Collector
+
+ Copyright 2019-2022 Jasmine Iwanek & Dylan Morrison
+
+ Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ software and associated documentation files (the "Software"), to deal in the Software
+ without restriction, including without limitation the rights to use, copy, modify, merge,
+ publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+ to whom the Software is furnished to do so, subject to the following conditions:
+
+ The above copyright notice and this permission notice shall be included in all copies or
+ substantial portions of the Software.
+
+ THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+ FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+ DEALINGS IN THE SOFTWARE.
+
+ Usage
+ ./OTPCollect.py [-c CONCURRENCY] [--timeout SECONDS] [--retries N] [--command TEMPLATE] <target> ...
+ ./OTPCollect.py [options] --targets-file <file>
+ Runs the command template for every target, 'ssh {target} vcgencmd otp_dump' by default, and
+ parses each one's output as it streams in. Writes one JSON record per target to stdout as
+ targets finish. Any local command can stand in for ssh, e.g. --command 'cat {target}'.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import sys
+
+if sys.version_info < (3, 6):
+    sys.exit('OTPCollect requires Python 3.6 and newer.')
+
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import signal
+
+import OTPParser
+
+DEFAULT_COMMAND = 'ssh -o BatchMode=yes {target} vcgencmd otp_dump'
+
+
+class CollectionError(Exception):
+    """Raised when a target's command fails in a way that is worth retrying."""
+    pass
+
+
+def kill(process):
+    """Kill a command along with anything it started, which may still hold its output pipes."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (AttributeError, OSError):
+        process.kill()
+
+
+async def read_dump(target, command, timeout):
+    """Run the command for one target, parsing its output line by line as it arrives."""
+    argv = [part.format(target=target) for part in shlex.split(command)]
+    try:
+        process = await asyncio.create_subprocess_exec(*argv, stdin=asyncio.subprocess.DEVNULL,
+                                                       stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE,
+                                                       start_new_session=True)
+    except OSError as exception:
+        raise CollectionError('Unable to run ' + argv[0] + ' (' + str(exception) + ')')
+
+    async def parse_output():
+        data = {}
+        while True:
+            line = await process.stdout.readline()
+            if not line:
+                break
+            if line.strip():
+                region, word = OTPParser.parse_line(line.decode('ascii', 'replace'))
+                data[region] = word
+        return data
+
+    try:
+        data, stderr = await asyncio.wait_for(asyncio.gather(parse_output(), process.stderr.read()), timeout)
+        returncode = await asyncio.wait_for(process.wait(), timeout)
+    except asyncio.TimeoutError:
+        raise CollectionError('Timed out after ' + str(timeout) + ' seconds')
+    finally:
+        if process.returncode is None:
+            kill(process)
+            await process.wait()
+    if returncode != 0:
+        message = stderr.decode('utf-8', 'replace').strip()
+        raise CollectionError('Command exited with status ' + str(returncode) + (': ' + message if message else ''))
+    if not data:
+        raise OTPParser.InvalidOTPDump("Invalid OTP Dump (empty file). Please run 'vcgencmd otp_dump' to create file.")
+    return OTPParser.OTPDump(data)
+
+
+async def collect_target(target, command, semaphore, timeout, retries):
+    """Collect and decode one target's dump, retrying failed commands. Never raises."""
+    record = {'target': target}
+    async with semaphore:
+        for attempt in range(1, retries + 2):
+            record['attempts'] = attempt
+            try:
+                dump = await read_dump(target, command, timeout)
+                board = dump.decode()
+            except CollectionError as exception:
+                record['error'] = str(exception)
+                continue
+            except OTPParser.InvalidOTPDump as exception:
+                record['error'] = str(exception)  # Bad output will not get better with a retry.
+                break
+            record.pop('error', None)
+            record['board'] = board
+            record['warnings'] = dump.warnings
+            break
+    return record
+
+
+async def collect(targets, command=DEFAULT_COMMAND, concurrency=16, timeout=30.0, retries=1):
+    """Collect every target with at most concurrency commands running at once.
+    Yields records in the order targets finish.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    pending = [asyncio.ensure_future(collect_target(target, command, semaphore, timeout, retries))
+               for target in targets]
+    try:
+        for finished in asyncio.as_completed(pending):
+            yield await finished
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def run(args, targets):
+    """Print a record for each target as it completes, returning the number of failures."""
+    errors = 0
+    async for record in collect(targets, args.command, args.concurrency, args.timeout, args.retries):
+        if 'error' in record:
+            errors += 1
+            print(record['target'] + ': ' + record['error'], file=sys.stderr)
+        print(json.dumps(record, sort_keys=True), flush=True)
+    return errors
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description='Collect and decode OTP dumps from many boards at once.')
+    parser.add_argument('targets', nargs='*', help='hosts (or anything the command template expects)')
+    parser.add_argument('--targets-file', help='file with one target per line')
+    parser.add_argument('--command', default=DEFAULT_COMMAND,
+                        help="command template, {target} is replaced (default: '" + DEFAULT_COMMAND + "')")
+    parser.add_argument('-c', '--concurrency', type=int, default=16, help='commands running at once')
+    parser.add_argument('--timeout', type=float, default=30.0, help='seconds allowed per attempt')
+    parser.add_argument('--retries', type=int, default=1, help='extra attempts for a failed command')
+    args = parser.parse_args(argv)
+
+    targets = list(args.targets)
+    if args.targets_file:
+        with open(args.targets_file, 'r') as targets_file:
+            targets.extend(line.strip() for line in targets_file if line.strip() and not line.startswith('#'))
+    if not targets:
+        parser.error('no targets given')
+
+    loop = asyncio.new_event_loop()
+    try:
+        errors = loop.run_until_complete(run(args, targets))
+    finally:
+        loop.close()
+    if errors:
+        sys.exit(str(errors) + ' of ' + str(len(targets)) + ' targets failed.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Raspberry Pi OTP Columnar Decoder
+
+ Copyright 2019-2022 Jasmine Iwanek & Dylan Morrison
+
+ Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ software and associated documentation files (the "Software"), to deal in the Software
+ without restriction, including without limitation the rights to use, copy, modify, merge,
+ publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+ to whom the Software is furnished to do so, subject to the following conditions:
+
+ The above copyright notice and this permission notice shall be included in all copies or
+ substantial portions of the Software.
+
+ THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+ FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+ DEALINGS IN THE SOFTWARE.
+
+ Usage
+ ./OTPColumns.py <file, directory or glob> ...
+ Loads every dump into one (N, 67) array, decodes it column-wise and prints fleet histograms
+ by board type, manufacturer, processor and RAM size.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import array
+import operator
+import sys
+
+try:
+    import numpy
+except ImportError:
+    sys.exit('OTPColumns requires numpy!')
+
+import OTPParser
+
+# Arrays are indexed by region number, the same way as OTPParser.REGIONS.
+REGION_COUNT = max(OTPParser.REGIONS.values()) + 1
+
+WORD_TYPE = OTPParser.word_type()
+
+# A dump's regions 0 to 66 as a tuple, in one call, once the missing ones are filled in as zero.
+ALL_REGIONS = operator.itemgetter(*range(REGION_COUNT))
+ZERO_REGIONS = dict.fromkeys(range(REGION_COUNT), 0)
+
+
+def label_table(table_as_string, width):
+    """Build an array of labels indexed by field value, from one of the *_AS_STRING dicts.
+    Labels that only legacy boards can have (e.g. 'Qisda') are appended after the
+    2**width field values. Returns the array and a dict of label to index.
+    """
+    labels = [table_as_string.get(format(code, '0' + str(width) + 'b'), 'unknown') for code in range(1 << width)]
+    for label in sorted(table_as_string.values()):
+        if label not in labels:
+            labels.append(label)
+    return numpy.array(labels), dict((label, index) for index, label in reversed(list(enumerate(labels))))
+
+
+MEMORY_SIZE_LABELS, MEMORY_SIZE_INDEX = label_table(OTPParser.MEMORY_SIZES_AS_STRING, 3)
+MANUFACTURER_LABELS, MANUFACTURER_INDEX = label_table(OTPParser.MANUFACTURERS_AS_STRING, 4)
+PROCESSOR_LABELS, PROCESSOR_INDEX = label_table(OTPParser.PROCESSORS_AS_STRING, 4)
+BOARD_TYPE_LABELS, BOARD_TYPE_INDEX = label_table(OTPParser.BOARD_TYPES_AS_STRING, 8)
+BOARD_REVISION_LABELS, BOARD_REVISION_INDEX = label_table(OTPParser.BOARD_REVISIONS_AS_STRING, 4)
+
+
+def legacy_table(key, index):
+    """Map every 5-bit legacy revision code to a label index for one BoardInfo field."""
+    return numpy.array([index[getattr(board, key)] for board in OTPParser.LEGACY_BOARDS], dtype=numpy.intp)
+
+
+LEGACY_MEMORY_SIZE = legacy_table('memory_size', MEMORY_SIZE_INDEX)
+LEGACY_MANUFACTURER = legacy_table('manufacturer', MANUFACTURER_INDEX)
+LEGACY_PROCESSOR = legacy_table('processor', PROCESSOR_INDEX)
+LEGACY_BOARD_TYPE = legacy_table('board_type', BOARD_TYPE_INDEX)
+LEGACY_BOARD_REVISION = legacy_table('board_revision', BOARD_REVISION_INDEX)
+
+
+def words_from_dumps(dumps):
+    """Pack OTPParser.OTPDump objects into an (N, REGION_COUNT) uint32 array.
+    Regions missing from a dump are left as zero.
+    """
+    words = array.array(WORD_TYPE)
+    for dump in dumps:
+        regions = ZERO_REGIONS.copy()
+        regions.update(dump.data)
+        words.extend(ALL_REGIONS(regions))
+    return numpy.frombuffer(words, dtype=numpy.uint32).reshape(-1, REGION_COUNT)
+
+
+def load_files(paths):
+    """Read dump files into an (N, REGION_COUNT) array.
+    Returns the array, the paths that loaded and a list of (path, error) for those that did not.
+    """
+    dumps = []
+    loaded = []
+    errors = []
+    for file_name in paths:
+        try:
+            with open(file_name, 'rb') as otp_file:
+                dumps.append(OTPParser.OTPDump.from_bytes(otp_file.read()))
+            loaded.append(file_name)
+        except (IOError, OSError, OTPParser.InvalidOTPDump) as exception:
+            errors.append((file_name, str(exception)))
+    return words_from_dumps(dumps), loaded, errors
+
+
+def decode_columns(words):
+    """Decode an (N, REGION_COUNT) array column-wise.
+
+    Every REGISTER_SCHEMA field comes back as a 'register.field' array of ints, and the
+    board information as '<name>_code' index arrays plus '<name>' label arrays.
+    """
+    words = numpy.asarray(words, dtype=numpy.uint32)
+    columns = {}
+    for register, fields in OTPParser.FIELDS.items():
+        for name, (region, shift, mask, _) in fields.items():
+            columns[register + '.' + name] = (words[:, region] >> numpy.uint32(shift)) & numpy.uint32(mask)
+
+    revision = words[:, OTPParser.REGIONS['revision_number']]
+    new_style = columns['revision_number.new_flag'].astype(bool)
+    legacy = columns['revision_number.legacy_board_revision'].astype(numpy.intp)
+    board = (
+        ('memory_size', 'memory_size', LEGACY_MEMORY_SIZE, MEMORY_SIZE_LABELS),
+        ('manufacturer', 'manufacturer', LEGACY_MANUFACTURER, MANUFACTURER_LABELS),
+        ('processor', 'processor', LEGACY_PROCESSOR, PROCESSOR_LABELS),
+        ('board_type', 'board_type', LEGACY_BOARD_TYPE, BOARD_TYPE_LABELS),
+        ('board_revision', 'board_revision', LEGACY_BOARD_REVISION, BOARD_REVISION_LABELS),
+    )
+    for name, field, legacy_lookup, labels in board:
+        codes = numpy.where(new_style, columns['revision_number.' + field].astype(numpy.intp),
+                            legacy_lookup[legacy])
+        columns[name + '_code'] = codes
+        columns[name] = labels[codes]
+
+    columns['revision_number'] = revision
+    columns['serial_number'] = words[:, OTPParser.REGIONS['serial_number']]
+    columns['serial_ok'] = (columns['serial_number'] ^
+                            words[:, OTPParser.REGIONS['serial_number_inverted']]) == numpy.uint32(0xffffffff)
+    columns['bootmode_ok'] = (words[:, OTPParser.REGIONS['bootmode']] ==
+                              words[:, OTPParser.REGIONS['bootmode_copy']])
+    return columns
+
+
+def histogram(labels):
+    """Count each distinct label, returning a list of (label, count), most common first."""
+    values, counts = numpy.unique(labels, return_counts=True)
+    order = numpy.argsort(-counts, kind='stable')
+    return [(str(values[i]), int(counts[i])) for i in order]
+
+
+def fleet_summary(columns):
+    """Histograms of the board information columns returned by decode_columns()."""
+    return dict((name, histogram(columns[name]))
+                for name in ('board_type', 'manufacturer', 'processor', 'memory_size', 'board_revision'))
+
+
+def main(argv=None):
+    """Command line entry point."""
+    import OTPFleet  # Only needed to expand command line inputs.
+
+    argv = sys.argv if argv is None else argv
+    if len(argv) < 2:
+        sys.exit('Usage: ' + argv[0] + ' <file, directory or glob> ...')
+    words, loaded, errors = load_files(OTPFleet.expand_inputs(argv[1:]))
+    for file_name, error in errors:
+        print(file_name + ': ' + error, file=sys.stderr)
+    columns = decode_columns(words)
+    print('Boards:', len(loaded))
+    print('Failed serial checksum:', int(numpy.count_nonzero(~columns['serial_ok'])))
+    print('Mismatched bootmode:', int(numpy.count_nonzero(~columns['bootmode_ok'])))
+    summary = fleet_summary(columns)
+    for name in ('board_type', 'manufacturer', 'processor', 'memory_size', 'board_revision'):
+        print()
+        print(name + ':')
+        for label, count in summary[name]:
+            print('  %-12s %d' % (label, count))
+
+
+if __name__ == '__main__':
+    main()
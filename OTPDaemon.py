@@ -0,0 +1,368 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Raspberry Pi OTP Decode Daemon
+
+ Copyright 2019-2022 Jasmine Iwanek & Dylan Morrison
+
+ Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ software and associated documentation files (the "Software"), to deal in the Software
+ without restriction, including without limitation the rights to use, copy, modify, merge,
+ publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+ to whom the Software is furnished to do so, subject to the following conditions:
+
+ The above copyright notice and this permission notice shall be included in all copies or
+ substantial portions of the Software.
+
+ THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+ FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+ DEALINGS IN THE SOFTWARE.
+
+ Usage
+ ./OTPDaemon.py [--socket PATH] [-j JOBS] [--max-pending N] [--max-connections N]
+ Serves OTP decodes on a Unix domain socket, so tools that decode a board at a time do not pay
+ for interpreter start-up and table construction on every call. The tables, the board
+ information cache and the worker processes stay warm between requests.
+
+ ./OTPDaemon.py --client [--socket PATH] [--fields a,b] [--lenient] <dump file> ...
+ Sends the dump files to a running daemon as one batch and writes a JSON record for each.
+
+ Protocol
+ Every message, each way, is a 4-byte big-endian length and then that many bytes of UTF-8 JSON.
+ A request is {"dumps": ["<vcgencmd otp_dump output>", ...], "fields": [...], "lenient": false,
+ "id": <anything>}; only dumps is required. The reply is {"id": ..., "results": [...]}, one
+ record per dump in order: {"board": {...}, "warnings": [...]} as OTPFleet.py writes them, or
+ {"error": "..."}. Lenient decodes add "diagnostics": [[line, region, reason], ...]. A request
+ that can not be read gets {"id": ..., "error": "..."}. Connections may send any number of
+ requests, one after another.
+
+ At most --max-connections clients are served at once, later ones wait in the listen backlog.
+ At most --max-pending batches are decoded at once; other connections are not read from until
+ one finishes, so a client sending faster than the workers decode blocks in send().
+ Use DecodeClient from Python, see OTPLoadTest.py for measuring it.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import functools
+import json
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+
+import OTPParser
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'otp-decode.sock')
+DEFAULT_MAX_PENDING = 4
+DEFAULT_MAX_CONNECTIONS = 64
+DEFAULT_MAX_MESSAGE = 64 * 1024 * 1024
+
+# Length prefix of every message.
+FRAME = struct.Struct('>I')
+
+
+class ProtocolError(Exception):
+    """Raised when a message can not be framed or read."""
+    pass
+
+
+def recv_exactly(connection, size):
+    """Read exactly size bytes, or return None if the peer closes first."""
+    chunks = []
+    while size:
+        chunk = connection.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_length(connection, max_message=DEFAULT_MAX_MESSAGE):
+    """Read a message's length prefix. Returns None at a clean end of stream."""
+    header = recv_exactly(connection, FRAME.size)
+    if header is None:
+        return None
+    length = FRAME.unpack(header)[0]
+    if length > max_message:
+        raise ProtocolError('message of ' + str(length) + ' bytes is over the ' + str(max_message) + ' byte limit')
+    return length
+
+
+def recv_body(connection, length):
+    """Read and parse a message body of the given length."""
+    body = recv_exactly(connection, length)
+    if body is None:
+        raise ProtocolError('connection closed mid-message')
+    try:
+        return json.loads(body.decode('utf-8'))
+    except ValueError as exception:
+        raise ProtocolError('message is not JSON (' + str(exception) + ')')
+
+
+def recv_message(connection, max_message=DEFAULT_MAX_MESSAGE):
+    """Read one message. Returns None at a clean end of stream."""
+    length = recv_length(connection, max_message)
+    if length is None:
+        return None
+    return recv_body(connection, length)
+
+
+def send_message(connection, message):
+    """Write one message."""
+    body = json.dumps(message, sort_keys=True).encode('utf-8')
+    connection.sendall(FRAME.pack(len(body)) + body)
+
+
+def decode_dump(text, fields=None, strict=True):
+    """Decode one dump's text into a record. Never raises for a bad dump."""
+    try:
+        dump = OTPParser.OTPDump.from_bytes(text.encode('ascii', 'replace'), strict=strict)
+        record = {'board': dump.decode(fields), 'warnings': dump.warnings}
+    except OTPParser.InvalidOTPDump as exception:
+        return {'error': str(exception)}
+    if not strict:
+        record['diagnostics'] = [[diagnostic.line, diagnostic.region, diagnostic.reason]
+                                 for diagnostic in dump.diagnostics]
+    return record
+
+
+def read_request(request):
+    """Check a request, returning (dumps, fields, strict). Raises ProtocolError."""
+    if not isinstance(request, dict) or not isinstance(request.get('dumps'), list):
+        raise ProtocolError("request must be an object with a 'dumps' list")
+    dumps = request['dumps']
+    if not all(isinstance(dump, type('')) for dump in dumps):
+        raise ProtocolError('dumps must be strings')
+    fields = request.get('fields')
+    if fields is not None:
+        try:
+            fields = OTPParser.resolve_fields(fields)
+        except (ValueError, TypeError) as exception:
+            raise ProtocolError(str(exception))
+    return dumps, fields, not request.get('lenient')
+
+
+class DecodeServer(object):
+    """Serves decode requests on a Unix domain socket, see the module docstring.
+
+    Each connection is read by its own thread; batches are decoded in this process, or over a
+    pool of jobs worker processes when jobs is more than 1.
+    """
+
+    def __init__(self, path=DEFAULT_SOCKET, jobs=1, max_pending=DEFAULT_MAX_PENDING,
+                 max_connections=DEFAULT_MAX_CONNECTIONS, max_message=DEFAULT_MAX_MESSAGE):
+        self.path = path
+        self.jobs = jobs
+        self.max_message = max_message
+        self.pending = threading.BoundedSemaphore(max_pending)
+        self.connections = threading.BoundedSemaphore(max_connections)
+        self.pool = None
+        self.listener = None
+        self.stopping = False
+
+    def bind(self):
+        """Create the socket, replacing a stale one left by a daemon that did not exit cleanly."""
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except (IOError, OSError):
+                os.remove(self.path)
+            else:
+                raise ProtocolError('a daemon is already listening on ' + self.path)
+            finally:
+                probe.close()
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        self.listener.listen(socket.SOMAXCONN)
+
+    def decode(self, dumps, fields=None, strict=True):
+        """Decode a batch, returning its records in order."""
+        decode = functools.partial(decode_dump, fields=fields, strict=strict)
+        if self.pool is None or len(dumps) < 2:
+            return [decode(text) for text in dumps]
+        return self.pool.map(decode, dumps, max(1, len(dumps) // (self.jobs * 4)))
+
+    def handle(self, connection):
+        """Answer every request on a connection until the client closes it."""
+        try:
+            while not self.stopping:
+                length = recv_length(connection, self.max_message)
+                if length is None:
+                    break
+                with self.pending:  # The rest of the request waits in the socket until a slot frees.
+                    request = recv_body(connection, length)
+                    request_id = request.get('id') if isinstance(request, dict) else None
+                    try:
+                        dumps, fields, strict = read_request(request)
+                    except ProtocolError as exception:
+                        reply = {'id': request_id, 'error': str(exception)}
+                    else:
+                        reply = {'id': request_id, 'results': self.decode(dumps, fields, strict)}
+                send_message(connection, reply)
+        except ProtocolError as exception:
+            try:
+                send_message(connection, {'id': None, 'error': str(exception)})
+            except (IOError, OSError):
+                pass
+        except (IOError, OSError):
+            pass  # The client went away.
+        finally:
+            connection.close()
+            self.connections.release()
+
+    def serve_forever(self):
+        """Accept connections until shutdown() is called."""
+        if self.listener is None:
+            self.bind()
+        if self.jobs > 1:
+            import multiprocessing
+            self.pool = multiprocessing.Pool(self.jobs)
+        try:
+            while not self.stopping:
+                self.connections.acquire()  # Past the limit, new clients wait in the backlog.
+                try:
+                    connection, _ = self.listener.accept()
+                except (IOError, OSError):
+                    self.connections.release()
+                    if self.stopping:
+                        break
+                    raise
+                worker = threading.Thread(target=self.handle, args=(connection,))
+                worker.daemon = True
+                worker.start()
+        finally:
+            self.close()
+
+    def shutdown(self):
+        """Stop accepting connections; serve_forever() returns."""
+        self.stopping = True
+        if self.listener is not None:
+            try:
+                self.listener.shutdown(socket.SHUT_RDWR)
+            except (IOError, OSError):
+                pass
+            self.listener.close()
+
+    def close(self):
+        """Release the socket and the worker pool."""
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+
+class DecodeClient(object):
+    """A connection to a DecodeServer. Not safe to share between threads; open one each."""
+
+    def __init__(self, path=DEFAULT_SOCKET, timeout=None):
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.settimeout(timeout)
+        self.connection.connect(path)
+        self.requests = 0
+
+    def decode(self, dumps, fields=None, lenient=False):
+        """Decode a batch of dumps (str or bytes 'vcgencmd otp_dump' output), returning one record
+        per dump, in order. Raises ProtocolError if the daemon rejects the request.
+        """
+        self.requests += 1
+        request = {'id': self.requests, 'dumps': [dump.decode('ascii', 'replace') if isinstance(dump, bytes) else dump
+                                                  for dump in dumps]}
+        if fields is not None:
+            request['fields'] = fields
+        if lenient:
+            request['lenient'] = True
+        send_message(self.connection, request)
+        reply = recv_message(self.connection)
+        if reply is None:
+            raise ProtocolError('daemon closed the connection')
+        if 'error' in reply:
+            raise ProtocolError(reply['error'])
+        return reply['results']
+
+    def close(self):
+        """Close the connection."""
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def run_client(args):
+    """Send dump files to the daemon as one batch and print a record for each."""
+    dumps = []
+    for file_name in args.files:
+        with open(file_name, 'rb') as dump_file:
+            dumps.append(dump_file.read())
+    errors = 0
+    with DecodeClient(args.socket) as client:
+        for file_name, record in zip(args.files, client.decode(dumps, args.fields, args.lenient)):
+            record['file'] = file_name
+            if 'error' in record:
+                errors += 1
+                print(file_name + ': ' + record['error'], file=sys.stderr)
+            print(json.dumps(record, sort_keys=True))
+    if errors:
+        sys.exit(str(errors) + ' of ' + str(len(dumps)) + ' dumps failed to decode.')
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description='Serve OTP decodes on a Unix domain socket.')
+    parser.add_argument('files', nargs='*', help='with --client, dump files to decode')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='socket path (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='worker processes; 1 decodes in the daemon itself (default: 1)')
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING,
+                        help='batches decoded at once (default: %(default)s)')
+    parser.add_argument('--max-connections', type=int, default=DEFAULT_MAX_CONNECTIONS,
+                        help='clients served at once (default: %(default)s)')
+    parser.add_argument('--client', action='store_true', help='send the dump files to a running daemon')
+    parser.add_argument('--fields', help='with --client, comma separated fields to decode (default: all)')
+    parser.add_argument('--lenient', action='store_true', help='with --client, skip lines that can not be read')
+    args = parser.parse_args(argv)
+    if args.client:
+        if not args.files:
+            parser.error('--client needs dump files')
+        try:
+            run_client(args)
+        except (IOError, OSError, ProtocolError) as exception:
+            sys.exit(args.socket + ': ' + str(exception))
+        return
+    if args.files:
+        parser.error('dump files are only read with --client')
+    if args.jobs < 1 or args.max_pending < 1 or args.max_connections < 1:
+        parser.error('--jobs, --max-pending and --max-connections must be at least 1')
+
+    import signal
+
+    server = DecodeServer(args.socket, args.jobs, args.max_pending, args.max_connections)
+    try:
+        server.bind()
+    except (IOError, OSError, ProtocolError) as exception:
+        sys.exit(args.socket + ': ' + str(exception))
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.shutdown())
+    print('Listening on', args.socket, file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Raspberry Pi OTP Scan Diff
+
+ Copyright 2019-2022 Jasmine Iwanek & Dylan Morrison
+
+ Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ software and associated documentation files (the "Software"), to deal in the Software
+ without restriction, including without limitation the rights to use, copy, modify, merge,
+ publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+ to whom the Software is furnished to do so, subject to the following conditions:
+
+ The above copyright notice and this permission notice shall be included in all copies or
+ substantial portions of the Software.
+
+ THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+ FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+ DEALINGS IN THE SOFTWARE.
+
+ Usage
+ ./OTPDiff.py [--pattern GLOB] <old scan> <new scan>
+ Compares two scans of a fleet, matching boards by serial number, and writes one JSON record
+ per board that was added, removed or changed. A scan is either an index built by OTPIndex.py
+ or the dump files, directories or globs it was taken from (use a comma to give several).
+
+ Boards are compared as packed OTP images, so unchanged boards cost a single comparison. Only
+ the regions of changed boards are unpacked, and only the REGISTER_SCHEMA fields whose bits
+ changed are reported.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import json
+import sys
+
+import OTPIndex
+import OTPParser
+
+SQLITE_MAGIC = b'SQLite format 3\x00'
+
+# Names of the regions, for reporting. Regions REGIONS does not name are called region_N.
+REGION_NAMES = dict((region, name) for name, region in sorted(OTPParser.REGIONS.items(), reverse=True))
+
+
+def region_fields(fields):
+    """Regroup compiled FIELDS by region: region -> [(register.field, shift, mask), ...]"""
+    by_region = {}
+    for register, register_fields in sorted(fields.items()):
+        for name, (region, shift, mask, _) in sorted(register_fields.items(), key=lambda item: item[1][1]):
+            by_region.setdefault(region, []).append((register + '.' + name, shift, mask))
+    return by_region
+
+
+REGION_FIELDS = region_fields(OTPParser.FIELDS)
+
+
+def is_index(source):
+    """Whether source names an OTPIndex.py database rather than dump files."""
+    try:
+        with open(source, 'rb') as source_file:
+            return source_file.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC
+    except (IOError, OSError):
+        return False
+
+
+def scan_images(source, pattern='*'):
+    """Yield (serial_number, location, image) for every board in a scan.
+    Dumps that fail to decode are yielded as (None, location, InvalidOTPDump).
+    """
+    if is_index(source):
+        index = OTPIndex.FleetIndex(source)
+        try:
+            for serial_number, file_name, dump, image in index.serial_images():
+                yield serial_number, file_name + '#' + str(dump), image
+        finally:
+            index.close()
+        return
+
+    import OTPFleet  # Only needed to expand dump file inputs.
+
+    for file_name in OTPFleet.expand_inputs(source.split(','), pattern):
+        try:
+            with open(file_name, 'rb') as dump_file:
+                raw = dump_file.read()
+            for index, result in enumerate(OTPIndex.dumps_from_bytes(raw)):
+                location = file_name + '#' + str(index)
+                if isinstance(result, OTPParser.InvalidOTPDump):
+                    yield None, location, result
+                else:
+                    yield result.word(OTPParser.REGIONS['serial_number']), location, OTPIndex.pack_image(result)
+        except (IOError, OSError) as exception:
+            yield None, file_name, OTPParser.InvalidOTPDump('Unable to open file (' + str(exception) + ')')
+        except OTPParser.InvalidOTPDump as exception:
+            yield None, file_name, exception
+
+
+def load_scan(source, pattern='*', errors=None):
+    """Map serial number to (location, image) for a scan.
+    Failed dumps and repeated serial numbers are appended to errors as (location, message);
+    the first board seen with a serial number is the one kept.
+    """
+    scan = {}
+    for serial_number, location, image in scan_images(source, pattern):
+        if serial_number is None:
+            if errors is not None:
+                errors.append((location, str(image)))
+        elif serial_number in scan:
+            if errors is not None:
+                errors.append((location, 'Serial number %08x already seen in %s' %
+                               (serial_number, scan[serial_number][0])))
+        else:
+            scan[serial_number] = (location, image)
+    return scan
+
+
+def changed_regions(old_image, new_image):
+    """Yield (region, old word, new word) for every region that differs between two images."""
+    old_words = OTPParser.OTP_IMAGE.unpack(old_image)
+    new_words = OTPParser.OTP_IMAGE.unpack(new_image)
+    for region, (old_word, new_word) in enumerate(zip(old_words, new_words)):
+        if old_word != new_word:
+            yield region, old_word, new_word
+
+
+def changed_fields(region, old_word, new_word):
+    """Map register.field to [old, new] for the REGISTER_SCHEMA fields of a region whose bits changed."""
+    flipped = old_word ^ new_word
+    return dict((name, [(old_word >> shift) & mask, (new_word >> shift) & mask])
+                for name, shift, mask in REGION_FIELDS.get(region, ()) if (flipped >> shift) & mask)
+
+
+def diff_board(old_image, new_image):
+    """Describe the regions and fields that changed between two images of one board."""
+    regions = []
+    for region, old_word, new_word in changed_regions(old_image, new_image):
+        change = {'region': region, 'name': REGION_NAMES.get(region, 'region_' + str(region)),
+                  'old': '%08x' % old_word, 'new': '%08x' % new_word}
+        fields = changed_fields(region, old_word, new_word)
+        if fields:
+            change['fields'] = fields
+        regions.append(change)
+    return regions
+
+
+def diff_scans(old, new):
+    """Yield a record for every board added, removed or changed between two scans from load_scan().
+    Unchanged boards are skipped after comparing their images.
+    """
+    for serial_number in sorted(set(old) | set(new)):
+        record = {'serial_number': '%08x' % serial_number}
+        if serial_number not in new:
+            record.update(status='removed', old=old[serial_number][0])
+        elif serial_number not in old:
+            record.update(status='added', new=new[serial_number][0])
+        else:
+            old_location, old_image = old[serial_number]
+            new_location, new_image = new[serial_number]
+            if old_image == new_image:
+                continue
+            record.update(status='changed', old=old_location, new=new_location,
+                          regions=diff_board(old_image, new_image))
+        yield record
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description='Report boards whose OTP changed between two fleet scans.')
+    parser.add_argument('old', help='earlier scan: an OTPIndex.py database, or dump files, directories or globs')
+    parser.add_argument('new', help='later scan, in the same forms')
+    parser.add_argument('--pattern', default='*', help='file name pattern used inside directories')
+    args = parser.parse_args(argv)
+
+    errors = []
+    old = load_scan(args.old, args.pattern, errors)
+    new = load_scan(args.new, args.pattern, errors)
+    for location, message in errors:
+        print(location + ': ' + message, file=sys.stderr)
+
+    counts = {'added': 0, 'removed': 0, 'changed': 0}
+    for record in diff_scans(old, new):
+        counts[record['status']] += 1
+        print(json.dumps(record, sort_keys=True))
+    unchanged = len(set(old) & set(new)) - counts['changed']
+    print('Changed:', counts['changed'], 'Added:', counts['added'], 'Removed:', counts['removed'],
+          'Unchanged:', unchanged, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Raspberry Pi OTP Duplicate Detector
+
+ Copyright 2019-2022 Jasmine Iwanek & Dylan Morrison
+
+ Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ software and associated documentation files (the "Software"), to deal in the Software
+ without restriction, including without limitation the rights to use, copy, modify, merge,
+ publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+ to whom the Software is furnished to do so, subject to the following conditions:
+
+ The above copyright notice and this permission notice shall be included in all copies or
+ substantial portions of the Software.
+
+ THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+ FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+ DEALINGS IN THE SOFTWARE.
+
+ Usage
+ ./OTPDuplicates.py [--limit N] [--temp-dir DIR] <index.db, file, directory or glob> ...
+ Finds serial numbers (region 28) and MAC addresses (regions 65 and 64) shared by more than one
+ board, and writes one JSON record per duplicate with every place it was seen. Inputs are
+ OTPIndex.py databases or anything OTPIndex.py can ingest.
+
+ Keys are kept as packed integers in a hash table of at most --limit entries. Past that, the
+ table is written out as a sorted run in --temp-dir and cleared, and the runs are merged at the
+ end, at most MERGE_FAN_IN at a time. The boards behind each duplicate are matched to their
+ locations the same way, so memory use and open files are bounded whatever the number of dumps,
+ even when millions of boards share one serial number.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+
+import OTPParser
+
+DEFAULT_LIMIT = 1000000
+
+# A key packs the kind of identifier above its value, so serials and MACs share one table.
+KIND_SHIFT = 56
+KINDS = ('serial_number', 'mac_address')
+
+# One (key, ordinal) pair in a sorted run file.
+RUN_RECORD = struct.Struct('<QQ')
+RUN_CHUNK_RECORDS = 4096
+
+# The two numbers and text length of a record in a run of records with text, see SortedRuns.
+TEXT_RECORD = struct.Struct('<QQI')
+
+# Most run files open at once. More runs than this are merged into longer runs first.
+MERGE_FAN_IN = 64
+
+WORD = struct.Struct('<I')
+
+
+def image_keys(image):
+    """The serial number and MAC address keys of a packed OTP image. Boards without a MAC
+    (region 65 is zero) only have a serial number key.
+    """
+    serial_number = WORD.unpack_from(image, 4 * OTPParser.REGIONS['serial_number'])[0]
+    keys = [serial_number]
+    mac_one = WORD.unpack_from(image, 4 * OTPParser.REGIONS['mac_address_one'])[0]
+    if mac_one:
+        mac_two = WORD.unpack_from(image, 4 * OTPParser.REGIONS['mac_address_two'])[0]
+        keys.append(1 << KIND_SHIFT | mac_one << 16 | mac_two >> 16)  # As format_mac() prints it
+    return keys
+
+
+def describe_key(key):
+    """(kind, formatted value) for a packed key."""
+    kind = KINDS[key >> KIND_SHIFT]
+    value = key & ((1 << KIND_SHIFT) - 1)
+    if kind == 'mac_address':
+        mac = format(value, '012x')
+        return kind, ':'.join(mac[i:i+2] for i in range(0, 12, 2))
+    return kind, format(value, '08x')
+
+
+def read_run(file_name):
+    """Yield the (key, ordinal) pairs of a sorted run file, a chunk at a time."""
+    with open(file_name, 'rb') as run_file:
+        while True:
+            chunk = run_file.read(RUN_RECORD.size * RUN_CHUNK_RECORDS)
+            if not chunk:
+                break
+            for offset in range(0, len(chunk), RUN_RECORD.size):
+                yield RUN_RECORD.unpack_from(chunk, offset)
+
+
+def write_text_records(run_file, records):
+    """Write (number, number, text) records, each TEXT_RECORD then the UTF-8 text."""
+    for first, second, text in records:
+        data = text.encode('utf-8')
+        run_file.write(TEXT_RECORD.pack(first, second, len(data)) + data)
+
+
+def read_text_run(file_name):
+    """Yield the (number, number, text) records of a run written by write_text_records()."""
+    with open(file_name, 'rb') as run_file:
+        while True:
+            header = run_file.read(TEXT_RECORD.size)
+            if not header:
+                break
+            first, second, size = TEXT_RECORD.unpack(header)
+            yield first, second, run_file.read(size).decode('utf-8')
+
+
+class SortedRuns(object):
+    """Sorts records of two numbers, or two numbers and a text with text=True, in memory bounded
+    by limit records. Past that, records are written out as sorted runs in directory, which are
+    merged at most fan_in at a time when iterated.
+    """
+
+    def __init__(self, directory, name, limit, fan_in, text=False):
+        self.directory = directory
+        self.name = name
+        self.limit = limit
+        self.fan_in = fan_in
+        self.text = text
+        self.records = []
+        self.runs = []
+        self.run_files = 0
+
+    def add(self, record):
+        """Add one record, writing a run if limit are held."""
+        self.records.append(record)
+        if len(self.records) >= self.limit:
+            self.spill()
+
+    def spill(self):
+        """Write the held records out as a sorted run."""
+        self.records.sort()
+        self.add_run(self.records)
+        self.records = []
+
+    def add_run(self, records):
+        """Write already sorted records out as a run."""
+        file_name = os.path.join(self.directory, self.name + '-%06d' % self.run_files)
+        self.run_files += 1
+        records = iter(records)
+        with open(file_name, 'wb') as run_file:
+            if self.text:
+                write_text_records(run_file, records)
+            else:
+                while True:
+                    chunk = list(itertools.islice(records, RUN_CHUNK_RECORDS))
+                    if not chunk:
+                        break
+                    run_file.write(b''.join(RUN_RECORD.pack(first, second) for first, second in chunk))
+        self.runs.append(file_name)
+
+    def __read(self, file_name):
+        return read_text_run(file_name) if self.text else read_run(file_name)
+
+    def __merge_runs(self):
+        """Merge the oldest fan_in runs into one until the rest can be merged in one pass."""
+        while len(self.runs) > self.fan_in:
+            merging = self.runs[:self.fan_in]
+            self.runs = self.runs[self.fan_in:]
+            self.add_run(heapq.merge(*[self.__read(file_name) for file_name in merging]))
+            for file_name in merging:
+                os.remove(file_name)
+
+    def __iter__(self):
+        """Yield every record in order. Iterate once, after the last add()."""
+        if not self.runs:
+            self.records.sort()
+            for record in self.records:
+                yield record
+            return
+        if self.records:
+            self.spill()
+        self.__merge_runs()
+        for record in heapq.merge(*[self.__read(file_name) for file_name in self.runs]):
+            yield record
+
+
+class DuplicateFinder(object):
+    """Finds keys added more than once, in memory bounded by limit table entries.
+
+    Every add() is numbered; where each board came from is written to a temporary file and only
+    read back for the boards that turn out to be duplicates. Matching those boards to their
+    locations is done with sorted runs too, so however many boards share a key, memory use
+    stays bounded.
+    """
+
+    def __init__(self, limit=DEFAULT_LIMIT, temp_dir=None, fan_in=MERGE_FAN_IN):
+        if fan_in < 2:
+            raise ValueError('Runs must be merged at least two at a time')
+        self.limit = limit
+        self.fan_in = fan_in
+        self.directory = tempfile.mkdtemp(prefix='otp-duplicates-', dir=temp_dir)
+        self.locations = open(os.path.join(self.directory, 'locations'), 'w')
+        self.count = 0
+        self.first = {}    # key -> ordinal of the first board with it, since the last spill
+        self.repeats = []  # (key, ordinal) of later boards with a key already in first
+        self.keys = SortedRuns(self.directory, 'keys', limit, fan_in)
+        self.spilled = 0
+
+    def add(self, location, keys):
+        """Record the keys of one board, see image_keys()."""
+        ordinal = self.count
+        self.count += 1
+        self.locations.write(location.replace('\n', ' ') + '\n')
+        for key in keys:
+            if key in self.first:
+                self.repeats.append((key, ordinal))
+            else:
+                self.first[key] = ordinal
+        if len(self.first) + len(self.repeats) >= self.limit:
+            self.spill()
+
+    def add_image(self, location, image):
+        """Record a board from its packed OTP image."""
+        self.add(location, image_keys(image))
+
+    def spill(self):
+        """Write the table out as a sorted run and clear it."""
+        pairs = list(self.first.items())
+        pairs.extend(self.repeats)
+        self.first = {}
+        self.repeats = []
+        pairs.sort()
+        self.keys.add_run(pairs)
+        self.spilled += 1
+
+    def __members(self, groups_file):
+        """Number the keys seen more than once in key order, writing (key, count) of each to
+        groups_file. Returns the (ordinal, group number) of their boards, as SortedRuns.
+        """
+        if self.keys.runs:
+            if self.first or self.repeats:
+                self.spill()
+        else:  # Everything fits in memory, sort it there.
+            for pair in itertools.chain(self.first.items(), self.repeats):
+                self.keys.add(pair)
+            self.first = {}
+            self.repeats = []
+        members = SortedRuns(self.directory, 'members', self.limit, self.fan_in)
+        group = 0
+        key = first_ordinal = None
+        count = 0
+        for next_key, ordinal in self.keys:
+            if next_key != key:
+                if count > 1:
+                    groups_file.write(RUN_RECORD.pack(key, count))
+                    group += 1
+                key, first_ordinal, count = next_key, ordinal, 0
+            count += 1
+            if count == 2:
+                members.add((first_ordinal, group))
+            if count >= 2:
+                members.add((ordinal, group))
+        if count > 1:
+            groups_file.write(RUN_RECORD.pack(key, count))
+        return members
+
+    def __located(self, members):
+        """Look up the location of every (ordinal, group) in ordinal order, returning
+        (group, ordinal, location) records as SortedRuns."""
+        located = SortedRuns(self.directory, 'located', self.limit, self.fan_in, text=True)
+        with open(self.locations.name, 'r') as locations:
+            line_ordinal = -1
+            line = None
+            for ordinal, group in members:
+                while line_ordinal < ordinal:
+                    line = next(locations)
+                    line_ordinal += 1
+                located.add((group, ordinal, line.rstrip('\n')))
+        return located
+
+    def iter_duplicates(self):
+        """Yield a {'kind', 'value', 'count', 'locations'} dict per duplicate key, in key order.
+        locations is an iterator, only valid until the next dict is taken. Call once, after
+        every board has been added.
+        """
+        self.locations.close()
+        with open(os.path.join(self.directory, 'groups'), 'wb') as groups_file:
+            members = self.__members(groups_file)
+        located = iter(self.__located(members))
+        for key, count in read_run(groups_file.name):
+            kind, value = describe_key(key)
+            locations = itertools.islice(located, count)
+            yield {'kind': kind, 'value': value, 'count': count,
+                   'locations': (location for _, _, location in locations)}
+            for _ in locations:  # Skip whatever the caller did not read.
+                pass
+
+    def duplicates(self):
+        """Return a list of {'kind', 'value', 'count', 'locations'} dicts, one per duplicate key,
+        each with every location. Call once, after every board has been added.
+        """
+        return [dict(duplicate, locations=list(duplicate['locations'])) for duplicate in self.iter_duplicates()]
+
+    def close(self):
+        """Remove the temporary files."""
+        if not self.locations.closed:
+            self.locations.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_duplicate(duplicate, output):
+    """Write a duplicate as json.dumps(duplicate, sort_keys=True) would, one location at a time."""
+    output.write('{"count": %d, "kind": %s, "locations": [' % (duplicate['count'], json.dumps(duplicate['kind'])))
+    for index, location in enumerate(duplicate['locations']):
+        output.write((', ' if index else '') + json.dumps(location))
+    output.write('], "value": ' + json.dumps(duplicate['value']) + '}\n')
+
+
+def main(argv=None):
+    """Command line entry point."""
+    import OTPDiff  # Reads boards from indexes and dump files alike.
+
+    parser = argparse.ArgumentParser(description='Find serial numbers and MAC addresses shared by several boards.')
+    parser.add_argument('inputs', nargs='+', help='OTPIndex.py databases, dump files, directories or globs')
+    parser.add_argument('--pattern', default='*', help='file name pattern used inside directories')
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT,
+                        help='keys held in memory before spilling to disk (default: %(default)s)')
+    parser.add_argument('--temp-dir', help='directory for spilled runs (default: the system temporary directory)')
+    args = parser.parse_args(argv)
+    if args.limit < 1:
+        parser.error('--limit must be at least 1')
+
+    errors = duplicates = 0
+    with DuplicateFinder(args.limit, args.temp_dir) as finder:
+        for source in args.inputs:
+            for serial_number, location, image in OTPDiff.scan_images(source, args.pattern):
+                if serial_number is None:
+                    errors += 1
+                    print(location + ': ' + str(image), file=sys.stderr)
+                else:
+                    finder.add_image(location, image)
+        for duplicate in finder.iter_duplicates():
+            duplicates += 1
+            write_duplicate(duplicate, sys.stdout)
+        runs = finder.spilled
+    print('Boards:', finder.count, 'Duplicates:', duplicates, 'Spilled runs:', runs, 'Failed:', errors,
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,391 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Raspberry Pi OTP Fleet Tools
+
+ Copyright 2019-2022 Jasmine Iwanek & Dylan Morrison
+
+ Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ software and associated documentation files (the "Software"), to deal in the Software
+ without restriction, including without limitation the rights to use, copy, modify, merge,
+ publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+ to whom the Software is furnished to do so, subject to the following conditions:
+
+ The above copyright notice and this permission notice shall be included in all copies or
+ substantial portions of the Software.
+
+ THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+ FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+ DEALINGS IN THE SOFTWARE.
+
+ Usage
+ ./OTPFleet.py [-j JOBS] [--chunksize N] <file, directory or glob> ...
+ Writes one record per board to stdout, as NDJSON unless --format csv or --format msgpack is
+ given. Files that fail to decode are reported with an 'error' key and do not stop the run.
+
+ ./OTPFleet.py --log [--delimiter REGEX] <log file> ...
+ Treats each input as many concatenated dumps, each optionally preceded by header lines, and
+ streams a record per dump in constant memory. Use - to read the log from stdin.
+
+ ./OTPFleet.py --image <image file> ...
+ Treats each input as one or more concatenated binary OTP images (128 little-endian 32-bit
+ words each) and memory-maps it instead of reading text.
+
+ ./OTPFleet.py --archive [--pattern GLOB] <.tar.gz, .tar.xz, .zip ...> ...
+ Reads every dump file (or every one matching --pattern) straight out of tar or zip archives
+ in archive order, decompressing in one thread while the workers decode.
+
+ ./OTPFleet.py --scaling [-j JOBS] <inputs> ...
+ Decodes the same inputs with 1 to JOBS workers and reports dumps/sec for each.
+
+ Add --stats for per-stage timings and counters on stderr (see OTPStats.py), --profile FILE to
+ save a cProfile profile and --tracemalloc to report peak memory.
+
+ Add --where QUERY to any of the above to keep only the boards matching an OTPQuery.py query,
+ e.g. --where 'processor == BCM2711 and not jtag_disable_bit'. Other boards are dropped on
+ their raw register words, before they are decoded.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import fnmatch
+import functools
+import glob
+import multiprocessing
+import os
+import sys
+import time
+
+import OTPOutput
+import OTPParser
+import OTPQuery
+
+
+def expand_inputs(inputs, pattern='*'):
+    """Expand files, directories and globs into a sorted list of file paths.
+    Directories are walked recursively and only files matching pattern are kept.
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, dirs, files in os.walk(item):
+                dirs.sort()
+                for name in sorted(files):
+                    if fnmatch.fnmatch(name, pattern):
+                        paths.append(os.path.join(root, name))
+        elif os.path.isfile(item):
+            paths.append(item)
+        else:
+            matches = sorted(glob.glob(item))
+            if not matches:
+                paths.append(item)  # Reported as a per-file error by decode_file().
+            for match in matches:
+                if os.path.isdir(match):
+                    paths.extend(expand_inputs([match], pattern))
+                else:
+                    paths.append(match)
+    return paths
+
+
+def decode_bytes(file_name, raw, fields=None, where=None):
+    """Decode the raw bytes of a dump into a record, as decode_file() does. Never raises for bad input."""
+    try:
+        dump = OTPParser.OTPDump.from_bytes(raw)
+        if where is not None and not where(dump.data):
+            return None
+        return {'file': file_name, 'board': dump.decode(fields), 'warnings': dump.warnings}
+    except OTPParser.InvalidOTPDump as exception:
+        return {'file': file_name, 'error': str(exception)}
+
+
+def decode_file(file_name, fields=None, where=None):
+    """Decode a single dump file into a record. Never raises for bad input.
+    fields limits the decoded fields, as OTPParser.OTPDump.decode() does. A dump not matching
+    the where predicate (see OTPQuery.compile_query()) returns None without being decoded.
+    """
+    try:
+        with open(file_name, 'rb') as otp_file:
+            raw = otp_file.read()
+    except (IOError, OSError) as exception:
+        return {'file': file_name, 'error': 'Unable to open file (' + str(exception) + ')'}
+    return decode_bytes(file_name, raw, fields, where)
+
+
+def decode_log(log_file, file_name, delimiter=None, fields=None, where=None):
+    """Yield a record for each dump in an open concatenated log, as it is read."""
+    for index, (header, result) in enumerate(OTPParser.iter_dumps(log_file, delimiter)):
+        if where is not None and not isinstance(result, OTPParser.InvalidOTPDump) and not where(result.data):
+            continue
+        record = {'file': file_name, 'index': index, 'header': header}
+        if isinstance(result, OTPParser.InvalidOTPDump):
+            record['error'] = str(result)
+        else:
+            try:
+                record['board'] = result.decode(fields)
+                record['warnings'] = result.warnings
+            except OTPParser.InvalidOTPDump as exception:
+                record['error'] = str(exception)
+        yield record
+
+
+# Queries compiled by compiled_query(), by query string.
+QUERIES = {}
+
+
+def compiled_query(where):
+    """Compile a query string once per process."""
+    if where not in QUERIES:
+        QUERIES[where] = OTPQuery.compile_query(where)
+    return QUERIES[where]
+
+
+def decode_query_file(file_name, fields=None, where=None):
+    """decode_file() with the where predicate given as a query string. Compiled predicates can
+    not be pickled, so this is what the pool hands to its workers.
+    """
+    return decode_file(file_name, fields, where and compiled_query(where))
+
+
+def decode_file_stats(file_name, fields=None, where=None):
+    """decode_query_file() instrumented stage by stage, see OTPStats.py.
+    Returns (record or None, stats snapshot) for the parent process to merge.
+    """
+    import OTPStats
+
+    stats = OTPStats.Stats()
+    record = None
+    try:
+        with stats.stage('read'):
+            with open(file_name, 'rb') as otp_file:
+                raw = otp_file.read()
+        dump = OTPStats.instrumented_dump(raw, stats, where and compiled_query(where))
+        if dump is not None:
+            with stats.stage('decode'):
+                record = {'file': file_name, 'board': dump.decode(fields), 'warnings': dump.warnings}
+    except (IOError, OSError) as exception:
+        record = {'file': file_name, 'error': 'Unable to open file (' + str(exception) + ')'}
+    except OTPParser.InvalidOTPDump as exception:
+        record = {'file': file_name, 'error': str(exception)}
+    return record, stats.snapshot()
+
+
+def decode_logs(paths, delimiter=None, fields=None, where=None):
+    """Yield records for every dump in each log file in turn. '-' reads stdin."""
+    for file_name in paths:
+        if file_name == '-':
+            for record in decode_log(sys.stdin, file_name, delimiter, fields, where):
+                yield record
+            continue
+        try:
+            with open(file_name, 'r') as log_file:
+                for record in decode_log(log_file, file_name, delimiter, fields, where):
+                    yield record
+        except (IOError, OSError) as exception:
+            yield {'file': file_name, 'error': 'Unable to open file (' + str(exception) + ')'}
+
+
+def decode_images(paths, fields=None, where=None):
+    """Yield a record for every image in each binary image file in turn."""
+    for file_name in paths:
+        try:
+            for index, dump in enumerate(OTPParser.iter_image_file(file_name)):
+                if where is not None and not where(dump.data):
+                    continue
+                yield {'file': file_name, 'index': index, 'board': dump.decode(fields), 'warnings': dump.warnings}
+        except (IOError, OSError) as exception:
+            yield {'file': file_name, 'error': 'Unable to open file (' + str(exception) + ')'}
+        except OTPParser.InvalidOTPDump as exception:
+            yield {'file': file_name, 'error': str(exception)}
+
+
+def decode_files(paths, jobs=None, chunksize=64, fields=None, where=None, stats=None):
+    """Yield a record for each path, in order, decoding over a pool of jobs processes.
+    jobs=1 decodes in this process, which avoids the pool start-up cost for small runs.
+    where is a query string, compiled in each worker; only the records of matching dumps and of
+    files that failed to decode are yielded. Given an OTPStats.Stats, each worker's per-stage
+    measurements are merged into it.
+    """
+    jobs = jobs or multiprocessing.cpu_count()
+    decode = functools.partial(decode_query_file if stats is None else decode_file_stats, fields=fields, where=where)
+    pool = None
+    if jobs == 1:
+        results = (decode(file_name) for file_name in paths)
+    else:
+        pool = multiprocessing.Pool(jobs)
+        results = pool.imap(decode, paths, chunksize)
+    try:
+        for record in results:
+            if stats is not None:
+                record, snapshot = record
+                stats.merge(snapshot)
+            if record is not None:
+                yield record
+        if pool is not None:
+            pool.close()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+def decode_member(member, fields=None, where=None):
+    """Decode one (location, bytes, error) member from OTPArchive.archive_members().
+    where is a query string, as for decode_query_file().
+    """
+    location, raw, error = member
+    if error is not None:
+        return {'file': location, 'error': 'Unable to read archive (' + error + ')'}
+    return decode_bytes(location, raw, fields, where and compiled_query(where))
+
+
+def decode_archives(paths, jobs=None, chunksize=64, fields=None, where=None, pattern='*'):
+    """Yield a record for each dump file in each tar or zip archive, in archive order.
+    A producer thread reads and decompresses members while jobs processes decode them, see
+    OTPArchive.py. Records are 'file': 'archive!member'; where is a query string.
+    """
+    import OTPArchive
+
+    jobs = jobs or multiprocessing.cpu_count()
+    members = OTPArchive.archive_members(paths, pattern)
+    decode = functools.partial(decode_member, fields=fields, where=where)
+    if jobs == 1:
+        for member in members:
+            record = decode(member)
+            if record is not None:
+                yield record
+        return
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for record in pool.imap(decode, members, chunksize):
+            if record is not None:
+                yield record
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def measure_scaling(paths, max_jobs, chunksize=64):
+    """Decode paths with 1 to max_jobs workers, returning (jobs, seconds, dumps/sec) tuples."""
+    results = []
+    for jobs in range(1, max_jobs + 1):
+        start = time.time()
+        count = sum(1 for _ in decode_files(paths, jobs, chunksize))
+        elapsed = time.time() - start
+        results.append((jobs, elapsed, count / elapsed if elapsed else 0.0))
+    return results
+
+
+def write_records(records, format_name, fields=None, stats=None):
+    """Write records to stdout in the named format, reporting errors on stderr.
+    Returns (total, errors) counts. Given an OTPStats.Stats, the time spent waiting for each
+    record is recorded as the source stage and the time spent writing it as render.
+    """
+    total = errors = 0
+    with OTPOutput.open_writer(format_name, getattr(sys.stdout, 'buffer', sys.stdout), fields) as writer:
+        if stats is None:
+            for record in records:
+                total += 1
+                if 'error' in record:
+                    errors += 1
+                    print(record['file'] + ': ' + record['error'], file=sys.stderr)
+                writer.write(record)
+            return total, errors
+
+        import OTPStats
+
+        clock = OTPStats.CLOCK
+        records = iter(records)
+        while True:
+            start = clock()
+            record = next(records, None)
+            stats.time('source', clock() - start)
+            if record is None:
+                break
+            total += 1
+            if 'error' in record:
+                errors += 1
+                print(record['file'] + ': ' + record['error'], file=sys.stderr)
+            start = clock()
+            writer.write(record)
+            stats.time('render', clock() - start)
+        stats.count('records', total)
+    return total, errors
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description='Decode many OTP dumps in parallel.')
+    parser.add_argument('inputs', nargs='+', help='dump files, directories or globs')
+    parser.add_argument('-j', '--jobs', type=int, default=multiprocessing.cpu_count(),
+                        help='worker processes (default: one per core)')
+    parser.add_argument('--chunksize', type=int, default=64, help='files handed to a worker at a time')
+    parser.add_argument('--pattern', default='*', help='file name pattern used inside directories and archives')
+    parser.add_argument('--log', action='store_true', help='inputs are logs of many concatenated dumps')
+    parser.add_argument('--delimiter', help='regex matching the header lines between dumps in a log')
+    parser.add_argument('--image', action='store_true', help='inputs are binary OTP images')
+    parser.add_argument('--archive', action='store_true', help='inputs are tar or zip archives of dump files')
+    parser.add_argument('--format', choices=sorted(OTPOutput.WRITERS), default='ndjson', help='output format')
+    parser.add_argument('--fields', help='comma separated fields to decode (default: all)')
+    parser.add_argument('--where', help='only output boards matching this query, see OTPQuery.py')
+    parser.add_argument('--scaling', action='store_true', help='measure throughput from 1 to JOBS workers')
+    parser.add_argument('--stats', action='store_true', help='print per-stage timings and counters to stderr')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='save a cProfile profile to FILE (this process only, use -j 1 to include decoding)')
+    parser.add_argument('--tracemalloc', action='store_true', help='report peak memory and top allocations')
+    args = parser.parse_args(argv)
+    if args.log + args.image + args.archive > 1:
+        parser.error('only one of --log, --image and --archive can be used')
+    if (args.log or args.image or args.archive) and args.scaling:
+        parser.error('--scaling measures text dump files and can not be used with --log, --image or --archive')
+
+    fields = None
+    if args.fields:
+        try:
+            fields = OTPParser.resolve_fields(args.fields)
+        except ValueError as exception:
+            parser.error(str(exception))
+    where = None
+    if args.where:
+        try:
+            where = OTPQuery.compile_query(args.where)
+        except OTPQuery.QueryError as exception:
+            parser.error(str(exception))
+    stats = None
+    if args.stats or args.profile or args.tracemalloc:
+        import OTPStats
+        stats = OTPStats.Stats()
+
+    if args.log:
+        records = decode_logs(args.inputs, args.delimiter, fields, where)
+    elif args.image:
+        records = decode_images(expand_inputs(args.inputs, args.pattern), fields, where)
+    elif args.archive:
+        records = decode_archives(expand_inputs(args.inputs), args.jobs, args.chunksize, fields, args.where,
+                                  args.pattern)
+    else:
+        paths = expand_inputs(args.inputs, args.pattern)
+        records = decode_files(paths, args.jobs, args.chunksize, fields, args.where, stats)
+    if args.scaling:
+        for jobs, elapsed, rate in measure_scaling(paths, args.jobs, args.chunksize):
+            print('%3d jobs: %8.3fs %10.1f dumps/sec' % (jobs, elapsed, rate))
+        return
+
+    if stats is None:
+        total, errors = write_records(records, args.format, fields)
+    else:
+        try:
+            total, errors = OTPStats.profiled(lambda: write_records(records, args.format, fields, stats),
+                                              args.profile, args.tracemalloc, stats)
+        finally:
+            if args.stats or args.tracemalloc:
+                OTPStats.print_summary(stats)
+    if errors:
+        sys.exit(str(errors) + ' of ' + str(total) + ' records failed to decode.')
+
+
+if __name__ == '__main__':
+    main()
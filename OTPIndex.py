@@ -0,0 +1,261 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Raspberry Pi OTP Fleet Index
+
+ Copyright 2019-2022 Jasmine Iwanek & Dylan Morrison
+
+ Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ software and associated documentation files (the "Software"), to deal in the Software
+ without restriction, including without limitation the rights to use, copy, modify, merge,
+ publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+ to whom the Software is furnished to do so, subject to the following conditions:
+
+ The above copyright notice and this permission notice shall be included in all copies or
+ substantial portions of the Software.
+
+ THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+ FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+ DEALINGS IN THE SOFTWARE.
+
+ Usage
+ ./OTPIndex.py <index.db> ingest <file, directory or glob> ...
+ Adds dumps to a SQLite index. Files whose contents have not changed since they were last
+ ingested are skipped. Text dumps, concatenated dump logs and binary OTP images are accepted.
+
+ ./OTPIndex.py <index.db> serial <serial number>
+ ./OTPIndex.py <index.db> mac <mac address>
+ ./OTPIndex.py <index.db> revision <revision number>
+ ./OTPIndex.py <index.db> find [--board-type TYPE] [--manufacturer NAME] [--processor NAME]
+                               [--memory-size MB]
+ Look boards up in the index, printing one JSON record per board.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import hashlib
+import json
+import sqlite3
+import sys
+
+import OTPParser
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    path    TEXT PRIMARY KEY,
+    sha256  TEXT NOT NULL,
+    error   TEXT
+);
+CREATE TABLE IF NOT EXISTS boards (
+    path            TEXT NOT NULL REFERENCES files(path),
+    dump            INTEGER NOT NULL,
+    serial_number   INTEGER NOT NULL,
+    mac_address     TEXT,
+    revision_number INTEGER NOT NULL,
+    memory_size     TEXT NOT NULL,
+    manufacturer    TEXT NOT NULL,
+    processor       TEXT NOT NULL,
+    board_type      TEXT NOT NULL,
+    board_revision  TEXT NOT NULL,
+    image           BLOB NOT NULL,
+    PRIMARY KEY (path, dump)
+);
+CREATE INDEX IF NOT EXISTS boards_serial_number ON boards (serial_number);
+CREATE INDEX IF NOT EXISTS boards_mac_address ON boards (mac_address);
+CREATE INDEX IF NOT EXISTS boards_revision_number ON boards (revision_number);
+CREATE INDEX IF NOT EXISTS boards_board_type ON boards (board_type, manufacturer);
+'''
+
+BOARD_COLUMNS = ('path', 'dump', 'serial_number', 'mac_address', 'revision_number', 'memory_size',
+                 'manufacturer', 'processor', 'board_type', 'board_revision')
+
+
+def dumps_from_bytes(raw):
+    """Yield the dumps held in a file's contents, text or binary.
+    Text may hold one dump or a concatenated log; binary holds one or more OTP images. Dumps
+    in a log that fail to decode are yielded as InvalidOTPDump, as OTPParser.iter_dumps() does.
+    """
+    try:
+        text = raw.decode('ascii')
+    except UnicodeDecodeError:
+        for dump in OTPParser.iter_images(raw):
+            yield dump
+        return
+    for _, result in OTPParser.iter_dumps(text.splitlines()):
+        yield result
+
+
+def pack_image(dump):
+    """Pack a dump back into a binary OTP image, missing regions as zero."""
+    return OTPParser.OTP_IMAGE.pack(*[dump.data.get(region, 0) for region in range(OTPParser.OTP_IMAGE_WORDS)])
+
+
+class FleetIndex(object):
+    """A SQLite index of decoded boards, keyed by serial number, MAC address and revision word."""
+
+    def __init__(self, file_name):
+        self.connection = sqlite3.connect(file_name)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        """Close the underlying database."""
+        self.connection.close()
+
+    def ingest(self, paths):
+        """Add or refresh the given dump files.
+        Returns (ingested, unchanged, failed) counts. Files are only read again when their
+        content hash differs from the one recorded the last time they were ingested.
+        """
+        ingested = unchanged = failed = 0
+        cursor = self.connection.cursor()
+        for file_name in paths:
+            try:
+                with open(file_name, 'rb') as dump_file:
+                    raw = dump_file.read()
+            except (IOError, OSError):
+                failed += 1
+                continue
+            digest = hashlib.sha256(raw).hexdigest()
+            row = cursor.execute('SELECT sha256 FROM files WHERE path = ?', (file_name,)).fetchone()
+            if row is not None and row[0] == digest:
+                unchanged += 1
+                continue
+
+            cursor.execute('DELETE FROM boards WHERE path = ?', (file_name,))
+            rows = []
+            errors = []
+            try:
+                for index, result in enumerate(dumps_from_bytes(raw)):
+                    if isinstance(result, OTPParser.InvalidOTPDump):
+                        errors.append('dump ' + str(index) + ': ' + str(result))
+                        continue
+                    try:
+                        rows.append(self.__board_row(file_name, index, result))
+                    except OTPParser.InvalidOTPDump as exception:
+                        errors.append('dump ' + str(index) + ': ' + str(exception))
+            except OTPParser.InvalidOTPDump as exception:  # The rest of a binary file is unreadable.
+                errors.append(str(exception))
+            error = '; '.join(errors) or None
+            cursor.execute('INSERT OR REPLACE INTO files (path, sha256, error) VALUES (?, ?, ?)',
+                           (file_name, digest, error))
+            cursor.executemany('INSERT INTO boards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            if error is None:
+                ingested += 1
+            else:
+                failed += 1
+        self.connection.commit()
+        return ingested, unchanged, failed
+
+    @staticmethod
+    def __board_row(file_name, index, dump):
+        """Build the boards table row for one dump."""
+        mac = dump.format_mac()
+        board = dump.board
+        return (file_name, index, dump.word(OTPParser.REGIONS['serial_number']),
+                None if mac == 'None' else mac, dump.word(OTPParser.REGIONS['revision_number']),
+                board.memory_size, board.manufacturer, board.processor, board.board_type, board.board_revision,
+                sqlite3.Binary(pack_image(dump)))
+
+    def __select(self, where, parameters):
+        """Run a query against the boards table, returning a list of dicts."""
+        cursor = self.connection.execute('SELECT ' + ', '.join(BOARD_COLUMNS) + ' FROM boards WHERE ' + where +
+                                         ' ORDER BY path, dump', parameters)
+        return [dict(zip(BOARD_COLUMNS, row)) for row in cursor]
+
+    def by_serial(self, serial_number):
+        """Boards with the given serial number (an int)."""
+        return self.__select('serial_number = ?', (serial_number,))
+
+    def by_mac(self, mac_address):
+        """Boards with the given MAC address, formatted as format_mac() does."""
+        return self.__select('mac_address = ?', (mac_address.lower(),))
+
+    def by_revision(self, revision_number):
+        """Boards with the given revision number word (an int)."""
+        return self.__select('revision_number = ?', (revision_number,))
+
+    def find(self, **criteria):
+        """Boards matching every given board_type, manufacturer, processor or memory_size."""
+        columns = ('board_type', 'manufacturer', 'processor', 'memory_size')
+        unknown = set(criteria) - set(columns)
+        if unknown:
+            raise ValueError('Can not search by ' + ', '.join(sorted(unknown)))
+        where = [name + ' = ?' for name in columns if criteria.get(name) is not None]
+        return self.__select(' AND '.join(where) or '1', [criteria[name] for name in columns
+                                                          if criteria.get(name) is not None])
+
+    def images(self, path=None):
+        """Yield (path, dump, OTPDump) for every indexed board, rebuilt from the stored images."""
+        query = 'SELECT path, dump, image FROM boards'
+        parameters = ()
+        if path is not None:
+            query += ' WHERE path = ?'
+            parameters = (path,)
+        for file_name, index, image in self.connection.execute(query + ' ORDER BY path, dump', parameters):
+            yield file_name, index, OTPParser.OTPDump.from_image(image)
+
+    def serial_images(self):
+        """Yield (serial_number, path, dump, image) for every indexed board, without decoding."""
+        query = 'SELECT serial_number, path, dump, image FROM boards ORDER BY path, dump'
+        for serial_number, file_name, index, image in self.connection.execute(query):
+            yield serial_number, file_name, index, bytes(image)
+
+
+def hex_value(parser, value):
+    """Parse a hex serial or revision number from the command line, exiting with usage if it is not one."""
+    try:
+        return int(value, 16)
+    except ValueError:
+        parser.error('not a hex number: ' + repr(value))
+
+
+def main(argv=None):
+    """Command line entry point."""
+    import OTPFleet  # Only needed to expand command line inputs.
+
+    parser = argparse.ArgumentParser(description='Build and query a persistent index of OTP dumps.')
+    parser.add_argument('database', help='SQLite index file, created if missing')
+    commands = parser.add_subparsers(dest='command')
+    ingest = commands.add_parser('ingest', help='add dump files to the index')
+    ingest.add_argument('inputs', nargs='+', help='dump files, directories or globs')
+    ingest.add_argument('--pattern', default='*', help='file name pattern used inside directories')
+    commands.add_parser('serial', help='look up a serial number').add_argument('value')
+    commands.add_parser('mac', help='look up a MAC address').add_argument('value')
+    commands.add_parser('revision', help='look up a revision number').add_argument('value')
+    find = commands.add_parser('find', help='find boards by decoded board information')
+    find.add_argument('--board-type')
+    find.add_argument('--manufacturer')
+    find.add_argument('--processor')
+    find.add_argument('--memory-size')
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.error('a command is required')
+
+    index = FleetIndex(args.database)
+    try:
+        if args.command == 'ingest':
+            ingested, unchanged, failed = index.ingest(OTPFleet.expand_inputs(args.inputs, args.pattern))
+            print('Ingested:', ingested, 'Unchanged:', unchanged, 'Failed:', failed)
+            return
+        if args.command == 'serial':
+            boards = index.by_serial(hex_value(parser, args.value))
+        elif args.command == 'mac':
+            boards = index.by_mac(args.value)
+        elif args.command == 'revision':
+            boards = index.by_revision(hex_value(parser, args.value))
+        else:
+            boards = index.find(board_type=args.board_type, manufacturer=args.manufacturer,
+                                processor=args.processor, memory_size=args.memory_size)
+    finally:
+        index.close()
+    for board in boards:
+        print(json.dumps(board, sort_keys=True))
+    if not boards:
+        sys.exit('No matching boards.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""Raspberry Pi OTP Decode Daemon Load Test
+
+ Copyright 2019-2022 Jasmine Iwanek & Dylan Morrison
+
+ Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ software and associated documentation files (the "Software"), to deal in the Software
+ without restriction, including without limitation the rights to use, copy, modify, merge,
+ publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+ to whom the Software is furnished to do so, subject to the following conditions:
+
+ The above copyright notice and this permission notice shall be included in all copies or
+ substantial portions of the Software.
+
+ THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+ FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+ DEALINGS IN THE SOFTWARE.
+
+ Usage
+ ./OTPLoadTest.py [--dumps N] [--batch B] [--clients C] [--baseline N] [-j JOBS] [--output results.json]
+ Decodes synthetic dumps (from OTPSynth.py) three ways and reports p50/p99 latency and dumps/sec:
+ process - 'python3 -m OTPParser --format ndjson <dump>', one process per dump, for --baseline dumps
+ single  - one dump per request to OTPDaemon.py, from --clients concurrent clients
+ batch   - --batch dumps per request to OTPDaemon.py, from --clients concurrent clients
+ A daemon is started on a temporary socket with -j JOBS workers, unless --socket names a
+ running one; its stderr goes to a log file, shown if it fails to start. Latency is per
+ request; every dump in a batch waits for the whole batch.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import OTPDaemon
+import OTPSynth
+
+CLOCK = getattr(time, 'perf_counter', time.time)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(values, fraction):
+    """The nearest-rank percentile of a non-empty list."""
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+
+def summary(name, latencies, dumps, seconds):
+    """Build a result dict from per-request latencies in seconds."""
+    return {'mode': name, 'requests': len(latencies), 'dumps': dumps, 'seconds': seconds,
+            'p50_ms': percentile(latencies, 0.50) * 1e3, 'p99_ms': percentile(latencies, 0.99) * 1e3,
+            'dumps_per_sec': dumps / seconds if seconds else None}
+
+
+def run_processes(texts, directory):
+    """Decode each dump in its own 'python3 -m OTPParser' process, one after another."""
+    environment = dict(os.environ)
+    environment.pop('PYTHONDONTWRITEBYTECODE', None)  # Cache bytecode, as an installed copy would.
+    environment['PYTHONPATH'] = HERE + os.pathsep + environment.get('PYTHONPATH', '')
+    file_names = []
+    for index, text in enumerate(texts):
+        file_name = os.path.join(directory, 'dump-%06d.txt' % index)
+        with open(file_name, 'w') as dump_file:
+            dump_file.write(text)
+        file_names.append(file_name)
+    command = [sys.executable, '-m', 'OTPParser', '--format', 'ndjson']
+    subprocess.check_call(command + [file_names[0]], stdout=subprocess.PIPE, env=environment, cwd=HERE)
+    latencies = []
+    start = CLOCK()
+    for file_name in file_names:
+        begin = CLOCK()
+        subprocess.check_call(command + [file_name], stdout=subprocess.PIPE, env=environment, cwd=HERE)
+        latencies.append(CLOCK() - begin)
+    return summary('process', latencies, len(texts), CLOCK() - start)
+
+
+def run_clients(name, socket_path, texts, batch, clients):
+    """Send texts to the daemon in batches from concurrent clients, checking every reply."""
+    batches = [texts[start:start + batch] for start in range(0, len(texts), batch)]
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+    next_batch = [0]
+
+    def client_loop():
+        with OTPDaemon.DecodeClient(socket_path) as client:
+            while True:
+                with lock:
+                    index = next_batch[0]
+                    next_batch[0] += 1
+                if index >= len(batches):
+                    return
+                begin = CLOCK()
+                results = client.decode(batches[index])
+                elapsed = CLOCK() - begin
+                with lock:
+                    latencies.append(elapsed)
+                    failures.extend(result['error'] for result in results if 'error' in result)
+
+    threads = [threading.Thread(target=client_loop) for _ in range(clients)]
+    start = CLOCK()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = CLOCK() - start
+    if failures or len(latencies) != len(batches):
+        raise RuntimeError(name + ': ' + str(len(failures)) + ' dumps failed, ' +
+                           str(len(batches) - len(latencies)) + ' requests unanswered')
+    return summary(name, latencies, len(texts), seconds)
+
+
+def start_daemon(socket_path, jobs, log_name):
+    """Start OTPDaemon.py on socket_path, logging to log_name, and wait until it accepts connections."""
+    with open(log_name, 'wb') as log_file:
+        daemon = subprocess.Popen([sys.executable, os.path.join(HERE, 'OTPDaemon.py'), '--socket', socket_path,
+                                   '--jobs', str(jobs)], stderr=log_file)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            OTPDaemon.DecodeClient(socket_path).close()
+            return daemon
+        except (IOError, OSError):
+            if daemon.poll() is not None:
+                with open(log_name, 'rb') as log_file:
+                    raise RuntimeError('OTPDaemon.py exited: ' + log_file.read().decode('utf-8', 'replace'))
+            time.sleep(0.05)
+    daemon.terminate()
+    raise RuntimeError('OTPDaemon.py did not start listening')
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description='Load test OTPDaemon.py against one process per dump.')
+    parser.add_argument('--dumps', type=int, default=5000, help='dumps sent to the daemon (default: 5000)')
+    parser.add_argument('--batch', type=int, default=100, help='dumps per batched request (default: 100)')
+    parser.add_argument('--clients', type=int, default=4, help='concurrent clients (default: 4)')
+    parser.add_argument('--baseline', type=int, default=50,
+                        help='dumps decoded one process each; 0 skips it (default: 50)')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='daemon worker processes (default: 1)')
+    parser.add_argument('--socket', help='use the daemon already listening here')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the synthetic dumps')
+    parser.add_argument('--output', help='save results to this JSON file')
+    args = parser.parse_args(argv)
+    if min(args.dumps, args.batch, args.clients, args.jobs) < 1 or args.baseline < 0:
+        parser.error('--dumps, --batch, --clients and --jobs must be at least 1')
+
+    texts = [text for _, _, text in OTPSynth.generate(max(args.dumps, args.baseline), args.seed)]
+    directory = tempfile.mkdtemp(prefix='otp-load-')
+    daemon = None
+    try:
+        socket_path = args.socket
+        if socket_path is None:
+            socket_path = os.path.join(directory, 'decode.sock')
+            daemon = start_daemon(socket_path, args.jobs, os.path.join(directory, 'daemon.log'))
+        results = []
+        if args.baseline:
+            results.append(run_processes(texts[:args.baseline], directory))
+        results.append(run_clients('single', socket_path, texts[:args.dumps], 1, args.clients))
+        results.append(run_clients('batch', socket_path, texts[:args.dumps], args.batch, args.clients))
+    finally:
+        if daemon is not None:
+            daemon.terminate()
+            daemon.wait()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print('%-8s %9s %9s %10s %10s %12s' % ('mode', 'requests', 'dumps', 'p50 ms', 'p99 ms', 'dumps/sec'))
+    for result in results:
+        print('%-8s %9d %9d %10.2f %10.2f %12.1f' % (result['mode'], result['requests'], result['dumps'],
+                                                     result['p50_ms'], result['p99_ms'], result['dumps_per_sec']))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'python': sys.version.split()[0], 'batch': args.batch, 'clients': args.clients,
+                       'jobs': args.jobs, 'results': results}, output_file, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""Raspberry Pi OTP Output Writers
+
+ Copyright 2019-2022 Jasmine Iwanek & Dylan Morrison
+
+ Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ software and associated documentation files (the "Software"), to deal in the Software
+ without restriction, including without limitation the rights to use, copy, modify, merge,
+ publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+ to whom the Software is furnished to do so, subject to the following conditions:
+
+ The above copyright notice and this permission notice shall be included in all copies or
+ substantial portions of the Software.
+
+ THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+ FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+ DEALINGS IN THE SOFTWARE.
+
+ Streaming writers for decoded records, as produced by OTPFleet.py and friends: a dict with
+ 'board' (decoded fields), 'warnings', 'error' and where they came from ('file', 'index',
+ 'header'). Output is rendered into a buffer and written in chunks of up to buffer_size bytes.
+ No record waits in the buffer more than flush_interval seconds, however slowly the next one
+ comes, so a reader at the other end of a pipe sees records as they come. A terminal gets
+ every record as soon as it is written.
+
+ ndjson  - one JSON object per line
+ csv     - one row per record, columns in OTPParser.FIELD_NAMES order after the source columns
+ msgpack - one MessagePack map per record, back to back
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import csv
+import io
+import json
+import struct
+import threading
+import time
+
+import OTPParser
+
+DEFAULT_BUFFER_SIZE = 64 << 10
+
+# Seconds a buffered record may wait for a slow producer before a background thread writes it.
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# Columns written before the decoded fields in CSV output.
+SOURCE_COLUMNS = ('file', 'index', 'header', 'error', 'warnings')
+
+
+class RecordWriter(object):
+    """Base writer: buffers rendered records and writes them to a binary stream in chunks."""
+
+    def __init__(self, stream, fields=None, buffer_size=DEFAULT_BUFFER_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.stream = stream
+        self.fields = list(OTPParser.FIELD_NAMES if fields is None else fields)
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        try:
+            if stream.isatty():
+                self.buffer_size = 0
+        except (AttributeError, ValueError):
+            pass
+        self.chunks = []
+        self.buffered = 0
+        self.pending_since = None  # When the oldest buffered record was written
+        self.lock = threading.Condition()
+        self.flusher = None
+        self.closed = False
+        self.error = None  # From a write by the flusher, raised by the next write() or flush()
+
+    def render(self, record):
+        """Render one record as bytes."""
+        raise NotImplementedError
+
+    def write(self, record):
+        """Buffer a record, writing the buffer out once it is full or has waited flush_interval."""
+        chunk = self.render(record)
+        with self.lock:
+            if self.error is not None:
+                self.__write_out()  # Raises it
+            self.chunks.append(chunk)
+            self.buffered += len(chunk)
+            if self.pending_since is None:
+                self.pending_since = time.time()
+            if self.buffered >= self.buffer_size or time.time() - self.pending_since >= self.flush_interval:
+                self.__write_out()
+                return
+            if self.flusher is None:
+                self.flusher = threading.Thread(target=self.__flush_loop, name='RecordWriter flusher')
+                self.flusher.daemon = True
+                self.flusher.start()
+            self.lock.notify()
+
+    def flush(self):
+        """Write out everything buffered so far."""
+        with self.lock:
+            self.__write_out()
+
+    def __write_out(self):
+        """Write and flush the buffer, holding the lock."""
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        if self.chunks:
+            chunks = self.chunks
+            self.chunks = []
+            self.buffered = 0
+            self.pending_since = None
+            self.stream.write(b''.join(chunks))
+        self.stream.flush()
+
+    def __flush_loop(self):
+        """Write out records that have waited flush_interval, until the writer is closed."""
+        with self.lock:
+            while not self.closed:
+                if self.pending_since is None:
+                    self.lock.wait()
+                    continue
+                delay = self.pending_since + self.flush_interval - time.time()
+                if delay > 0:
+                    self.lock.wait(delay)
+                    continue
+                try:
+                    self.__write_out()
+                except (IOError, OSError) as exception:
+                    self.error = exception
+                    return
+
+    def close(self):
+        """Flush the writer and stop its flusher thread. The stream is left open."""
+        with self.lock:
+            self.closed = True
+            self.lock.notify()
+        if self.flusher is not None:
+            self.flusher.join()
+            self.flusher = None
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class NDJSONWriter(RecordWriter):
+    """One compact JSON object per line."""
+
+    def __init__(self, stream, fields=None, buffer_size=DEFAULT_BUFFER_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        super(NDJSONWriter, self).__init__(stream, fields, buffer_size, flush_interval)
+        self.encoder = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+
+    def render(self, record):
+        return (self.encoder.encode(record) + '\n').encode('utf-8')
+
+
+class CSVWriter(RecordWriter):
+    """One row per record with a fixed column order: SOURCE_COLUMNS, then the decoded fields."""
+
+    def __init__(self, stream, fields=None, buffer_size=DEFAULT_BUFFER_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        super(CSVWriter, self).__init__(stream, fields, buffer_size, flush_interval)
+        self.text = io.StringIO()
+        self.writer = csv.writer(self.text, lineterminator='\n')
+        self.chunks.append(self.__row(SOURCE_COLUMNS + tuple(self.fields)))
+
+    def __row(self, values):
+        """Render one CSV row as bytes."""
+        self.writer.writerow(values)
+        row = self.text.getvalue()
+        self.text.seek(0)
+        self.text.truncate()
+        return row.encode('utf-8')
+
+    def render(self, record):
+        board = record.get('board', {})
+        return self.__row([record.get('file', ''), record.get('index', ''), ' | '.join(record.get('header', ())),
+                           record.get('error', ''), '; '.join(record.get('warnings', ()))] +
+                          [board.get(name, '') for name in self.fields])
+
+
+def pack_msgpack(obj):
+    """Encode None, bools, ints, floats, strings, bytes, lists and dicts as MessagePack."""
+    chunks = []
+    __pack(obj, chunks.append)
+    return b''.join(chunks)
+
+
+def __pack(obj, out):
+    """Append the MessagePack encoding of obj to out, one chunk at a time."""
+    if obj is None:
+        out(b'\xc0')
+    elif obj is True:
+        out(b'\xc3')
+    elif obj is False:
+        out(b'\xc2')
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            out(struct.pack('B', obj))
+        elif -0x20 <= obj < 0:
+            out(struct.pack('b', obj))
+        elif 0 <= obj <= 0xffffffff:
+            out(b'\xce' + struct.pack('>I', obj))
+        elif 0 <= obj <= 0xffffffffffffffff:
+            out(b'\xcf' + struct.pack('>Q', obj))
+        else:
+            out(b'\xd3' + struct.pack('>q', obj))
+    elif isinstance(obj, float):
+        out(b'\xcb' + struct.pack('>d', obj))
+    elif isinstance(obj, bytes):
+        size = len(obj)
+        out((b'\xc4' + struct.pack('B', size)) if size < 0x100 else
+            (b'\xc5' + struct.pack('>H', size)) if size < 0x10000 else (b'\xc6' + struct.pack('>I', size)))
+        out(obj)
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8')
+        size = len(data)
+        out(struct.pack('B', 0xa0 | size) if size < 0x20 else
+            (b'\xd9' + struct.pack('B', size)) if size < 0x100 else
+            (b'\xda' + struct.pack('>H', size)) if size < 0x10000 else (b'\xdb' + struct.pack('>I', size)))
+        out(data)
+    elif isinstance(obj, (list, tuple)):
+        size = len(obj)
+        out(struct.pack('B', 0x90 | size) if size < 0x10 else
+            (b'\xdc' + struct.pack('>H', size)) if size < 0x10000 else (b'\xdd' + struct.pack('>I', size)))
+        for item in obj:
+            __pack(item, out)
+    elif isinstance(obj, dict):
+        size = len(obj)
+        out(struct.pack('B', 0x80 | size) if size < 0x10 else
+            (b'\xde' + struct.pack('>H', size)) if size < 0x10000 else (b'\xdf' + struct.pack('>I', size)))
+        for key in sorted(obj):
+            __pack(key, out)
+            __pack(obj[key], out)
+    else:
+        raise TypeError('Can not encode ' + type(obj).__name__ + ' as MessagePack')
+
+
+class MsgpackWriter(RecordWriter):
+    """One MessagePack map per record, written back to back."""
+
+    def render(self, record):
+        return pack_msgpack(record)
+
+
+WRITERS = {
+    'ndjson':  NDJSONWriter,
+    'csv':     CSVWriter,
+    'msgpack': MsgpackWriter,
+}
+
+
+def open_writer(name, stream, fields=None, buffer_size=DEFAULT_BUFFER_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+    """Create the writer called name (see WRITERS) over a binary stream."""
+    return WRITERS[name](stream, fields, buffer_size, flush_interval)
@@ -22,27 +22,45 @@
 
  Usage
  call either ./OTPParser.py <filename> or vgcencmd otp_dump | OTPParser
+ for a check run at boot, python3 -m OTPParser <filename> starts fastest (see OTPStartup.py)
+ add --fields serial_number,board_type,mac to decode and print only those fields
+ add --format ndjson, csv or msgpack for machine readable output
+ add --lenient to skip, and report, lines that can not be read instead of rejecting the dump
+ add --stats to print per-stage timings and counters to stderr (see OTPStats.py), --profile FILE
+ to save a cProfile profile and --tracemalloc to report peak memory
+
+ Library use
+ import OTPParser and build an OTPParser.OTPDump with from_lines(), from_bytes(), from_image() or
+ from_dict(), then call decode() on it, or lazy() to only decode the fields you read. Nothing is
+ printed and no module state is touched.
 """
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import struct
 import sys
-from string import hexdigits
-from os import path
+from collections import namedtuple
+from os import fstat, path
+
+# re, mmap and argparse are imported where they are used: a one-shot run at boot never needs
+# them, and on a Pi Zero every import shows up in the time to first output (see OTPStartup.py).
 
 if (sys.version_info < (2, 6) or (sys.version_info >= (3, 0) and sys.version_info < (3, 3))):
     sys.exit('OTPParser requires Python 2.6 or 3.3 and newer.')
 
-try:
-    from future import standard_library
-    standard_library.install_aliases()
-except ImportError:
-    sys.exit('OTPParser requires future!')
+# The future compatibility layer is only needed on Python 2, where it is also the slowest
+# import by far; on Python 3 these names are already the built-ins.
+if sys.version_info[0] < 3:
+    try:
+        from future import standard_library
+        standard_library.install_aliases()
+    except ImportError:
+        sys.exit('OTPParser requires future!')
 
-try:
-    from builtins import dict, int, open, range, str
-except ImportError:
-    sys.exit("OTPParser requires future! (Cant import 'builtins'")
+    try:
+        from builtins import dict, int, open, range, str
+    except ImportError:
+        sys.exit("OTPParser requires future! (Cant import 'builtins'")
 
 
 class TypoError(Exception):
@@ -192,6 +210,28 @@ LEGACY_REVISIONS = {
                 'processor': 'unknown', 'board_type': 'unknown', 'board_revision': 'unknown'}
 }
 
+
+def names_by_value(table_as_string, width):
+    """Turn one of the *_AS_STRING dicts into a tuple of names indexed by the field's int value."""
+    names = ['unknown'] * (1 << width)
+    for code, name in table_as_string.items():
+        if len(code) == width and not code.strip('01'):
+            names[int(code, 2)] = name
+    return tuple(names)
+
+
+MEMORY_SIZE_NAMES = names_by_value(MEMORY_SIZES_AS_STRING, 3)
+MANUFACTURER_NAMES = names_by_value(MANUFACTURERS_AS_STRING, 4)
+PROCESSOR_NAMES = names_by_value(PROCESSORS_AS_STRING, 4)
+BOARD_TYPE_NAMES = names_by_value(BOARD_TYPES_AS_STRING, 8)
+BOARD_REVISION_NAMES = names_by_value(BOARD_REVISIONS_AS_STRING, 4)
+
+BoardInfo = namedtuple('BoardInfo', 'memory_size manufacturer processor board_type board_revision')
+
+# LEGACY_REVISIONS indexed by the int value of the 5-bit legacy revision code.
+LEGACY_BOARDS = tuple(BoardInfo(**LEGACY_REVISIONS.get(format(value, '05b'), LEGACY_REVISIONS['default']))
+                      for value in range(32))
+
 REGIONS = {
     'unknown_8':               8,
     'unknown_9':               9,
@@ -209,9 +249,9 @@ REGIONS = {
     'boot_sign_key_3':        21,  # OTP_BOOT_SIGNING_KEY Always ffffffff unless on baremetal read
     'boot_sign_key_4':        22,  # OTP_BOOT_SIGNING_KEY Always ffffffff unless on baremetal read
     'boot_sign_key_1_copy':   23,  # OTP_BOOT_SIGNING_KEY_REDUNDANT Always ffffffff unless on baremetal read
-    'boot_sign_key_1_copy':   24,  # OTP_BOOT_SIGNING_KEY_REDUNDANT Always ffffffff unless on baremetal read
-    'boot_sign_key_1_copy':   25,  # OTP_BOOT_SIGNING_KEY_REDUNDANT Always ffffffff unless on baremetal read
-    'boot_sign_key_1_copy':   26,  # OTP_BOOT_SIGNING_KEY_REDUNDANT Always ffffffff unless on baremetal read
+    'boot_sign_key_2_copy':   24,  # OTP_BOOT_SIGNING_KEY_REDUNDANT Always ffffffff unless on baremetal read
+    'boot_sign_key_3_copy':   25,  # OTP_BOOT_SIGNING_KEY_REDUNDANT Always ffffffff unless on baremetal read
+    'boot_sign_key_4_copy':   26,  # OTP_BOOT_SIGNING_KEY_REDUNDANT Always ffffffff unless on baremetal read
     'boot_signing_parity':    27,  # Boot Signing Parity
     'serial_number':          28,  # Serial Number
     'serial_number_inverted': 29,  # Serial Number (Bitflipped)
@@ -254,15 +294,195 @@ REGIONS = {
     'advanced_boot':          66,  # Advanced Boot Register
 }
 
-BOARD = {
-    'memory':        '000',
-    'manufacturer': '0000',
-    'processor':    '0000',
-    'type':     '00000000',
-    'revision':     '0000'
-}
+# Bitfields of the decoded registers. Offsets count from the least significant bit, so
+# ('control', 'bit_15', 15, 1) is (word >> 15) & 0x1 of region 16.
+REGISTER_SCHEMA = (
+    # Register,             Field,                   Offset, Width
+    ('control',             'bits_0-5',               0,  6),  # Unknown/Unused
+    ('control',             'bit_6',                  6,  1),  # OTP_ARM_DISABLE_REDUNDANT_BITXXX
+    ('control',             'bit_7',                  7,  1),  # OTP_ARM_DISABLE_BITXXX
+    ('control',             'bit_8',                  8,  1),  # Unknown/Unused
+    ('control',             'bit_9',                  9,  1),  # OTP_DECRYPTION_ENABLE_FOR_DEBUGXXX
+    ('control',             'bit_10',                10,  1),  # Unknown/Unused
+    ('control',             'bit_11',                11,  1),  # OTP_MACROVISION_REDUNDANT_START_BITXXX
+    ('control',             'bit_12',                12,  1),  # Unknown/Unused
+    ('control',             'bit_13',                13,  1),  # OTP_MACROVISION_START_BITXXX
+    ('control',             'bit_14',                14,  1),  # OTP_JTAG_DISABLE_REDUNDANT_BITXXX
+    ('control',             'bit_15',                15,  1),  # OTP_JTAG_DISABLE_BITXXX
+    ('control',             'bits_16-23',            16,  8),  # OTP_VPU_CACHE_KEY_PARITY_START_BIT (Seen: 0x28)
+    ('control',             'bits_24-31',            24,  8),  # OTP_JTAG_DEBUG_KEY_PARITY_START_BIT (Seen: 0x24 & 0x64)
+    # Unknown (Gordon hinted the Pi wouldn't boot with this set)
+    ('bootmode',            'bit_0',                  0,  1),
+    ('bootmode',            'bit_1',                  1,  1),  # Sets the oscillator frequency to 19.2MHz
+    # Unknown (Gordon hinted the Pi wouldn't boot with this set)
+    ('bootmode',            'bit_2',                  2,  1),
+    ('bootmode',            'bit_3',                  3,  1),  # Enables pull ups on the SDIO pins
+    ('bootmode',            'bit_4',                  4,  1),  # Set on PI4B
+    ('bootmode',            'bit_5',                  5,  1),  # Set on Pi4B
+    ('bootmode',            'bit_6',                  6,  1),  # Unknown/Unused
+    ('bootmode',            'bit_7',                  7,  1),  # Set on PI4B
+    ('bootmode',            'bits_8-18',              8, 11),  # Unknown/Unused
+    ('bootmode',            'bit_19',                19,  1),  # Enables GPIO bootmode
+    ('bootmode',            'bit_20',                20,  1),  # Sets the bank to check for GPIO bootmode
+    ('bootmode',            'bit_21',                21,  1),  # Enables booting from SD card
+    # Sets the bank to boot from (That's what Gordon said, Unclear)
+    ('bootmode',            'bit_22',                22,  1),
+    ('bootmode',            'bits_23-24',            23,  2),  # Unknown/Unused
+    ('bootmode',            'bit_25',                25,  1),  # Unknown (Is set on the Compute Module 3)
+    ('bootmode',            'bits_26-27',            26,  2),  # Unknown/Unused
+    ('bootmode',            'bit_28',                28,  1),  # Enables USB device booting
+    ('bootmode',            'bit_29',                29,  1),  # Enables USB host booting (Ethernet and Mass Storage)
+    ('bootmode',            'bits_31-30',            30,  2),  # Unknown/Unused
+    ('boot_signing_parity', 'bits_0-15',              0, 16),  # Data seen here
+    ('boot_signing_parity', 'bits_16-31',            16, 16),
+    ('revision_number',     'board_revision',         0,  4),  # Revision of the board
+    ('revision_number',     'legacy_board_revision',  0,  5),  # Region used to store the legacy revision
+    ('revision_number',     'board_type',             4,  8),  # Model of the board
+    ('revision_number',     'processor',             12,  4),  # Installed Processor
+    ('revision_number',     'manufacturer',          16,  4),  # Manufacturer of the board
+    ('revision_number',     'memory_size',           20,  3),  # Amount of RAM the board has
+    ('revision_number',     'new_flag',              23,  1),  # If set, this board uses the new versioning scheme
+    ('revision_number',     'bit_24',                24,  1),  # Unused
+    ('revision_number',     'warranty',              25,  1),  # Warranty Bit
+    ('revision_number',     'bits_26-28',            26,  3),  # Unused
+    ('revision_number',     'otp_read',              29,  1),  # OTP Read Bit
+    ('revision_number',     'otp_program',           30,  1),  # OTP Program Bit
+    ('revision_number',     'overvoltage',           31,  1),  # Overvoltage Bit
+    ('overclock',           'overvolt_protection',    0,  1),  # Overvolt protection bit
+    ('overclock',           'bits_1-31',              1, 31),  # Unknown/Unused
+    ('advanced_boot',       'bits_0-6',               0,  7),  # GPIO for ETH_CLK output pin
+    ('advanced_boot',       'bit_7',                  7,  1),  # Enable ETH_CLK output pin
+    ('advanced_boot',       'bits_8-14',              8,  7),  # GPIO for LAN_RUN output pin
+    ('advanced_boot',       'bit_15',                15,  1),  # Enable LAN_RUN output pin
+    ('advanced_boot',       'bits_16-23',            16,  8),  # Unknown/Unused
+    ('advanced_boot',       'bit_24',                24,  1),  # Extend USB HUB timeout parameter
+    ('advanced_boot',       'bit_25',                25,  1),  # ETH_CLK Frequency (0 = 25MHz, 1 = 24MHz)
+    ('advanced_boot',       'bits_26-31',            26,  6),  # Unknown/Unused
+)
+
+
+def compile_schema(schema):
+    """Compile a register schema into {register: {field: (region, shift, mask, binary format)}}."""
+    compiled = {}
+    for register, name, offset, width in schema:
+        compiled.setdefault(register, {})[name] = (REGIONS[register], offset, (1 << width) - 1,
+                                                   '0' + str(width) + 'b')
+    return compiled
+
+
+FIELDS = compile_schema(REGISTER_SCHEMA)
+
+
+# Layout used by the CLI to render a decoded dump. Each entry is the label as printed and a
+# template filled in from the dictionary returned by OTPDump.decode().
+TEXT_LAYOUT = [
+    ('               Control Register :', '{control} {control_binary}'),
+    ('JTAG_DEBUG_KEY_PARITY_START_BIT :', '{jtag_debug_key_parity_start_bit}'),
+    (' VPU_CACHE_KEY_PARITY_START_BIT :', '{vpu_cache_key_parity_start_bit}'),
+    ('               JTAG_DISABLE_BIT :', '{jtag_disable_bit}'),
+    ('     JTAG_DISABLE_REDUNDANT_BIT :', '{jtag_disable_redundant_bit}'),
+    ('          MACROVISION_START_BIT :', '{macrovision_start_bit}'),
+    ('MACROVISION_REDUNDANT_START_BIT :', '{macrovision_redundant_start_bit}'),
+    ('    DECRYPTION_ENABLE_FOR_DEBUG :', '{decryption_enable_for_debug}'),
+    ('                ARM_DISABLE_BIT :', '{arm_disable_bit}'),
+    ('      ARM_DISABLE_REDUNDANT_BIT :', '{arm_disable_redundant_bit}'),
+    ('                       Bootmode :', '{bootmode} {bootmode_binary}'),
+    ('                Bootmode - Copy :', '{bootmode_copy} {bootmode_copy_binary}'),
+    ('          OSC Frequency 19.2MHz :', '{osc_frequency_19_2mhz}'),
+    ('            SDIO Pullup Enabled :', '{sdio_pullup_enabled}'),
+    ('               Bootmode (Bit 4) :', '{bootmode_bit_4}'),
+    ('               Bootmode (Bit 5) :', '{bootmode_bit_5}'),
+    ('               Bootmode (Bit 7) :', '{bootmode_bit_7}'),
+    ('                  GPIO Bootmode :', '{gpio_bootmode}'),
+    ('             GPIO Bootmode Bank :', '{gpio_bootmode_bank}'),
+    ('                SD Boot Enabled :', '{sd_boot_enabled}'),
+    ('                      Boot Bank :', '{boot_bank}'),
+    ('         Bootmode (eMMC Enable) :', '{emmc_enable} (This is not confirmed but is set on the CM3)'),
+    ('        USB Device Boot Enabled :', '{usb_device_boot_enabled}'),
+    ('          USB Host Boot Enabled :', '{usb_host_boot_enabled}'),
+    ('    Boot Signing Parity (15-0)  :', '{boot_signing_parity_low}'),
+    ('    Boot Signing Parity (31-16) :', '{boot_signing_parity_high}'),
+    ('                  Serial Number :', '{serial_number}'),
+    ('          Inverse Serial Number :', '{serial_number_inverted}'),
+    ('                Revision Number :', '{revision_number}'),
+    ('              New Revision Flag :', '{new_revision_flag}'),
+    ('                            RAM :', '{memory_size} MB'),
+    ('                   Manufacturer :', '{manufacturer}'),
+    ('                            CPU :', '{processor}'),
+    ('                     Board Type :', 'Raspberry Pi Model {board_type}'),
+    ('                 Board Revision :', '{board_revision}'),
+    ('                   Batch Number :', '{batch_number}'),
+    ('        Overvolt Protection Bit :', '{overvolt_protection_bit}'),
+    ('            Customer Region One :', '{customer_one}'),
+    ('            Customer Region Two :', '{customer_two}'),
+    ('          Customer Region Three :', '{customer_three}'),
+    ('           Customer Region Four :', '{customer_four}'),
+    ('           Customer Region Five :', '{customer_five}'),
+    ('            Customer Region Six :', '{customer_six}'),
+    ('          Customer Region Seven :', '{customer_seven}'),
+    ('          Customer Region Eight :', '{customer_eight}'),
+    ('              MPEG2 License Key :', '{codec_key_one}'),
+    ('               VC-1 License Key :', '{codec_key_two}'),
+    ('                    MAC Address :', '{mac_address}'),
+    ('                  Advanced Boot :', '{advanced_boot} {advanced_boot_binary}'),
+    ('             ETH_CLK Output Pin :', '{eth_clk_output_pin}'),
+    ('         ETH_CLK Output Enabled :', '{eth_clk_output_enabled}'),
+    ('             LAN_RUN Output Pin :', '{lan_run_output_pin}'),
+    ('         LAN_RUN Output Enabled :', '{lan_run_output_enabled}'),
+    ('                USB Hub Timeout :', '{usb_hub_timeout}'),
+    ('              ETH_CLK Frequency :', '{eth_clk_frequency}'),
+]
+
+
+class InvalidOTPDump(ValueError):
+    """Raised when a dump can not be read or decoded."""
+    pass
+
+
+# Start of a 'NN:xxxxxxxx' line, see split_dumps().
+REGION_LINE_PATTERN = r'\s*(\d+):'
+
+# One line of 'vcgencmd otp_dump' bytes, see tokenize(): either a region number and the word
+# parse_line() would take from it, or anything else in the last group, for parse_line() to explain.
+TOKEN_PATTERN = (br'[ \t]*(\d+)[ \t]*:([0-9a-fA-F]{8}|[0-9a-fA-F]{1,7}(?=[\r\n]))[^\r\n]*(?:\r\n?|\n)'
+                 br'|([^\r\n]*)(?:\r\n?|\n)')
+
+# The patterns above, compiled by compiled() the first time they are used, so that importing
+# this module does not import re.
+COMPILED_PATTERNS = {}
+
+
+def compiled(pattern):
+    """Return one of the module's patterns, compiling it only once."""
+    try:
+        return COMPILED_PATTERNS[pattern]
+    except KeyError:
+        import re
+        return COMPILED_PATTERNS.setdefault(pattern, re.compile(pattern))
+
+
+NO_REGIONS_READ = 'Invalid OTP Dump (no readable regions)'
+
+# A line tokenize() could not read. line counts from 1, region is None if it has no number.
+Diagnostic = namedtuple('Diagnostic', 'file line region reason')
+
+# Binary OTP images are every row of the OTP as packed little-endian 32-bit words, row N at
+# byte offset 4 * N, as read by dump_otp_data() in the test-harness.
+OTP_IMAGE_WORDS = 128
+OTP_IMAGE = struct.Struct('<' + str(OTP_IMAGE_WORDS) + 'I')
+
+
+def word_type():
+    """The array.array typecode of an unsigned 32-bit word, for keeping words in flat arrays."""
+    import array  # Only the modules that keep arrays of words pay for it.
+
+    for typecode in ('I', 'L'):
+        if array.array(typecode).itemsize == 4:
+            return typecode
+    raise RuntimeError('No array type holds unsigned 32-bit words on this platform')
 
-DATA = {}
+
+HEX_DIGITS = frozenset('0123456789abcdefABCDEF')
 
 
 def is_hex(string):
@@ -270,156 +490,8 @@ def is_hex(string):
     Credit to eumiro, stackoverflow:
     https://stackoverflow.com/questions/11592261/check-if-a-string-is-hexadecimal
     """
-    hex_digits = set(hexdigits)
     # if string is long, then it is faster to check against a set
-    return all(c in hex_digits for c in string)
-
-
-def control(name):
-    """Handler for region 16."""
-    indices = {
-        'bits_0-5':   (26, 32),  # Unknown/Unused
-        'bit_6':      (25, 26),  # OTP_ARM_DISABLE_REDUNDANT_BITXXX
-        'bit_7':      (24, 25),  # OTP_ARM_DISABLE_BITXXX
-        'bit_8':      (23, 24),  # Unknown/Unused
-        'bit_9':      (22, 23),  # OTP_DECRYPTION_ENABLE_FOR_DEBUGXXX
-        'bit_10':     (21, 22),  # Unknown/Unused
-        'bit_11':     (20, 21),  # OTP_MACROVISION_REDUNDANT_START_BITXXX
-        'bit_12':     (19, 20),  # Unknown/Unused
-        'bit_13':     (18, 19),  # OTP_MACROVISION_START_BITXXX
-        'bit_14':     (17, 18),  # OTP_JTAG_DISABLE_REDUNDANT_BITXXX
-        'bit_15':     (16, 17),  # OTP_JTAG_DISABLE_BITXXX
-        'bits_16-23': (8, 16),   # OTP_VPU_CACHE_KEY_PARITY_START_BIT (Seen: 0x28)
-        'bits_24-31': (0, 8),    # OTP_JTAG_DEBUG_KEY_PARITY_START_BIT (Seen: 0x24 & 0x64)
-    }[name]
-    __control = get('control', 'binary')
-    return __control[indices[0]: indices[1]]
-
-
-def bootmode(name):
-    """Handler for region 17."""
-    indices = {
-        'bit_0':      (31, 32),  # Unknown (Gordon hinted the Pi wouldn't boot with this set)
-        'bit_1':      (30, 31),  # Sets the oscillator frequency to 19.2MHz
-        'bit_2':      (29, 30),  # Unknown (Gordon hinted the Pi wouldn't boot with this set)
-        'bit_3':      (28, 29),  # Enables pull ups on the SDIO pins
-        'bit_4':      (27, 28),  # Set on PI4B
-        'bit_5':      (26, 27),  # Set on Pi4B
-        'bit_6':      (25, 26),  # Unknown/Unused
-        'bit_7':      (24, 25),  # Set on PI4B
-        'bits_8-18':  (13, 24),  # Unknown/Unused
-        'bit_19':     (12, 13),  # Enables GPIO bootmode
-        'bit_20':     (11, 12),  # Sets the bank to check for GPIO bootmode
-        'bit_21':     (10, 11),  # Enables booting from SD card
-        'bit_22':     (9, 10),   # Sets the bank to boot from (That's what Gordon said, Unclear)
-        'bits_23-24': (7, 9),    # Unknown/Unused
-        'bit_25':     (6, 7),    # Unknown (Is set on the Compute Module 3)
-        'bits_26-27': (4, 6),    # Unknown/Unused
-        'bit_28':     (3, 4),    # Enables USB device booting
-        'bit_29':     (2, 3),    # Enables USB host booting (Ethernet and Mass Storage)
-        'bits_31-30': (0, 2)     # Unknown/Unused
-    }[name]
-    __bootmode = get('bootmode', 'binary')
-    return __bootmode[indices[0]: indices[1]]
-
-
-def boot_signing_parity(name):
-    """Handler for region 27."""
-    indices = {
-        'bits_0-15':  (16, 32),  # Data seen here
-        'bits_16-31': (0, 16),
-    }[name]
-    __boot_signing_parity = get('boot_signing_parity', 'binary')
-    return __boot_signing_parity[indices[0]: indices[1]]
-
-
-def revision(name):
-    """Handler for region 30."""
-    indices = {
-        'overvoltage':           (0, 1),    # Overvoltage Bit
-        'otp_program':           (1, 2),    # OTP Program Bit
-        'otp_read':              (2, 3),    # OTP Read Bit
-        'bits_26-28':            (3, 6),    # Unused
-        'warranty':              (6, 7),    # Warranty Bit
-        'bit_24':                (7, 8),    # Unused
-        'new_flag':              (8, 9),    # If set, this board uses the new versioning scheme
-        'memory_size':           (9, 12),   # Amount of RAM the board has
-        'manufacturer':          (12, 16),  # Manufacturer of the board
-        'processor':             (16, 20),  # Installed Processor
-        'board_type':            (20, 28),  # Model of the board
-        'board_revision':        (28, 32),  # Revision of the board
-        'legacy_board_revision': (27, 32)   # Region used to store the legacy revision
-    }[name]
-    __revision = get('revision_number', 'binary')
-    return __revision[indices[0]: indices[1]]
-
-
-def overclock(name):
-    """Handler for region 32."""
-    indices = {
-        'overvolt_protection': (31, 32),  # Overvolt protection bit
-        'bits_1-31':           (0, 31)    # Unknown/Unused
-    }[name]
-    __overclock = get('overclock', 'binary')
-    return __overclock[indices[0]: indices[1]]
-
-
-def advanced_boot(name):
-    """Handler for region 66."""
-    indices = {
-        'bits_0-6':   (25, 32),  # GPIO for ETH_CLK output pin
-        'bit_7':      (24, 25),  # Enable ETH_CLK output pin
-        'bits_8-14':  (17, 24),  # GPIO for LAN_RUN output pin
-        'bit_15':     (16, 17),  # Enable LAN_RUN output pin
-        'bits_16-23': (8, 16),   # Unknown/Unused
-        'bit_24':     (7, 8),    # Extend USB HUB timeout parameter
-        'bit_25':     (6, 7),    # ETH_CLK Frequency (0 = 25MHz, 1 = 24MHz)
-        'bits_26-31': (0, 6)     # Unknown/Unused
-    }[name]
-    __advanced_boot = get('advanced_boot', 'binary')
-    return __advanced_boot[indices[0]: indices[1]]
-
-
-def process_bootmode():
-    """Process bootmode, Check against the backup."""
-    bootmode_primary = get('bootmode', 'binary')
-    bootmode_copy = get('bootmode_copy', 'binary')
-    if bootmode_primary != bootmode_copy:
-        print('Bootmode fields are not the same, this is a bad thing!')
-
-
-def process_serial():
-    """Process Serial, Check against Inverse Serial."""
-    serial = get('serial_number', 'hex')
-    inverse_serial = get('serial_number_inverted', 'hex')
-    try:
-        if (int(serial, 16) ^ int(inverse_serial, 16)) != int('0xffffffff', 16):
-            print('Serial failed checksum!')
-    except TypeError:
-        sys.exit('Serial number format invalid!')
-
-
-def process_revision():
-    """Process Revision, Handle depending on wether it's old or new style."""
-    flag = revision('new_flag')
-    if flag == '0':
-        generate_info_legacy(revision('legacy_board_revision'))
-    elif flag == '1':
-        generate_info(revision('memory_size'),
-                      revision('manufacturer'),
-                      revision('processor'),
-                      revision('board_type'),
-                      revision('board_revision'))
-
-
-def format_mac():
-    """Format MAC Address in a human readable fashion."""
-    mac_part_1 = get('mac_address_one', 'raw')
-    mac_part_2 = get('mac_address_two', 'raw')
-    if not mac_part_1 == '00000000':
-        mac = mac_part_1 + mac_part_2
-        return ':'.join(mac[i:i+2] for i in range(0, 12, 2))
-    return 'None'
+    return all(c in HEX_DIGITS for c in string)
 
 
 def process_hub_timeout(bit):
@@ -436,44 +508,30 @@ def process_eth_clk_frequency(bit):
     return '25MHz'
 
 
-def generate_info_legacy(bits):
-    """Generate information for legacy board revision."""
-    if bits in list(LEGACY_REVISIONS.keys()):
-        input_dict = LEGACY_REVISIONS[bits]
-    else:
-        input_dict = LEGACY_REVISIONS['default']
-    generate_info(MEMORY_SIZES[input_dict['memory_size']],
-                  MANUFACTURERS[input_dict['manufacturer']],
-                  PROCESSORS[input_dict['processor']],
-                  BOARD_TYPES[input_dict['board_type']],
-                  BOARD_REVISIONS[input_dict['board_revision']])
-
-
-def generate_info(memory_size_in, manufacturer_in, processor_in, board_type_in, board_revision_in):
-    """Generate information from board revision."""
-    BOARD['memory'] = memory_size_in
-    BOARD['manufacturer'] = manufacturer_in
-    BOARD['processor'] = processor_in
-    BOARD['type'] = board_type_in
-    BOARD['revision'] = board_revision_in
-
-
-def get(loc, specifier='raw'):
-    """Get data from specified OTP region.
-    Specifier determines whether it is returned 'raw', in 'binary', in 'octal', or in 'hex'idecimal.
-    """
-    region = REGIONS[loc]
-    if specifier == 'raw':
-        return DATA[region]
-    elif specifier == 'binary':
-        return format(int(DATA[region], 16), '032b')
-    elif specifier == 'hex':
-        return format(int(DATA[region], 16), '#010x')
-    elif specifier == 'octal':
-        # TODO: Ask jas for more details on what she wants the octal output to look like.
-        return format(int(DATA[region], 16), '#018o')
+# Board information is memoized by revision word, a fleet only has a few dozen distinct ones.
+BOARD_INFO_CACHE_SIZE = 4096
+BOARD_INFO_CACHE = {}
+
+
+def board_info(revision_word):
+    """Return the BoardInfo for a revision number register, whether old or new style."""
+    try:
+        return BOARD_INFO_CACHE[revision_word]
+    except KeyError:
+        pass
+    # Bit positions are those of the revision_number fields in REGISTER_SCHEMA.
+    if revision_word & 0x800000:  # New revision flag
+        info = BoardInfo(MEMORY_SIZE_NAMES[(revision_word >> 20) & 0x7],
+                         MANUFACTURER_NAMES[(revision_word >> 16) & 0xf],
+                         PROCESSOR_NAMES[(revision_word >> 12) & 0xf],
+                         BOARD_TYPE_NAMES[(revision_word >> 4) & 0xff],
+                         BOARD_REVISION_NAMES[revision_word & 0xf])
     else:
-        raise ValueError('Invalid Flag.')
+        info = LEGACY_BOARDS[revision_word & 0x1f]
+    if len(BOARD_INFO_CACHE) >= BOARD_INFO_CACHE_SIZE:
+        BOARD_INFO_CACHE.clear()
+    BOARD_INFO_CACHE[revision_word] = info
+    return info
 
 
 def pretty_string(value, do_binary=True):
@@ -483,104 +541,560 @@ def pretty_string(value, do_binary=True):
         hexval = format(int(intval), '#04x')
         return '' + str(intval) + ' (' + hexval + ') ' + (value if (do_binary) else '')
     except ValueError:
-        sys.exit('Failed to make the string pretty!')
+        raise InvalidOTPDump('Failed to make the string pretty!')
+
+
+def parse_line(line):
+    """Parse one 'NN:xxxxxxxx' line of a 'vcgencmd otp_dump' into (region number, 32-bit word)."""
+    try:
+        if "Command not registered" in line:
+            raise TypoError
+        try:
+            region = int(line.split(':', 1)[0])
+        except ValueError:
+            raise InvalidOTPDump("Invalid OTP Dump (invalid region number '" + line.split(':', 1)[0] + "')")
+        data_str = line.split(':', 1)[1][:8].rstrip('\r\n')
+
+        if data_str and is_hex(data_str):
+            return region, int(data_str, 16)
+        raise InvalidOTPDump("Invalid OTP Dump (Reading region " + str(region) + ", string '" + data_str +
+                             "' is not hexadecimal.)")
+    except IndexError:
+        raise InvalidOTPDump('Invalid OTP Dump')
+    except TypoError:
+        raise InvalidOTPDump("Invalid OTP Dump. Please run 'vcgencmd otp_dump' to create file.")
+
+
+def parse_lines(lines):
+    """Parse the lines of a 'vcgencmd otp_dump' into a dict of region number to 32-bit word."""
+    data = dict(parse_line(line) for line in lines)
+    if not data:
+        raise InvalidOTPDump("Invalid OTP Dump (empty file). Please run 'vcgencmd otp_dump' to create file.")
+    return data
+
+
+def parse_bytes(raw, encoding='ascii'):
+    """Parse the raw bytes of a 'vcgencmd otp_dump' into a dict of region number to 32-bit word."""
+    if encoding == 'ascii':
+        return tokenize(raw)[0]
+    try:
+        text = raw.decode(encoding)
+    except UnicodeDecodeError:
+        raise InvalidOTPDump('Invalid OTP Dump (not ' + encoding + ' text)')
+    return parse_lines(text.splitlines())
+
 
+def tokenize(raw, strict=True, file_name=None):
+    """Parse the raw ASCII bytes of a 'vcgencmd otp_dump' into (data, diagnostics).
 
-def read_otp_file():
-    """Read OTP from specified file."""
-    if len(sys.argv) > 1:  # We're given an argument on the command line
-        if path.isfile(sys.argv[1]):
-            with open(sys.argv[1], 'r') as otp_file:
-                __read_otp_file_inner(otp_file)
+    The whole buffer is split into lines and words by one precompiled pattern, without decoding
+    it; only lines that do not match are handed to parse_line(). In strict mode the first bad
+    line raises InvalidOTPDump, as parse_bytes() does, and diagnostics is always empty. Otherwise
+    bad lines are skipped and described by a Diagnostic each, blank lines are ignored and
+    reading carries on; data may then be empty.
+    """
+    if strict and not is_ascii(raw):
+        raise InvalidOTPDump('Invalid OTP Dump (not ascii text)')
+    data = {}
+    diagnostics = []
+    if raw and raw[-1:] not in (b'\n', b'\r'):
+        raw = raw + b'\n'
+    for number, (region, word, line) in enumerate(compiled(TOKEN_PATTERN).findall(raw), 1):
+        if region:
+            data[int(region)] = int(word, 16)
+            continue
+        line = line.decode('ascii', 'replace')
+        if not strict and not line.strip():
+            continue
+        try:
+            region, word = parse_line(line)  # int() takes a few forms the pattern does not.
+        except InvalidOTPDump as exception:
+            if strict:
+                raise
+            number_text = line.split(':', 1)[0].strip()
+            diagnostics.append(Diagnostic(file_name, number, int(number_text) if number_text.isdigit() else None,
+                                          str(exception)))
         else:
-            sys.exit('Unable to open file.')
-    else:  # Use stdin instead.
-        __read_otp_file_inner(sys.stdin)
+            data[region] = word
+    if not data and strict:
+        raise InvalidOTPDump("Invalid OTP Dump (empty file). Please run 'vcgencmd otp_dump' to create file.")
+    return data, diagnostics
+
+
+def is_ascii(raw):
+    """Check that bytes are all ASCII."""
+    try:
+        return raw.isascii()
+    except AttributeError:  # Python 3.6 and older
+        try:
+            raw.decode('ascii')
+        except UnicodeDecodeError:
+            return False
+        return True
+
 
+def split_dumps(lines, delimiter=None):
+    """Split a stream of concatenated 'vcgencmd otp_dump' outputs into (header, lines) pairs.
 
-def __read_otp_file_inner(myfile):
-    """Inner part of OTP file reader."""
-    for line in myfile:
+    A new dump starts when a region number does not increase on the one before it, or on a
+    header line. With no delimiter every line that is not 'NN:...' is a header line, otherwise
+    only lines matching the delimiter regex are, and anything else is left for parse_lines()
+    to reject. Only the dump being read is held in memory.
+    """
+    region_line = compiled(REGION_LINE_PATTERN)
+    if delimiter is not None and not hasattr(delimiter, 'match'):
+        import re
+        delimiter = re.compile(delimiter)
+    header = []
+    body = []
+    last_region = -1
+    for line in lines:
+        match = region_line.match(line)
+        if match:
+            region = int(match.group(1))
+            if body and region <= last_region:
+                yield header, body
+                header, body = [], []
+            last_region = region
+            body.append(line)
+        elif not line.strip():
+            continue
+        elif "Command not registered" in line or (delimiter is not None and not delimiter.match(line)):
+            body.append(line)
+        else:
+            if body:
+                yield header, body
+                header, body = [], []
+                last_region = -1
+            header.append(line.rstrip('\r\n'))
+    if body:
+        yield header, body
+
+
+def iter_dumps(lines, delimiter=None):
+    """Decode each dump of a concatenated log as it is read, see split_dumps().
+    Yields (header, OTPDump) pairs; a dump that fails to decode is yielded as
+    (header, InvalidOTPDump) so one bad board does not end the stream.
+    """
+    for header, body in split_dumps(lines, delimiter):
         try:
-            if "Command not registered" in line:
-                raise TypoError
-            try:
-                region = int(line.split(':', 1)[0])
-            except ValueError:
-                sys.exit("Invalid OTP Dump (invalid region number '" + line.split(':', 1)[0] + "')")
-            data = line.split(':', 1)[1][:8].rstrip('\r\n')
-
-            try:
-                if is_hex(data):
-                    DATA[region] = data
-                else:
-                    raise ValueError("Reading region " + str(region) + ", string '" + data + "' is not hexadecimal.")
-            except ValueError as exception:
-                sys.exit('Invalid OTP Dump (' + str(exception) + ')')
-        except IndexError:
-            sys.exit('Invalid OTP Dump')
-        except TypoError:
-            sys.exit("Invalid OTP Dump. Please run 'vcgencmd otp_dump' to create file.")
-    if not DATA:
-        sys.exit("Invalid OTP Dump (empty file). Please run 'vcgencmd otp_dump' to create file.")
-
-read_otp_file()
-process_bootmode()
-process_serial()
-process_revision()
-
-print('               Control Register :', get('control', 'hex'), get('control', 'binary'))
-print('JTAG_DEBUG_KEY_PARITY_START_BIT :', pretty_string(control('bits_24-31')))
-print(' VPU_CACHE_KEY_PARITY_START_BIT :', pretty_string(control('bits_16-23')))
-print('               JTAG_DISABLE_BIT :', control('bit_15'))
-print('     JTAG_DISABLE_REDUNDANT_BIT :', control('bit_14'))
-print('          MACROVISION_START_BIT :', control('bit_13'))
-print('MACROVISION_REDUNDANT_START_BIT :', control('bit_11'))
-print('    DECRYPTION_ENABLE_FOR_DEBUG :', control('bit_9'))
-print('                ARM_DISABLE_BIT :', control('bit_7'))
-print('      ARM_DISABLE_REDUNDANT_BIT :', control('bit_6'))
-print('                       Bootmode :', get('bootmode', 'hex'), get('bootmode', 'binary'))
-print('                Bootmode - Copy :', get('bootmode_copy', 'hex'), get('bootmode_copy', 'binary'))
-print('          OSC Frequency 19.2MHz :', bootmode('bit_1'))
-print('            SDIO Pullup Enabled :', bootmode('bit_3'))
-print('               Bootmode (Bit 4) :', bootmode('bit_4'))
-print('               Bootmode (Bit 5) :', bootmode('bit_5'))
-print('               Bootmode (Bit 7) :', bootmode('bit_7'))
-print('                  GPIO Bootmode :', bootmode('bit_19'))
-print('             GPIO Bootmode Bank :', bootmode('bit_20'))
-print('                SD Boot Enabled :', bootmode('bit_21'))
-print('                      Boot Bank :', bootmode('bit_22'))
-print('         Bootmode (eMMC Enable) :', bootmode('bit_25'), '(This is not confirmed but is set on the CM3)')
-print('        USB Device Boot Enabled :', bootmode('bit_28'))
-print('          USB Host Boot Enabled :', bootmode('bit_29'))
-print('    Boot Signing Parity (15-0)  :', pretty_string(boot_signing_parity('bits_0-15')))
-print('    Boot Signing Parity (31-16) :', pretty_string(boot_signing_parity('bits_16-31')))
-print('                  Serial Number :', get('serial_number', 'hex'))
-print('          Inverse Serial Number :', get('serial_number_inverted', 'hex'))
-print('                Revision Number :', get('revision_number', 'hex'))
-print('              New Revision Flag :', revision('new_flag'))
-print('                            RAM :', MEMORY_SIZES_AS_STRING[BOARD['memory']], "MB")
-print('                   Manufacturer :', MANUFACTURERS_AS_STRING[BOARD['manufacturer']])
-print('                            CPU :', PROCESSORS_AS_STRING[BOARD['processor']])
-print('                     Board Type :', 'Raspberry Pi Model ' + BOARD_TYPES_AS_STRING[BOARD['type']])
-print('                 Board Revision :', BOARD_REVISIONS_AS_STRING[BOARD['revision']])
-print('                   Batch Number :', get('batch_number', 'hex'))
-print('        Overvolt Protection Bit :', overclock('overvolt_protection'))
-print('            Customer Region One :', get('customer_one', 'hex'))
-print('            Customer Region Two :', get('customer_two', 'hex'))
-print('          Customer Region Three :', get('customer_three', 'hex'))
-print('           Customer Region Four :', get('customer_four', 'hex'))
-print('           Customer Region Five :', get('customer_five', 'hex'))
-print('            Customer Region Six :', get('customer_six', 'hex'))
-print('          Customer Region Seven :', get('customer_seven', 'hex'))
-print('          Customer Region Eight :', get('customer_eight', 'hex'))
-print('              MPEG2 License Key :', get('codec_key_one', 'hex'))
-print('               VC-1 License Key :', get('codec_key_two', 'hex'))
-print('                    MAC Address :', format_mac())
-print('                  Advanced Boot :', get('advanced_boot', 'hex'), get('advanced_boot', 'binary'))
-print('             ETH_CLK Output Pin :', pretty_string(advanced_boot('bits_0-6'), False))
-print('         ETH_CLK Output Enabled :', advanced_boot('bit_7'))
-print('             LAN_RUN Output Pin :', pretty_string(advanced_boot('bits_8-14'), False))
-print('         LAN_RUN Output Enabled :', advanced_boot('bit_15'))
-print('                USB Hub Timeout :', process_hub_timeout(advanced_boot('bit_24')))
-print('              ETH_CLK Frequency :', process_eth_clk_frequency(advanced_boot('bit_25')))
+            yield header, OTPDump.from_lines(body)
+        except InvalidOTPDump as exception:
+            yield header, exception
+
+
+def iter_images(buffer, image=OTP_IMAGE):
+    """Yield an OTPDump for each image packed back to back in a buffer.
+    Any object supporting the buffer protocol works, words are unpacked straight from it.
+    """
+    if len(buffer) % image.size:
+        raise InvalidOTPDump('Invalid OTP Image (' + str(len(buffer)) + ' bytes is not a multiple of ' +
+                             str(image.size) + ')')
+    for offset in range(0, len(buffer), image.size):
+        yield OTPDump(dict(enumerate(image.unpack_from(buffer, offset))))
+
+
+def iter_image_file(file_name, image=OTP_IMAGE):
+    """Memory-map a file of one or more concatenated OTP images and yield an OTPDump for each."""
+    import mmap
+
+    with open(file_name, 'rb') as image_file:
+        if not fstat(image_file.fileno()).st_size:
+            raise InvalidOTPDump('Invalid OTP Image (empty file)')
+        mapped = mmap.mmap(image_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for dump in iter_images(mapped, image):
+                yield dump
+        finally:
+            mapped.close()
+
+
+class OTPDump(object):
+    """A single OTP dump.
+
+    Instances never print, exit or touch module state, so a long-running process can decode
+    as many dumps as it likes. Build one with from_lines(), from_bytes(), from_image() or
+    from_dict().
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.warnings = []
+        self.diagnostics = []  # Diagnostic for each line skipped by from_bytes(strict=False)
+        self.board = board_info(self.word(REGIONS['revision_number']))
+        self.__process_bootmode()
+        self.__process_serial()
+
+    @classmethod
+    def from_lines(cls, lines):
+        """Build a dump from an iterable of 'NN:xxxxxxxx' lines."""
+        return cls(parse_lines(lines))
+
+    @classmethod
+    def from_bytes(cls, raw, encoding='ascii', strict=True, file_name=None):
+        """Build a dump from the raw bytes of 'vcgencmd otp_dump' output.
+        With strict=False lines that can not be read are skipped and kept in diagnostics, see
+        tokenize(); encoding must then be ascii.
+        """
+        if strict:
+            return cls(parse_bytes(raw, encoding))
+        data, diagnostics = tokenize(raw, False, file_name)
+        if not data:
+            raise InvalidOTPDump(NO_REGIONS_READ)
+        dump = cls(data)
+        dump.diagnostics = diagnostics
+        return dump
+
+    @classmethod
+    def from_image(cls, buffer, offset=0, image=OTP_IMAGE):
+        """Build a dump from a binary OTP image of little-endian words, see iter_images()."""
+        if len(buffer) - offset < image.size:
+            raise InvalidOTPDump('Invalid OTP Image (shorter than ' + str(image.size) + ' bytes)')
+        return cls(dict(enumerate(image.unpack_from(buffer, offset))))
+
+    @classmethod
+    def from_dict(cls, regions):
+        """Build a dump from a dict of region number to either an int or a hex string."""
+        data = {}
+        for region, value in regions.items():
+            if not isinstance(value, int):
+                if len(value) != 8 or not is_hex(value):
+                    raise InvalidOTPDump("Invalid OTP Dump (Reading region " + str(region) + ", string '" + value +
+                                         "' is not hexadecimal.)")
+                value = int(value, 16)
+            elif not 0 <= value <= 0xffffffff:
+                raise InvalidOTPDump('Invalid OTP Dump (region ' + str(region) + ' is not a 32-bit word)')
+            data[int(region)] = value
+        if not data:
+            raise InvalidOTPDump('Invalid OTP Dump (no regions given)')
+        return cls(data)
+
+    def word(self, region):
+        """Return the 32-bit word stored in the numbered region."""
+        try:
+            return self.data[region]
+        except KeyError:
+            raise InvalidOTPDump('Invalid OTP Dump (region ' + str(region) + ' missing)')
+
+    def get(self, loc, specifier='raw'):
+        """Get data from specified OTP region.
+        Specifier determines whether it is returned 'raw', in 'binary', in 'octal', or in 'hex'idecimal.
+        """
+        value = self.word(REGIONS[loc])
+        if specifier == 'raw':
+            return format(value, '08x')
+        elif specifier == 'binary':
+            return format(value, '032b')
+        elif specifier == 'hex':
+            return format(value, '#010x')
+        elif specifier == 'octal':
+            # TODO: Ask jas for more details on what she wants the octal output to look like.
+            return format(value, '#018o')
+        else:
+            raise ValueError('Invalid Flag.')
+
+    def field(self, register, name):
+        """Return a bitfield from REGISTER_SCHEMA as an int."""
+        region, shift, mask, _ = FIELDS[register][name]
+        return (self.word(region) >> shift) & mask
+
+    def bits(self, register, name):
+        """Return a bitfield from REGISTER_SCHEMA as a string of binary digits."""
+        region, shift, mask, spec = FIELDS[register][name]
+        return format((self.word(region) >> shift) & mask, spec)
+
+    def pretty(self, register, name, do_binary=True):
+        """Return a pretty bitfield, as pretty_string() would for its binary digits."""
+        region, shift, mask, spec = FIELDS[register][name]
+        value = (self.word(region) >> shift) & mask
+        return str(value) + ' (' + format(value, '#04x') + ') ' + (format(value, spec) if do_binary else '')
+
+    def control(self, name):
+        """Handler for region 16."""
+        return self.bits('control', name)
+
+    def bootmode(self, name):
+        """Handler for region 17."""
+        return self.bits('bootmode', name)
+
+    def boot_signing_parity(self, name):
+        """Handler for region 27."""
+        return self.bits('boot_signing_parity', name)
+
+    def revision(self, name):
+        """Handler for region 30."""
+        return self.bits('revision_number', name)
+
+    def overclock(self, name):
+        """Handler for region 32."""
+        return self.bits('overclock', name)
+
+    def advanced_boot(self, name):
+        """Handler for region 66."""
+        return self.bits('advanced_boot', name)
+
+    def __process_bootmode(self):
+        """Process bootmode, Check against the backup."""
+        if self.word(REGIONS['bootmode']) != self.word(REGIONS['bootmode_copy']):
+            self.warnings.append('Bootmode fields are not the same, this is a bad thing!')
+
+    def __process_serial(self):
+        """Process Serial, Check against Inverse Serial."""
+        serial = self.word(REGIONS['serial_number'])
+        inverse_serial = self.word(REGIONS['serial_number_inverted'])
+        if serial ^ inverse_serial != 0xffffffff:
+            self.warnings.append('Serial failed checksum!')
+
+    def format_mac(self):
+        """Format MAC Address in a human readable fashion."""
+        mac_part_1 = self.word(REGIONS['mac_address_one'])
+        if mac_part_1:
+            mac = format(mac_part_1, '08x') + self.get('mac_address_two', 'raw')
+            return ':'.join(mac[i:i+2] for i in range(0, 12, 2))
+        return 'None'
+
+    def decode(self, fields=None):
+        """Decode fields into a dict of field name to display string.
+        fields is a list of names from FIELD_NAMES, every field is decoded when it is None.
+        """
+        if fields is None:
+            return dict((name, decoder(self)) for name, decoder in FIELD_DECODERS)
+        return dict((name, DECODERS[name](self)) for name in resolve_fields(fields))
+
+    def lazy(self):
+        """Return a LazyDecode, which only renders the fields that are read from it."""
+        return LazyDecode(self)
+
+
+# Every decoded field, in display order, with the function that renders it from an OTPDump.
+FIELD_DECODERS = (
+    ('control', lambda dump: dump.get('control', 'hex')),
+    ('control_binary', lambda dump: dump.get('control', 'binary')),
+    ('jtag_debug_key_parity_start_bit', lambda dump: dump.pretty('control', 'bits_24-31')),
+    ('vpu_cache_key_parity_start_bit', lambda dump: dump.pretty('control', 'bits_16-23')),
+    ('jtag_disable_bit', lambda dump: str(dump.field('control', 'bit_15'))),
+    ('jtag_disable_redundant_bit', lambda dump: str(dump.field('control', 'bit_14'))),
+    ('macrovision_start_bit', lambda dump: str(dump.field('control', 'bit_13'))),
+    ('macrovision_redundant_start_bit', lambda dump: str(dump.field('control', 'bit_11'))),
+    ('decryption_enable_for_debug', lambda dump: str(dump.field('control', 'bit_9'))),
+    ('arm_disable_bit', lambda dump: str(dump.field('control', 'bit_7'))),
+    ('arm_disable_redundant_bit', lambda dump: str(dump.field('control', 'bit_6'))),
+    ('bootmode', lambda dump: dump.get('bootmode', 'hex')),
+    ('bootmode_binary', lambda dump: dump.get('bootmode', 'binary')),
+    ('bootmode_copy', lambda dump: dump.get('bootmode_copy', 'hex')),
+    ('bootmode_copy_binary', lambda dump: dump.get('bootmode_copy', 'binary')),
+    ('osc_frequency_19_2mhz', lambda dump: str(dump.field('bootmode', 'bit_1'))),
+    ('sdio_pullup_enabled', lambda dump: str(dump.field('bootmode', 'bit_3'))),
+    ('bootmode_bit_4', lambda dump: str(dump.field('bootmode', 'bit_4'))),
+    ('bootmode_bit_5', lambda dump: str(dump.field('bootmode', 'bit_5'))),
+    ('bootmode_bit_7', lambda dump: str(dump.field('bootmode', 'bit_7'))),
+    ('gpio_bootmode', lambda dump: str(dump.field('bootmode', 'bit_19'))),
+    ('gpio_bootmode_bank', lambda dump: str(dump.field('bootmode', 'bit_20'))),
+    ('sd_boot_enabled', lambda dump: str(dump.field('bootmode', 'bit_21'))),
+    ('boot_bank', lambda dump: str(dump.field('bootmode', 'bit_22'))),
+    ('emmc_enable', lambda dump: str(dump.field('bootmode', 'bit_25'))),
+    ('usb_device_boot_enabled', lambda dump: str(dump.field('bootmode', 'bit_28'))),
+    ('usb_host_boot_enabled', lambda dump: str(dump.field('bootmode', 'bit_29'))),
+    ('boot_signing_parity_low', lambda dump: dump.pretty('boot_signing_parity', 'bits_0-15')),
+    ('boot_signing_parity_high', lambda dump: dump.pretty('boot_signing_parity', 'bits_16-31')),
+    ('serial_number', lambda dump: dump.get('serial_number', 'hex')),
+    ('serial_number_inverted', lambda dump: dump.get('serial_number_inverted', 'hex')),
+    ('revision_number', lambda dump: dump.get('revision_number', 'hex')),
+    ('new_revision_flag', lambda dump: str(dump.field('revision_number', 'new_flag'))),
+    ('memory_size', lambda dump: dump.board.memory_size),
+    ('manufacturer', lambda dump: dump.board.manufacturer),
+    ('processor', lambda dump: dump.board.processor),
+    ('board_type', lambda dump: dump.board.board_type),
+    ('board_revision', lambda dump: dump.board.board_revision),
+    ('batch_number', lambda dump: dump.get('batch_number', 'hex')),
+    ('overvolt_protection_bit', lambda dump: str(dump.field('overclock', 'overvolt_protection'))),
+    ('customer_one', lambda dump: dump.get('customer_one', 'hex')),
+    ('customer_two', lambda dump: dump.get('customer_two', 'hex')),
+    ('customer_three', lambda dump: dump.get('customer_three', 'hex')),
+    ('customer_four', lambda dump: dump.get('customer_four', 'hex')),
+    ('customer_five', lambda dump: dump.get('customer_five', 'hex')),
+    ('customer_six', lambda dump: dump.get('customer_six', 'hex')),
+    ('customer_seven', lambda dump: dump.get('customer_seven', 'hex')),
+    ('customer_eight', lambda dump: dump.get('customer_eight', 'hex')),
+    ('codec_key_one', lambda dump: dump.get('codec_key_one', 'hex')),
+    ('codec_key_two', lambda dump: dump.get('codec_key_two', 'hex')),
+    ('mac_address', lambda dump: dump.format_mac()),
+    ('advanced_boot', lambda dump: dump.get('advanced_boot', 'hex')),
+    ('advanced_boot_binary', lambda dump: dump.get('advanced_boot', 'binary')),
+    ('eth_clk_output_pin', lambda dump: dump.pretty('advanced_boot', 'bits_0-6', False)),
+    ('eth_clk_output_enabled', lambda dump: str(dump.field('advanced_boot', 'bit_7'))),
+    ('lan_run_output_pin', lambda dump: dump.pretty('advanced_boot', 'bits_8-14', False)),
+    ('lan_run_output_enabled', lambda dump: str(dump.field('advanced_boot', 'bit_15'))),
+    ('usb_hub_timeout', lambda dump: process_hub_timeout(dump.advanced_boot('bit_24'))),
+    ('eth_clk_frequency', lambda dump: process_eth_clk_frequency(dump.advanced_boot('bit_25'))),
+)
+FIELD_NAMES = tuple(name for name, _ in FIELD_DECODERS)
+DECODERS = dict(FIELD_DECODERS)
+FIELD_ALIASES = {
+    'serial': 'serial_number',
+    'mac':    'mac_address',
+}
+
+
+def resolve_fields(names):
+    """Turn a list or comma separated string of field names (or aliases) into field names."""
+    if isinstance(names, str):
+        names = [name.strip() for name in names.split(',') if name.strip()]
+    fields = [FIELD_ALIASES.get(name, name) for name in names]
+    unknown = [name for name in fields if name not in DECODERS]
+    if unknown:
+        raise ValueError('Unknown field(s): ' + ', '.join(unknown))
+    return fields
+
+
+class LazyDecode(object):
+    """The decoded fields of a dump, each rendered on first access and then cached.
+    Fields are read as items or attributes, e.g. result['board_type'] or result.board_type.
+    """
+
+    def __init__(self, dump):
+        self.dump = dump
+        self.cache = {}
+
+    def __getitem__(self, name):
+        try:
+            return self.cache[name]
+        except KeyError:
+            pass
+        value = self.cache[name] = DECODERS[FIELD_ALIASES.get(name, name)](self.dump)
+        return value
+
+    def __getattr__(self, name):
+        if name in DECODERS or name in FIELD_ALIASES:
+            return self[name]
+        raise AttributeError(name)
+
+    def __contains__(self, name):
+        return name in DECODERS or name in FIELD_ALIASES
+
+    def __iter__(self):
+        return iter(FIELD_NAMES)
+
+    def __len__(self):
+        return len(FIELD_NAMES)
+
+    def keys(self):
+        """Every field name, in display order."""
+        return list(FIELD_NAMES)
+
+
+def render_text(dump):
+    """Render a dump the way the CLI prints it, returning a list of lines."""
+    result = dump.decode()
+    lines = list(dump.warnings)
+    for label, template in TEXT_LAYOUT:
+        lines.append(label + ' ' + template.format(**result))
+    return lines
+
+
+def render_fields(dump, fields):
+    """Render only the named fields, one 'name : value' line each."""
+    result = dump.lazy()
+    return list(dump.warnings) + ['%31s : %s' % (name, result[name]) for name in resolve_fields(fields)]
+
+
+def read_otp_file(file_name=None):
+    """Read OTP from the named file, or stdin."""
+    if file_name is not None:  # We're given an argument on the command line
+        if path.isfile(file_name):
+            with open(file_name, 'r') as otp_file:
+                return OTPDump.from_lines(otp_file)
+        else:
+            raise InvalidOTPDump('Unable to open file.')
+    else:  # Use stdin instead.
+        return OTPDump.from_lines(sys.stdin)
+
+
+def read_otp_bytes(file_name=None):
+    """Read the raw bytes of a dump from the named file, or stdin."""
+    if file_name is None:
+        return getattr(sys.stdin, 'buffer', sys.stdin).read()
+    try:
+        with open(file_name, 'rb') as otp_file:
+            return otp_file.read()
+    except (IOError, OSError):
+        raise InvalidOTPDump('Unable to open file.')
+
+
+def run(file_name=None, format_name='text', fields=None, stats=None, strict=True):
+    """Decode and print one dump as main() does, recording each stage in stats if it is given.
+    With strict=False lines that can not be read are reported on stderr and skipped.
+    """
+    errors = (InvalidOTPDump,)
+    try:
+        if stats is None and strict:
+            dump = read_otp_file(file_name)
+        elif stats is None:
+            dump = OTPDump.from_bytes(read_otp_bytes(file_name), strict=False, file_name=file_name or '-')
+        else:
+            import OTPStats
+            # Run as a script, this module is not the OTPParser that OTPStats imports.
+            errors = (InvalidOTPDump, OTPStats.OTPParser.InvalidOTPDump)
+            dump = OTPStats.instrumented_dump(OTPStats.instrumented_read(file_name, stats), stats, strict=strict,
+                                              file_name=file_name or '-')
+        for diagnostic in dump.diagnostics:
+            print(diagnostic.file + ':' + str(diagnostic.line) + ': ' + diagnostic.reason, file=sys.stderr)
+        start = stats and OTPStats.CLOCK()
+        if format_name != 'text':
+            record = {'file': file_name or '-', 'board': dump.decode(fields), 'warnings': dump.warnings}
+        elif fields:
+            lines = render_fields(dump, fields)
+        else:
+            lines = render_text(dump)
+    except errors as exception:
+        sys.exit(str(exception))
+    if format_name == 'text':
+        print('\n'.join(lines))
+    else:
+        import OTPOutput
+        with OTPOutput.open_writer(format_name, getattr(sys.stdout, 'buffer', sys.stdout), fields) as writer:
+            writer.write(record)
+    if stats is not None:
+        stats.time('render', OTPStats.CLOCK() - start)
+        stats.count('records')
+
+
+def main(argv=None):
+    """Command line entry point."""
+    if argv is None:
+        argv = sys.argv[1:]
+    if len(argv) <= 1 and not [arg for arg in argv if arg.startswith('-')]:
+        # The boot-time health check: no options, so argparse (and with it re) is never imported.
+        run(argv[0] if argv else None)
+        return
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Decode a Raspberry Pi OTP dump.')
+    parser.add_argument('file', nargs='?', help="output of 'vcgencmd otp_dump' (default: stdin)")
+    parser.add_argument('--fields', help='comma separated fields to decode, e.g. serial_number,board_type,mac')
+    parser.add_argument('--format', choices=('text', 'ndjson', 'csv', 'msgpack'), default='text',
+                        help='output format (default: text)')
+    parser.add_argument('--lenient', action='store_true', help='skip lines that can not be read, reporting them')
+    parser.add_argument('--stats', action='store_true', help='print per-stage timings and counters to stderr')
+    parser.add_argument('--profile', metavar='FILE', help='save a cProfile profile of the run to FILE')
+    parser.add_argument('--tracemalloc', action='store_true', help='report peak memory and top allocations')
+    args = parser.parse_args(argv)
+    try:
+        fields = resolve_fields(args.fields) if args.fields else None
+    except ValueError as exception:
+        parser.error(str(exception))
+    if not (args.stats or args.profile or args.tracemalloc):
+        run(args.file, args.format, fields, strict=not args.lenient)
+        return
+    import OTPStats
+    stats = OTPStats.Stats()
+    try:
+        OTPStats.profiled(lambda: run(args.file, args.format, fields, stats, not args.lenient), args.profile,
+                          args.tracemalloc, stats)
+    finally:
+        if args.stats or args.tracemalloc:
+            OTPStats.print_summary(stats)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""Raspberry Pi OTP Queries
+
+ Copyright 2019-2022 Jasmine Iwanek & Dylan Morrison
+
+ Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ software and associated documentation files (the "Software"), to deal in the Software
+ without restriction, including without limitation the rights to use, copy, modify, merge,
+ publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+ to whom the Software is furnished to do so, subject to the following conditions:
+
+ The above copyright notice and this permission notice shall be included in all copies or
+ substantial portions of the Software.
+
+ THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+ FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+ DEALINGS IN THE SOFTWARE.
+
+ Queries filter dumps on their raw region words, before anything is decoded or formatted.
+ compile_query() turns a query into a predicate over a dict of region number to word, such as
+ OTPDump.data or the output of OTPParser.parse_lines().
+
+ Query language
+ processor == BCM2711 and memory_size == 4096
+ not jtag_disable_bit
+ usb_host_boot_enabled or (bootmode.bit_19 and bootmode.bit_20 == 0)
+ bootmode != bootmode_copy
+ revision_number.board_type >= 0x10
+
+ Operands are:
+ - a REGISTER_SCHEMA field as register.field, e.g. control.bit_15
+ - a decoded single-bit field name, e.g. jtag_disable_bit (see FIELD_ALIASES)
+ - a whole region from REGIONS, e.g. serial_number
+ - memory_size, manufacturer, processor, board_type or board_revision, compared with == or !=
+   against the name the CLI prints, e.g. board_type == 'Zero W'
+ - integers, in decimal or with a 0x / 0b prefix
+ A field on its own is true when it is not zero. Combine comparisons with and, or, not and
+ parentheses.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import re
+
+import OTPParser
+
+# Decoded field names that are a single REGISTER_SCHEMA field.
+FIELD_ALIASES = {
+    'jtag_disable_bit':                ('control', 'bit_15'),
+    'jtag_disable_redundant_bit':      ('control', 'bit_14'),
+    'macrovision_start_bit':           ('control', 'bit_13'),
+    'macrovision_redundant_start_bit': ('control', 'bit_11'),
+    'decryption_enable_for_debug':     ('control', 'bit_9'),
+    'arm_disable_bit':                 ('control', 'bit_7'),
+    'arm_disable_redundant_bit':       ('control', 'bit_6'),
+    'jtag_debug_key_parity_start_bit': ('control', 'bits_24-31'),
+    'vpu_cache_key_parity_start_bit':  ('control', 'bits_16-23'),
+    'osc_frequency_19_2mhz':           ('bootmode', 'bit_1'),
+    'sdio_pullup_enabled':             ('bootmode', 'bit_3'),
+    'gpio_bootmode':                   ('bootmode', 'bit_19'),
+    'gpio_bootmode_bank':              ('bootmode', 'bit_20'),
+    'sd_boot_enabled':                 ('bootmode', 'bit_21'),
+    'boot_bank':                       ('bootmode', 'bit_22'),
+    'emmc_enable':                     ('bootmode', 'bit_25'),
+    'usb_device_boot_enabled':         ('bootmode', 'bit_28'),
+    'usb_host_boot_enabled':           ('bootmode', 'bit_29'),
+    'new_revision_flag':               ('revision_number', 'new_flag'),
+    'overvolt_protection_bit':         ('overclock', 'overvolt_protection'),
+    'eth_clk_output_pin':              ('advanced_boot', 'bits_0-6'),
+    'eth_clk_output_enabled':          ('advanced_boot', 'bit_7'),
+    'lan_run_output_pin':              ('advanced_boot', 'bits_8-14'),
+    'lan_run_output_enabled':          ('advanced_boot', 'bit_15'),
+    'usb_hub_timeout':                 ('advanced_boot', 'bit_24'),
+    'eth_clk_frequency':               ('advanced_boot', 'bit_25'),
+}
+
+# Fields compared by name, through OTPParser.board_info() of the revision number word.
+BOARD_FIELDS = ('memory_size', 'manufacturer', 'processor', 'board_type', 'board_revision')
+
+# Every label board_info() can give each of BOARD_FIELDS, new style or legacy.
+BOARD_LABELS = dict((field, frozenset(names) | frozenset(getattr(board, field) for board in OTPParser.LEGACY_BOARDS))
+                    for field, names in zip(BOARD_FIELDS, (OTPParser.MEMORY_SIZE_NAMES, OTPParser.MANUFACTURER_NAMES,
+                                                           OTPParser.PROCESSOR_NAMES, OTPParser.BOARD_TYPE_NAMES,
+                                                           OTPParser.BOARD_REVISION_NAMES)))
+
+# How a board field can be used, with example labels from a Pi 4B.
+BOARD_FIELD_USAGE = "%s is compared by name with == or !=, e.g. %s == '%s', or by value as revision_number.%s"
+BOARD_FIELD_EXAMPLE = OTPParser.board_info(0xc03111)
+
+COMPARISONS = ('==', '!=', '<', '<=', '>', '>=')
+
+TOKEN = re.compile(r'\s*(?:(==|!=|<=|>=|<|>|\(|\))|"([^"]*)"|\'([^\']*)\'|([^\s()=!<>"\']+))')
+
+REVISION_REGION = OTPParser.REGIONS['revision_number']
+
+
+class QueryError(ValueError):
+    """Raised for a query that can not be compiled."""
+    pass
+
+
+def tokenize(query):
+    """Split a query into (kind, text) tokens: 'op', 'string' or 'word'."""
+    tokens = []
+    position = 0
+    query = query.rstrip()
+    while position < len(query):
+        match = TOKEN.match(query, position)
+        if not match or match.end() == position:
+            raise QueryError("Can not read query at '" + query[position:] + "'")
+        position = match.end()
+        operator, double_quoted, single_quoted, word = match.groups()
+        if operator is not None:
+            tokens.append(('op', operator))
+        elif word is not None:
+            tokens.append(('word', word))
+        else:
+            tokens.append(('string', double_quoted if double_quoted is not None else single_quoted))
+    return tokens
+
+
+def field_operand(word):
+    """Resolve a word to (region, shift, mask), or None if it is not a raw field."""
+    if word in FIELD_ALIASES:
+        register, name = FIELD_ALIASES[word]
+        return OTPParser.FIELDS[register][name][:3]
+    if '.' in word:
+        register, name = word.split('.', 1)
+        try:
+            return OTPParser.FIELDS[register][name][:3]
+        except KeyError:
+            raise QueryError("Unknown field '" + word + "'")
+    if word in OTPParser.REGIONS:
+        return OTPParser.REGIONS[word], 0, 0xffffffff
+    return None
+
+
+def integer(word):
+    """Parse an integer literal, or return None."""
+    try:
+        return int(word, 0)
+    except ValueError:
+        return None
+
+
+def board_field_usage(name):
+    """Explain how to query one of BOARD_FIELDS."""
+    return BOARD_FIELD_USAGE % (name, name, getattr(BOARD_FIELD_EXAMPLE, name), name)
+
+
+def compile_comparison(left, operator, right):
+    """Compile one comparison between two operand tokens into a predicate over region words."""
+    if left[0] == 'word' and left[1] in BOARD_FIELDS:
+        if operator not in ('==', '!='):
+            raise QueryError(board_field_usage(left[1]))
+        index = BOARD_FIELDS.index(left[1])
+        label = right[1]
+        if label not in BOARD_LABELS[left[1]]:
+            similar = [known for known in BOARD_LABELS[left[1]] if known.lower() == label.lower()]
+            raise QueryError('Unknown ' + left[1] + " label '" + label + "'" +
+                             (" (did you mean '" + similar[0] + "'?)" if similar else ''))
+        if operator == '==':
+            return lambda data: OTPParser.board_info(data[REVISION_REGION])[index] == label
+        return lambda data: OTPParser.board_info(data[REVISION_REGION])[index] != label
+
+    field = field_operand(left[1]) if left[0] == 'word' else None
+    if field is None:
+        raise QueryError("Unknown field '" + left[1] + "'")
+    region, shift, mask = field
+    other = field_operand(right[1]) if right[0] == 'word' else None
+    if other is not None:
+        other_region, other_shift, other_mask = other
+        compare = {
+            '==': lambda a, b: a == b, '!=': lambda a, b: a != b,
+            '<': lambda a, b: a < b, '<=': lambda a, b: a <= b,
+            '>': lambda a, b: a > b, '>=': lambda a, b: a >= b,
+        }[operator]
+        return lambda data: compare((data[region] >> shift) & mask,
+                                    (data[other_region] >> other_shift) & other_mask)
+
+    value = integer(right[1]) if right[0] == 'word' else None
+    if value is None:
+        raise QueryError("Expected a number or field after '" + operator + "', not '" + right[1] + "'")
+    if operator in ('==', '!='):
+        # Compare in place, without shifting the word down.
+        in_place = mask << shift
+        expected = (value & mask) << shift
+        if value & ~mask:  # The field can never hold this value.
+            return (lambda data: False) if operator == '==' else (lambda data: True)
+        if operator == '==':
+            return lambda data: data[region] & in_place == expected
+        return lambda data: data[region] & in_place != expected
+    return {
+        '<': lambda data: (data[region] >> shift) & mask < value,
+        '<=': lambda data: (data[region] >> shift) & mask <= value,
+        '>': lambda data: (data[region] >> shift) & mask > value,
+        '>=': lambda data: (data[region] >> shift) & mask >= value,
+    }[operator]
+
+
+class Parser(object):
+    """Recursive descent parser building a predicate from a token list."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        """The next token, or None at the end."""
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self):
+        """Consume and return the next token."""
+        token = self.peek()
+        if token is None:
+            raise QueryError('Query ends unexpectedly')
+        self.position += 1
+        return token
+
+    def is_keyword(self, keyword):
+        """Whether the next token is the given keyword."""
+        token = self.peek()
+        return token is not None and token[0] == 'word' and token[1].lower() == keyword
+
+    def parse(self):
+        """Parse the whole query."""
+        predicate = self.parse_or()
+        if self.peek() is not None:
+            raise QueryError("Unexpected '" + self.peek()[1] + "' in query")
+        return predicate
+
+    def parse_or(self):
+        """expression := term ('or' term)*"""
+        terms = [self.parse_and()]
+        while self.is_keyword('or'):
+            self.take()
+            terms.append(self.parse_and())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda data: any(term(data) for term in terms)
+
+    def parse_and(self):
+        """term := factor ('and' factor)*"""
+        factors = [self.parse_not()]
+        while self.is_keyword('and'):
+            self.take()
+            factors.append(self.parse_not())
+        if len(factors) == 1:
+            return factors[0]
+        return lambda data: all(factor(data) for factor in factors)
+
+    def parse_not(self):
+        """factor := 'not' factor | '(' expression ')' | comparison"""
+        if self.is_keyword('not'):
+            self.take()
+            inner = self.parse_not()
+            return lambda data: not inner(data)
+        if self.peek() == ('op', '('):
+            self.take()
+            inner = self.parse_or()
+            if self.take() != ('op', ')'):
+                raise QueryError("Expected ')' in query")
+            return inner
+        left = self.take()
+        token = self.peek()
+        if token is not None and token[0] == 'op' and token[1] in COMPARISONS:
+            operator = self.take()[1]
+            return compile_comparison(left, operator, self.take())
+        if left[0] == 'word' and left[1] in BOARD_FIELDS:
+            raise QueryError(board_field_usage(left[1]))
+        return compile_comparison(left, '!=', ('word', '0'))
+
+
+def compile_query(query):
+    """Compile a query into a predicate taking a dict of region number to word.
+    Dumps missing a region the query reads do not match.
+    """
+    predicate = Parser(tokenize(query)).parse()
+
+    def matches(data):
+        """Whether the dump's region words match the query."""
+        try:
+            return predicate(data)
+        except KeyError:
+            return False
+    matches.query = query
+    return matches
@@ -0,0 +1,166 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+"""Raspberry Pi OTP Parser Start-up Benchmark
+
+ Copyright 2019-2022 Jasmine Iwanek & Dylan Morrison
+
+ Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ software and associated documentation files (the "Software"), to deal in the Software
+ without restriction, including without limitation the rights to use, copy, modify, merge,
+ publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+ to whom the Software is furnished to do so, subject to the following conditions:
+
+ The above copyright notice and this permission notice shall be included in all copies or
+ substantial portions of the Software.
+
+ THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+ FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+ DEALINGS IN THE SOFTWARE.
+
+ Usage
+ ./OTPStartup.py [--runs N] [--budget-ms MS] [--output results.json] [dump file]
+ Measures the cold start of a one-shot decode, as run at boot:
+ - time to first output of 'python3 -m OTPParser <dump>' and './OTPParser.py <dump>', less
+   the start-up time of the interpreter itself
+ - what 'import OTPParser' costs, module by module, from python3 -X importtime
+ Exits with an error if the median time to first output of 'python3 -m OTPParser' exceeds the
+ budget, or if the one-shot path imports any of SLOW_IMPORTS.
+
+ Use 'python3 -m OTPParser' at boot rather than running the script: Python never caches the
+ compiled code of the script it is started with, but it does cache modules run with -m.
+ A synthetic dump from OTPSynth.py is used if no dump file is given.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+CLOCK = getattr(time, 'perf_counter', time.time)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Imports the one-shot path must not pay for.
+SLOW_IMPORTS = ('future', 'argparse', 're', 'mmap', 'json', 'OTPOutput', 'OTPStats')
+
+# Default budget for 'python3 -m OTPParser <dump>', over bare interpreter start-up.
+DEFAULT_BUDGET_MS = 25.0
+
+
+def child_environment():
+    """The environment for measured runs: bytecode caching on, as it is on a Pi."""
+    environment = dict(os.environ)
+    environment.pop('PYTHONDONTWRITEBYTECODE', None)
+    environment['PYTHONPATH'] = HERE + os.pathsep + environment.get('PYTHONPATH', '')
+    return environment
+
+
+def first_output_seconds(argv):
+    """Seconds from starting argv to its first byte of output. The rest is read and discarded."""
+    start = CLOCK()
+    process = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=child_environment(),
+                               cwd=HERE)
+    first = process.stdout.read(1)
+    elapsed = CLOCK() - start
+    process.communicate()
+    if not first or process.returncode:
+        raise RuntimeError(' '.join(argv) + ' failed with status ' + str(process.returncode))
+    return elapsed
+
+
+def median(values):
+    """The median of a non-empty list."""
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+def import_times(argv):
+    """Run argv under -X importtime, returning [(module, self us, cumulative us)] in import order."""
+    process = subprocess.Popen([argv[0], '-X', 'importtime'] + argv[1:], stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, env=child_environment(), cwd=HERE)
+    _, stderr = process.communicate()
+    modules = []
+    for line in stderr.decode('utf-8', 'replace').splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+
+def write_sample_dump():
+    """Write a synthetic dump to a temporary file, returning its name."""
+    import OTPSynth
+
+    _, regions, text = next(OTPSynth.generate(1))
+    handle, file_name = tempfile.mkstemp(suffix='.txt')
+    with os.fdopen(handle, 'w') as dump_file:
+        dump_file.write(text)
+    return file_name
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description='Measure the cold start time of a one-shot OTP decode.')
+    parser.add_argument('dump', nargs='?', help="output of 'vcgencmd otp_dump' (default: a synthetic dump)")
+    parser.add_argument('--runs', type=int, default=20, help='runs of each command (default: 20)')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help='allowed median ms to first output over bare start-up (default: %(default)s)')
+    parser.add_argument('--output', help='save results to this JSON file')
+    args = parser.parse_args(argv)
+
+    dump = args.dump or write_sample_dump()
+    try:
+        python = sys.executable
+        commands = (
+            ('python', [python, '-c', 'print()']),
+            ('-m OTPParser', [python, '-m', 'OTPParser', dump]),
+            ('OTPParser.py', [python, os.path.join(HERE, 'OTPParser.py'), dump]),
+        )
+        first_output_seconds(commands[1][1])  # Write the bytecode cache, as the first boot would.
+        timings = dict((name, [first_output_seconds(command) for _ in range(args.runs)])
+                       for name, command in commands)
+        modules = import_times([python, '-m', 'OTPParser', dump])
+    finally:
+        if not args.dump:
+            os.remove(dump)
+
+    baseline = median(timings['python'])
+    print('%-14s %10s %10s %12s' % ('command', 'min ms', 'median ms', 'over python'))
+    results = {}
+    for name, _ in commands:
+        middle = median(timings[name])
+        results[name] = {'min_ms': min(timings[name]) * 1e3, 'median_ms': middle * 1e3,
+                         'over_python_ms': (middle - baseline) * 1e3}
+        print('%-14s %10.2f %10.2f %12.2f' % (name, results[name]['min_ms'], results[name]['median_ms'],
+                                              results[name]['over_python_ms']))
+
+    print()
+    print('Slowest imports of python3 -m OTPParser (self us, cumulative us):')
+    for name, self_us, cumulative_us in sorted(modules, key=lambda module: -module[1])[:10]:
+        print('%-30s %8d %10d' % (name, self_us, cumulative_us))
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump({'python': sys.version.split()[0], 'runs': args.runs, 'budget_ms': args.budget_ms,
+                       'results': results, 'imports': modules}, output_file, indent=1, sort_keys=True)
+
+    problems = ['imports ' + name for name, _, _ in modules if name in SLOW_IMPORTS]
+    if results['-m OTPParser']['over_python_ms'] > args.budget_ms:
+        problems.append('median %.2f ms over python start-up is above the %.2f ms budget' %
+                        (results['-m OTPParser']['over_python_ms'], args.budget_ms))
+    if problems:
+        sys.exit('Start-up regression: ' + '; '.join(problems))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""Raspberry Pi OTP Parser Instrumentation
+
+ Copyright 2019-2022 Jasmine Iwanek & Dylan Morrison
+
+ Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ software and associated documentation files (the "Software"), to deal in the Software
+ without restriction, including without limitation the rights to use, copy, modify, merge,
+ publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+ to whom the Software is furnished to do so, subject to the following conditions:
+
+ The above copyright notice and this permission notice shall be included in all copies or
+ substantial portions of the Software.
+
+ THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+ FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+ DEALINGS IN THE SOFTWARE.
+
+ Per-stage timers and counters for OTPParser.py and OTPFleet.py, shown by their --stats option.
+ Nothing here is imported or called unless instrumentation is asked for: the instrumented
+ pipeline is a separate code path, so normal runs pay nothing for it.
+
+ Stages
+ read   - reading a dump file's bytes
+ parse  - splitting and validating 'NN:xxxxxxxx' lines into region words
+ decode - building the OTPDump and decoding its fields
+ render - formatting and writing output
+ source - (OTPFleet.py) waiting for the next record: worker results, or log and image decoding.
+          With -j 1 the workers run in-process, so source also contains read, parse and decode.
+
+ Counters
+ bytes_read, lines, dumps, rejected (failed to decode), filtered (did not match --where),
+ board_info_hits and board_info_misses (OTPParser.board_info() cache), records
+
+ Hooks
+ Stats(hooks=[hook]) calls hook(kind, name, value) for every measurement as it is taken, kind
+ being 'count' (value added to a counter) or 'time' (seconds spent in a stage), so the numbers
+ can be forwarded to another metrics system.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import sys
+import time
+from contextlib import contextmanager
+
+import OTPParser
+
+CLOCK = getattr(time, 'perf_counter', time.time)
+
+REVISION_REGION = OTPParser.REGIONS['revision_number']
+
+
+class Stats(object):
+    """Monotonic per-stage timers and named counters."""
+
+    def __init__(self, hooks=()):
+        self.counters = {}
+        self.timers = {}
+        self.hooks = list(hooks)
+
+    def count(self, name, amount=1):
+        """Add amount to a counter."""
+        self.counters[name] = self.counters.get(name, 0) + amount
+        for hook in self.hooks:
+            hook('count', name, amount)
+
+    def time(self, name, seconds):
+        """Add seconds to a stage's timer."""
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+        for hook in self.hooks:
+            hook('time', name, seconds)
+
+    @contextmanager
+    def stage(self, name):
+        """Time the body of a with statement as the named stage."""
+        start = CLOCK()
+        try:
+            yield
+        finally:
+            self.time(name, CLOCK() - start)
+
+    def snapshot(self):
+        """A picklable copy of the counters and timers."""
+        return {'counters': dict(self.counters), 'timers': dict(self.timers)}
+
+    def merge(self, snapshot):
+        """Add a snapshot from another Stats, such as one taken in a worker process."""
+        for name, amount in snapshot['counters'].items():
+            self.count(name, amount)
+        for name, seconds in snapshot['timers'].items():
+            self.time(name, seconds)
+
+    def summary(self):
+        """Lines describing every timer and counter, for printing."""
+        lines = []
+        total = sum(self.timers.values())
+        for name, seconds in sorted(self.timers.items(), key=lambda item: -item[1]):
+            lines.append('%-18s %10.4fs %5.1f%%' % (name, seconds, 100.0 * seconds / total if total else 0.0))
+        for name, amount in sorted(self.counters.items()):
+            lines.append('%-18s %11d' % (name, amount))
+        return lines
+
+
+def instrumented_read(file_name, stats):
+    """Read the raw bytes of a dump from the named file, or stdin, as the read stage."""
+    with stats.stage('read'):
+        if file_name is None:
+            return getattr(sys.stdin, 'buffer', sys.stdin).read()
+        try:
+            with open(file_name, 'rb') as otp_file:
+                return otp_file.read()
+        except (IOError, OSError):
+            raise OTPParser.InvalidOTPDump('Unable to open file.')
+
+
+def instrumented_dump(raw, stats, where=None, strict=True, file_name=None):
+    """Parse and build an OTPDump from raw 'vcgencmd otp_dump' bytes, recording each stage.
+    Returns None for a dump not matching the where predicate. Raises InvalidOTPDump, after
+    counting it as rejected, as OTPDump.from_bytes() does, strict or not.
+    """
+    stats.count('bytes_read', len(raw))
+    stats.count('lines', raw.count(b'\n'))
+    try:
+        with stats.stage('parse'):
+            data, diagnostics = OTPParser.tokenize(raw, strict, file_name)
+        if diagnostics:
+            stats.count('diagnostics', len(diagnostics))
+        if not data:
+            raise OTPParser.InvalidOTPDump(OTPParser.NO_REGIONS_READ)
+        if where is not None and not where(data):
+            stats.count('filtered')
+            return None
+        stats.count('board_info_hits' if data.get(REVISION_REGION) in OTPParser.BOARD_INFO_CACHE
+                    else 'board_info_misses')
+        with stats.stage('decode'):
+            dump = OTPParser.OTPDump(data)
+            dump.diagnostics = diagnostics
+    except OTPParser.InvalidOTPDump:
+        stats.count('rejected')
+        raise
+    stats.count('dumps')
+    return dump
+
+
+def profiled(function, profile_file=None, trace_memory=False, stats=None):
+    """Call function under cProfile and/or tracemalloc, returning its result.
+    The profile is saved to profile_file for pstats or snakeviz. With trace_memory the peak
+    traced allocation is added to stats as peak_traced_bytes and the top allocation sites are
+    printed to stderr.
+    """
+    profiler = None
+    if profile_file:
+        import cProfile
+        profiler = cProfile.Profile()
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+    try:
+        if profiler is not None:
+            return profiler.runcall(function)
+        return function()
+    finally:
+        if profiler is not None:
+            profiler.dump_stats(profile_file)
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            top = tracemalloc.take_snapshot().statistics('lineno')[:10]
+            tracemalloc.stop()
+            if stats is not None:
+                stats.count('peak_traced_bytes', peak)
+            print('Top allocations:', file=sys.stderr)
+            for statistic in top:
+                print('  ' + str(statistic), file=sys.stderr)
+
+
+def print_summary(stats, stream=None):
+    """Print stats.summary() to stderr, or the given stream."""
+    stream = stream or sys.stderr
+    print('Stats:', file=stream)
+    for line in stats.summary():
+        print('  ' + line, file=stream)
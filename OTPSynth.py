@@ -0,0 +1,175 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Raspberry Pi Synthetic OTP Dump Generator
+
+ Copyright 2019-2022 Jasmine Iwanek & Dylan Morrison
+
+ Permission is hereby granted, free of charge, to any person obtaining a copy of this
+ software and associated documentation files (the "Software"), to deal in the Software
+ without restriction, including without limitation the rights to use, copy, modify, merge,
+ publish, distribute, sublicense, and/or sell copies of the Software, and to permit persons
+ to whom the Software is furnished to do so, subject to the following conditions:
+
+ The above copyright notice and this permission notice shall be included in all copies or
+ substantial portions of the Software.
+
+ THE SOFTWARE IS PROVIDED *AS IS*, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+ INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR
+ PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE
+ FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+ OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+ DEALINGS IN THE SOFTWARE.
+
+ Usage
+ ./OTPSynth.py [--count N] [--seed S] [--corrupt-every N] [--image] <output directory>
+ Writes deterministic synthetic dumps, one file per board, covering every legacy revision and
+ every new style memory size, manufacturer, processor, board type and board revision.
+
+ The same seed always produces the same dumps, so they can be used to compare runs.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import itertools
+import os
+import random
+
+import OTPParser
+
+# Regions 'vcgencmd otp_dump' prints.
+DUMP_REGIONS = range(8, 67)
+
+CORRUPTIONS = (
+    'not_hex',            # A region holds something other than hexadecimal
+    'bad_region',         # A line does not start with a region number
+    'no_separator',       # A line has no ':'
+    'truncated',          # The dump stops part way through
+    'empty',              # Nothing at all
+    'not_registered',     # vcgencmd was run without otp_dump
+    'serial_checksum',    # Decodes, but the inverted serial does not match
+    'bootmode_mismatch',  # Decodes, but the bootmode copy does not match
+)
+
+
+def codes(table, width):
+    """The int values of a lookup table's entries that are real width-bit codes."""
+    return sorted(int(value, 2) for value in table.values()
+                  if len(value) == width and set(value) <= set('01'))
+
+
+def legacy_revision_words():
+    """Every revision number word listed in LEGACY_REVISIONS."""
+    return [int(code, 2) for code in sorted(OTPParser.LEGACY_REVISIONS) if code != 'default']
+
+
+def new_revision_words():
+    """Yield every new style revision word, one per memory size, manufacturer, processor,
+    board type and board revision combination.
+    """
+    for memory, manufacturer, processor, board_type, board_revision in itertools.product(
+            codes(OTPParser.MEMORY_SIZES, 3), codes(OTPParser.MANUFACTURERS, 4), codes(OTPParser.PROCESSORS, 4),
+            codes(OTPParser.BOARD_TYPES, 8), codes(OTPParser.BOARD_REVISIONS, 4)):
+        yield 0x800000 | memory << 20 | manufacturer << 16 | processor << 12 | board_type << 4 | board_revision
+
+
+def revision_words():
+    """Every legacy revision word, then every new style one."""
+    return itertools.chain(legacy_revision_words(), new_revision_words())
+
+
+def make_regions(rng, revision_word):
+    """Build a plausible dump's regions for a revision word, with a matching serial pair."""
+    regions = dict((region, rng.getrandbits(32)) for region in DUMP_REGIONS)
+    for region in range(19, 27):  # The boot signing key and its copy are masked out by vcgencmd
+        regions[region] = 0xffffffff
+    serial = rng.getrandbits(32)
+    regions[OTPParser.REGIONS['serial_number']] = serial
+    regions[OTPParser.REGIONS['serial_number_inverted']] = serial ^ 0xffffffff
+    regions[OTPParser.REGIONS['revision_number']] = revision_word
+    regions[OTPParser.REGIONS['bootmode_copy']] = regions[OTPParser.REGIONS['bootmode']]
+    return regions
+
+
+def dump_text(regions):
+    """Render regions the way 'vcgencmd otp_dump' prints them."""
+    return ''.join('%02d:%08x\n' % (region, regions[region]) for region in sorted(regions))
+
+
+def dump_image(regions):
+    """Pack regions into a binary OTP image, see OTPParser.OTP_IMAGE."""
+    return OTPParser.OTP_IMAGE.pack(*[regions.get(region, 0) for region in range(OTPParser.OTP_IMAGE_WORDS)])
+
+
+def corrupt(rng, regions, kind):
+    """Return the text of a dump damaged in the given way, see CORRUPTIONS."""
+    if kind == 'serial_checksum':
+        regions = dict(regions)
+        regions[OTPParser.REGIONS['serial_number_inverted']] ^= 1 << rng.randrange(32)
+        return dump_text(regions)
+    if kind == 'bootmode_mismatch':
+        regions = dict(regions)
+        regions[OTPParser.REGIONS['bootmode_copy']] ^= 1 << rng.randrange(32)
+        return dump_text(regions)
+    if kind == 'empty':
+        return ''
+    if kind == 'not_registered':
+        return 'Command not registered\n'
+    lines = dump_text(regions).splitlines(True)
+    line = rng.randrange(len(lines))
+    if kind == 'not_hex':
+        lines[line] = lines[line][:3] + 'xyz' + lines[line][6:]
+    elif kind == 'bad_region':
+        lines[line] = 'r' + lines[line][1:]
+    elif kind == 'no_separator':
+        lines[line] = lines[line].replace(':', ' ')
+    elif kind == 'truncated':
+        lines = lines[:line]
+    return ''.join(lines)
+
+
+def generate(count=None, seed=0, corrupt_every=0):
+    """Yield (kind, regions, text) for count dumps, or for every revision word once when count
+    is None. kind is 'valid' or one of CORRUPTIONS; every corrupt_every'th dump is corrupted.
+    Revision words are cycled through in order, so the first dumps cover every legacy board.
+    """
+    rng = random.Random(seed)
+    words = revision_words() if count is None else itertools.islice(itertools.cycle(revision_words()), count)
+    corruptions = itertools.cycle(CORRUPTIONS)
+    for index, word in enumerate(words):
+        regions = make_regions(rng, word)
+        if corrupt_every and index % corrupt_every == corrupt_every - 1:
+            kind = next(corruptions)
+            yield kind, regions, corrupt(rng, regions, kind)
+        else:
+            yield 'valid', regions, dump_text(regions)
+
+
+def main(argv=None):
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description='Write deterministic synthetic OTP dumps.')
+    parser.add_argument('output', help='directory to write dumps into, created if missing')
+    parser.add_argument('--count', type=int, help='number of dumps (default: one per revision word)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed (default: 0)')
+    parser.add_argument('--corrupt-every', type=int, default=0, help='corrupt every Nth dump')
+    parser.add_argument('--image', action='store_true', help='write binary OTP images instead of text')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+    written = 0
+    for index, (kind, regions, text) in enumerate(generate(args.count, args.seed, args.corrupt_every)):
+        if args.image:
+            if kind != 'valid':
+                continue  # Text corruptions have no binary equivalent.
+            with open(os.path.join(args.output, '%07d.bin' % index), 'wb') as image_file:
+                image_file.write(dump_image(regions))
+        else:
+            with open(os.path.join(args.output, '%07d-%s.txt' % (index, kind)), 'w') as dump_file:
+                dump_file.write(text)
+        written += 1
+    print('Wrote', written, 'dumps to', args.output)
+
+
+if __name__ == '__main__':
+    main()
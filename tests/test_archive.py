@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Tests for OTPArchive.py: the producer thread stops when the consumer does."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import io
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import OTPArchive  # noqa: E402
+import OTPSynth  # noqa: E402
+
+
+class ArchiveMembersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.threads = set(threading.enumerate())
+        self.directory = tempfile.mkdtemp(prefix='otp-archive-test-')
+        self.archive = os.path.join(self.directory, 'dumps.tar.gz')
+        with tarfile.open(self.archive, 'w:gz') as archive:
+            for index, (_, _, text) in enumerate(OTPSynth.generate(20)):
+                data = text.encode('ascii')
+                info = tarfile.TarInfo('dump-%02d.txt' % index)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_all_members(self):
+        members = list(OTPArchive.archive_members([self.archive], queue_size=2))
+        self.assertEqual(len(members), 20)
+        self.assertTrue(members[-1][0].endswith('!dump-19.txt'))
+        self.assertEqual(set(threading.enumerate()), self.threads)
+
+    def test_consumer_stops_early(self):
+        members = OTPArchive.archive_members([self.archive], queue_size=1)
+        location, raw, error = next(members)
+        self.assertTrue(location.endswith('!dump-00.txt'))
+        members.close()
+        self.assertEqual(set(threading.enumerate()), self.threads)
+
+
+if __name__ == '__main__':
+    unittest.main()
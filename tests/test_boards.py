@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""Tests for OTPBoards.py: every board information label round-trips through its code."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import OTPBoards  # noqa: E402
+import OTPParser  # noqa: E402
+import OTPSynth  # noqa: E402
+
+# Every value of each new style revision field, the others zero, then every legacy revision.
+REVISIONS = ([0x800000 | value << shift for shift, width in ((20, 3), (16, 4), (12, 4), (4, 8), (0, 4))
+              for value in range(1 << width)] + list(range(len(OTPParser.LEGACY_BOARDS))))
+
+
+class BoardStoreTest(unittest.TestCase):
+
+    def test_every_label_has_a_code(self):
+        _, regions, _ = next(OTPSynth.generate(1))
+        store = OTPBoards.BoardStore()
+        for revision in REVISIONS:
+            regions[OTPBoards.REVISION_REGION] = revision
+            store.append(regions)
+        self.assertEqual([record.info() for record in store], [OTPParser.board_info(word) for word in REVISIONS])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""Tests for OTPBootrom.py: rows past the end of the image are reported, not written."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import OTPBootrom  # noqa: E402
+import OTPCapture  # noqa: E402
+
+
+def bootrom_section(rows):
+    """A one-section bootrom capture of rows consecutive rows from the bootrom base."""
+    base = OTPBootrom.BOOTROM_BASE
+    lines = ['BOOTROM DUMP: (%08x to %08x)\n' % (base, base + rows * OTPBootrom.ROW_SIZE)]
+    lines += ['0x%08x: %08X %08X %08X %08X\n' % ((base + row * OTPBootrom.ROW_SIZE,) + (row,) * 4)
+              for row in range(rows)]
+    return next(OTPCapture.iter_sections(lines))
+
+
+class SectionImageTest(unittest.TestCase):
+
+    def test_rows_past_size(self):
+        image, problems = OTPBootrom.section_image(bootrom_section(6), 'capture', size=0x40)
+        self.assertEqual(len(image.image), 0x40)
+        self.assertEqual([problem['address'] for problem in problems], ['0x60000040', '0x60000050'])
+        self.assertTrue(all(problem['problem'] == 'outside the image' for problem in problems))
+
+    def test_rows_fit(self):
+        image, problems = OTPBootrom.section_image(bootrom_section(4), 'capture')
+        self.assertEqual(problems, [])
+        self.assertTrue(image.complete())
+        self.assertEqual(image.image[0x30:0x34], b'\x03\x00\x00\x00')
+
+    def test_add_outside(self):
+        image = OTPBootrom.BootromImage(size=0x40)
+        with self.assertRaises(ValueError):
+            image.add(OTPBootrom.BOOTROM_BASE + 0x30, bytes(bytearray(0x20)), 'capture')
+        self.assertEqual(len(image.image), 0x40)
+
+
+if __name__ == '__main__':
+    unittest.main()
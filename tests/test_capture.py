@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Tests for OTPCapture.py: a short OTP data section becomes an error record."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import OTPCapture  # noqa: E402
+import OTPSynth  # noqa: E402
+
+
+def capture_lines(rows):
+    """An OTP DATA DUMP section of the given (row, word) pairs, then a line of test output."""
+    return ['OTP DATA DUMP:\r\n'] + ['%3u: 0x%08x\r\n' % (row, word) for row, word in rows] + ['PASS\r\n']
+
+
+class SectionRecordTest(unittest.TestCase):
+
+    def test_truncated_section(self):
+        sections = list(OTPCapture.iter_sections(capture_lines((row, 0) for row in range(40))))
+        self.assertEqual(len(sections), 1)
+        record = OTPCapture.section_record(sections[0])
+        self.assertEqual(record['rows'], 40)
+        self.assertIn('missing', record['error'])
+        self.assertNotIn('board', record)
+
+    def test_complete_section(self):
+        _, regions, _ = next(OTPSynth.generate(1))
+        sections = list(OTPCapture.iter_sections(capture_lines(sorted(regions.items()))))
+        record = OTPCapture.section_record(sections[0])
+        self.assertNotIn('error', record)
+        self.assertEqual(record['rows'], len(regions))
+        self.assertIn('serial_number', record['board'])
+
+
+if __name__ == '__main__':
+    unittest.main()
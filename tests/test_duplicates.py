@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Tests for OTPDuplicates.py: spilled runs are merged a few files at a time, large groups included."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import OTPDuplicates  # noqa: E402
+
+
+def add_boards(finder):
+    """Add 100 boards, where every tenth board repeats the serial number of the one before it."""
+    for index in range(100):
+        serial_number = index - 1 if index % 10 == 9 else index
+        finder.add('board %d' % index, [serial_number])
+
+
+class DuplicateFinderTest(unittest.TestCase):
+
+    def test_bounded_fan_in(self):
+        with OTPDuplicates.DuplicateFinder() as finder:
+            add_boards(finder)
+            expected = finder.duplicates()
+        self.assertEqual(len(expected), 10)
+        for fan_in in (2, 3):
+            with OTPDuplicates.DuplicateFinder(limit=3, fan_in=fan_in) as finder:
+                add_boards(finder)
+                self.assertEqual(finder.duplicates(), expected)
+                self.assertLessEqual(len(finder.keys.runs), fan_in)
+                runs = [name for name in os.listdir(finder.directory) if name.startswith('keys-')]
+                self.assertEqual(sorted(runs), sorted(os.path.basename(name) for name in finder.keys.runs))
+
+    def test_one_large_group(self):
+        with OTPDuplicates.DuplicateFinder(limit=3, fan_in=2) as finder:
+            for index in range(50):
+                finder.add('board %d' % index, [0, 1 << OTPDuplicates.KIND_SHIFT | index])
+            duplicates = [(duplicate['count'], list(duplicate['locations'])) for duplicate in finder.iter_duplicates()]
+        self.assertEqual(duplicates, [(50, ['board %d' % index for index in range(50)])])
+
+
+if __name__ == '__main__':
+    unittest.main()
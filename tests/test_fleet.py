@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Tests for OTPFleet.py: bad dumps become error records instead of ending the run."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import OTPFleet  # noqa: E402
+import OTPSynth  # noqa: E402
+
+
+class DecodeFilesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='otp-fleet-test-')
+        _, regions, text = next(OTPSynth.generate(1))
+        lines = text.splitlines(True)
+        # Regions 8 to 39 only: parses, but the customer and MAC regions are missing.
+        self.paths = []
+        for name, contents in (('valid.txt', text), ('truncated.txt', ''.join(lines[:32])), ('last.txt', text)):
+            path = os.path.join(self.directory, name)
+            with open(path, 'w') as dump_file:
+                dump_file.write(contents)
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check(self, records):
+        self.assertEqual([record['file'] for record in records], self.paths)
+        self.assertIn('board', records[0])
+        self.assertIn('missing', records[1]['error'])
+        self.assertIn('board', records[2])
+
+    def test_truncated_dump_in_process(self):
+        self.check(list(OTPFleet.decode_files(self.paths, jobs=1)))
+
+    def test_truncated_dump_in_pool(self):
+        self.check(list(OTPFleet.decode_files(self.paths, jobs=2, chunksize=1)))
+
+    def test_truncated_dump_with_where(self):
+        records = list(OTPFleet.decode_files(self.paths, jobs=1, where='serial_number != 0'))
+        self.assertIn('error', records[1])
+
+    def test_truncated_dump_in_log(self):
+        dumps = []
+        for path in self.paths:
+            with open(path) as dump_file:
+                dumps.append('board ' + os.path.basename(path) + '\n' + dump_file.read())
+        records = list(OTPFleet.decode_log(''.join(dumps).splitlines(True), 'log'))
+        self.assertEqual([record['header'] for record in records],
+                         [['board valid.txt'], ['board truncated.txt'], ['board last.txt']])
+        self.assertIn('board', records[0])
+        self.assertIn('missing', records[1]['error'])
+        self.assertIn('board', records[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
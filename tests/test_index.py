@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Tests for OTPIndex.py: one bad dump in a log does not drop the dumps after it."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import OTPIndex  # noqa: E402
+import OTPSynth  # noqa: E402
+
+
+class IngestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='otp-index-test-')
+        texts = [text for _, _, text in OTPSynth.generate(3)]
+        truncated = ''.join(texts[1].splitlines(True)[:32])
+        self.log = os.path.join(self.directory, 'boards.log')
+        with open(self.log, 'w') as log_file:
+            log_file.write('board a\n' + texts[0] + 'board b\n' + truncated + 'board c\n' + texts[2])
+        self.index = OTPIndex.FleetIndex(os.path.join(self.directory, 'index.db'))
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.directory)
+
+    def test_truncated_dump_in_log(self):
+        self.assertEqual(self.index.ingest([self.log]), (0, 0, 1))
+        self.assertEqual([index for _, index, _ in self.index.images()], [0, 2])
+        error = self.index.connection.execute('SELECT error FROM files').fetchone()[0]
+        self.assertTrue(error.startswith('dump 1: '), error)
+
+    def test_bad_hex_value(self):
+        with self.assertRaises(SystemExit) as raised:
+            OTPIndex.main([os.path.join(self.directory, 'index.db'), 'serial', 'zz'])
+        self.assertEqual(raised.exception.code, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""Tests for OTPOutput.py: buffered records reach slow readers and terminals."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import io
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import OTPOutput  # noqa: E402
+
+
+class TerminalStream(io.BytesIO):
+
+    def isatty(self):
+        return True
+
+
+class RecordWriterTest(unittest.TestCase):
+
+    def test_buffered(self):
+        stream = io.BytesIO()
+        writer = OTPOutput.NDJSONWriter(stream, flush_interval=3600)
+        writer.write({'file': 'a'})
+        self.assertEqual(stream.getvalue(), b'')
+        writer.close()
+        self.assertEqual(stream.getvalue(), b'{"file":"a"}\n')
+
+    def test_flush_interval(self):
+        stream = io.BytesIO()
+        writer = OTPOutput.NDJSONWriter(stream, flush_interval=0)
+        writer.write({'file': 'a'})
+        self.assertEqual(stream.getvalue(), b'{"file":"a"}\n')
+
+    def test_slow_producer(self):
+        stream = io.BytesIO()
+        writer = OTPOutput.NDJSONWriter(stream, flush_interval=0.05)
+        writer.write({'file': 'a'})
+        deadline = time.time() + 5
+        while not stream.getvalue() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(stream.getvalue(), b'{"file":"a"}\n')
+        writer.close()
+        self.assertIsNone(writer.flusher)
+
+    def test_terminal(self):
+        stream = TerminalStream()
+        writer = OTPOutput.open_writer('csv', stream, fields=['serial_number'], flush_interval=3600)
+        writer.write({'file': 'a', 'board': {'serial_number': '0x1'}})
+        self.assertEqual(stream.getvalue(), b'file,index,header,error,warnings,serial_number\na,,,,,0x1\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
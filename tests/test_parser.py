@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Tests for OTPParser.py: the library decodes dumps as the original script printed them."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import OTPParser  # noqa: E402
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def read_data(name):
+    """Return the bytes of a file in tests/data."""
+    with open(os.path.join(DATA, name), 'rb') as data_file:
+        return data_file.read()
+
+
+class OTPDumpTest(unittest.TestCase):
+
+    def test_text_output(self):
+        # The .out files are what the script printed for each dump before it became a library.
+        for name in ('pi4', 'legacy'):
+            dump = OTPParser.OTPDump.from_bytes(read_data(name + '.txt'))
+            self.assertEqual('\n'.join(OTPParser.render_text(dump)) + '\n', read_data(name + '.out').decode('ascii'))
+
+    def test_from_lines(self):
+        raw = read_data('pi4.txt')
+        dump = OTPParser.OTPDump.from_lines(io.StringIO(raw.decode('ascii')))
+        self.assertEqual(dump.data, OTPParser.OTPDump.from_bytes(raw).data)
+
+    def test_region_missing(self):
+        lines = read_data('pi4.txt').decode('ascii').splitlines()
+        truncated = [line for line in lines if int(line.split(':')[0]) != OTPParser.REGIONS['mac_address_one']]
+        dump = OTPParser.OTPDump.from_lines(truncated)
+        with self.assertRaises(OTPParser.InvalidOTPDump) as raised:
+            dump.decode()
+        self.assertIn('region ' + str(OTPParser.REGIONS['mac_address_one']) + ' missing', str(raised.exception))
+        with self.assertRaises(OTPParser.InvalidOTPDump) as raised:
+            OTPParser.OTPDump.from_lines(lines[:16])
+        self.assertIn(' missing)', str(raised.exception))
+
+    def test_invalid_dump(self):
+        # A bad dump is an exception for the caller to handle, not a SystemExit.
+        for raw in (b'', b'08:xyz\n', b'08:2265b1f5 trailing\n'):
+            with self.assertRaises(OTPParser.InvalidOTPDump):
+                OTPParser.OTPDump.from_bytes(raw)
+
+    def test_fields(self):
+        # Every field is the bits the original script sliced out of the register's binary string.
+        for name in ('pi4', 'legacy'):
+            dump = OTPParser.OTPDump.from_bytes(read_data(name + '.txt'))
+            for register, field, offset, width in OTPParser.REGISTER_SCHEMA:
+                binary = dump.get(register, 'binary')
+                self.assertEqual(dump.bits(register, field), binary[32 - offset - width:32 - offset])
+                self.assertEqual(dump.field(register, field), int(binary[32 - offset - width:32 - offset], 2))
+
+    def test_from_image(self):
+        dump = OTPParser.OTPDump.from_bytes(read_data('pi4.txt'))
+        image = OTPParser.OTP_IMAGE.pack(*[dump.data.get(region, 0) for region in range(OTPParser.OTP_IMAGE_WORDS)])
+        copy = OTPParser.OTPDump.from_image(b'\0' * 4 + image, offset=4)
+        self.assertEqual(dict((region, copy.data[region]) for region in dump.data), dump.data)
+        self.assertEqual(copy.decode(), dump.decode())
+        self.assertEqual([each.data for each in OTPParser.iter_images(image * 2)], [copy.data, copy.data])
+        with self.assertRaises(OTPParser.InvalidOTPDump):
+            OTPParser.OTPDump.from_image(image[:-1])
+
+    def test_decode_fields(self):
+        dump = OTPParser.OTPDump.from_bytes(read_data('pi4.txt'))
+        decoded = dump.decode()
+        self.assertEqual(dump.decode(' serial, board_type'), {'serial_number': decoded['serial_number'],
+                                                              'board_type': decoded['board_type']})
+        with self.assertRaises(ValueError) as raised:
+            dump.decode(['serial_number', 'serial_numbers'])
+        self.assertIn('serial_numbers', str(raised.exception))
+        # A field is decoded only from the regions it needs.
+        data = dict(dump.data)
+        del data[OTPParser.REGIONS['mac_address_one']]
+        self.assertEqual(OTPParser.OTPDump(data).decode(['serial']), {'serial_number': decoded['serial_number']})
+
+    def test_lazy(self):
+        dump = OTPParser.OTPDump.from_bytes(read_data('pi4.txt'))
+        decoded = dump.decode()
+        lazy = dump.lazy()
+        self.assertEqual(lazy.cache, {})
+        self.assertEqual(lazy['mac'], decoded['mac_address'])
+        self.assertEqual(lazy.board_type, decoded['board_type'])
+        self.assertEqual(sorted(lazy.cache), ['board_type', 'mac'])
+        self.assertEqual(list(lazy), list(OTPParser.FIELD_NAMES))
+        self.assertEqual(dict((name, lazy[name]) for name in lazy), decoded)
+        with self.assertRaises(AttributeError):
+            lazy.serial_numbers
+
+
+PI4B = OTPParser.BoardInfo('4096', 'Sony UK', 'BCM2711', '4B', '1.1')
+
+
+class TokenizeTest(unittest.TestCase):
+
+    def test_parse_lines(self):
+        raw = read_data('legacy.txt')
+        self.assertEqual(OTPParser.tokenize(raw), (OTPParser.parse_lines(raw.decode('ascii').splitlines()), []))
+        self.assertEqual(OTPParser.tokenize(raw.replace(b'\n', b'\r\n').rstrip()), OTPParser.tokenize(raw))
+
+    def test_strict(self):
+        for raw in (b'08:2265b1f5\n09:zz\n', b'08:2265b1f5\n\n09:91b7584a\n', b'\xff08:2265b1f5\n', b''):
+            with self.assertRaises(OTPParser.InvalidOTPDump):
+                OTPParser.tokenize(raw)
+
+    def test_lenient(self):
+        raw = b'08:2265b1f5\r\n\n09:zz\r\nhello\n10:1234\n'
+        data, diagnostics = OTPParser.tokenize(raw, False, 'dump.txt')
+        self.assertEqual(data, {8: 0x2265b1f5, 10: 0x1234})
+        self.assertEqual([diagnostic[:3] for diagnostic in diagnostics], [('dump.txt', 3, 9), ('dump.txt', 4, None)])
+        self.assertIn("'zz' is not hexadecimal", diagnostics[0].reason)
+        self.assertEqual(OTPParser.tokenize(b'\n\n', False), ({}, []))
+
+    def test_lenient_dump(self):
+        raw = read_data('pi4.txt')
+        dump = OTPParser.OTPDump.from_bytes(raw.replace(b'\n10:', b'\n10:?'), strict=False, file_name='dump.txt')
+        self.assertEqual(dump.diagnostics, [OTPParser.Diagnostic('dump.txt', 3, 10, dump.diagnostics[0].reason)])
+        with self.assertRaises(OTPParser.InvalidOTPDump):
+            OTPParser.OTPDump.from_bytes(b'hello\n', strict=False)
+
+    def test_compiled(self):
+        pattern = OTPParser.compiled(OTPParser.TOKEN_PATTERN)
+        self.assertIs(OTPParser.compiled(OTPParser.TOKEN_PATTERN), pattern)
+        self.assertIs(OTPParser.COMPILED_PATTERNS[OTPParser.TOKEN_PATTERN], pattern)
+
+
+class BoardInfoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = dict(OTPParser.BOARD_INFO_CACHE)
+        OTPParser.BOARD_INFO_CACHE.clear()
+
+    def tearDown(self):
+        OTPParser.BOARD_INFO_CACHE.clear()
+        OTPParser.BOARD_INFO_CACHE.update(self.cache)
+
+    def test_board_info(self):
+        self.assertEqual(OTPParser.board_info(0xc03111), PI4B)
+        self.assertIs(OTPParser.board_info(0x00000e), OTPParser.LEGACY_BOARDS[0xe])
+        self.assertIs(OTPParser.board_info(0xc03111), OTPParser.BOARD_INFO_CACHE[0xc03111])
+
+    def test_cache_eviction(self):
+        words = [0x800000 | index << 4 for index in range(OTPParser.BOARD_INFO_CACHE_SIZE)]
+        infos = [OTPParser.board_info(word) for word in words]
+        self.assertEqual(len(OTPParser.BOARD_INFO_CACHE), OTPParser.BOARD_INFO_CACHE_SIZE)
+        self.assertEqual(OTPParser.board_info(0xc03111), PI4B)
+        self.assertEqual(list(OTPParser.BOARD_INFO_CACHE), [0xc03111])
+        self.assertEqual([OTPParser.board_info(word) for word in words], infos)
+
+
+if __name__ == '__main__':
+    unittest.main()
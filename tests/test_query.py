@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Tests for OTPQuery.py: board field comparisons only accept labels board_info() can give."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import OTPParser  # noqa: E402
+import OTPQuery  # noqa: E402
+
+
+class BoardFieldTest(unittest.TestCase):
+
+    def test_unknown_label(self):
+        with self.assertRaises(OTPQuery.QueryError) as raised:
+            OTPQuery.compile_query('processor == bcm2711')
+        self.assertIn("'BCM2711'", str(raised.exception))
+
+    def test_known_labels(self):
+        data = {OTPParser.REGIONS['revision_number']: 0xc03111}
+        self.assertTrue(OTPQuery.compile_query("processor == BCM2711 and memory_size == 4096")(data))
+        self.assertTrue(OTPQuery.compile_query("board_type != 'Zero W'")(data))
+
+    def test_bare_board_field(self):
+        for query in ('processor', 'not processor', 'processor > 1'):
+            with self.assertRaises(OTPQuery.QueryError) as raised:
+                OTPQuery.compile_query(query)
+            self.assertIn('revision_number.processor', str(raised.exception))
+        data = {OTPParser.REGIONS['revision_number']: 0xc03111}
+        self.assertTrue(OTPQuery.compile_query('revision_number.processor == 3')(data))
+
+    def test_legacy_label(self):
+        OTPQuery.compile_query("manufacturer == Qisda")
+
+
+if __name__ == '__main__':
+    unittest.main()